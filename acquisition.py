@@ -0,0 +1,455 @@
+"""
+asyncio multi-sensor acquisition engine.
+
+One event loop drives any number of SDS011 ports with non-blocking reads
+and fans every decoded reading out to pluggable consumers (CSV writer,
+prediction step, dashboard buffers), so a single process can serve many
+sensors without a thread per device.
+
+    python acquisition.py COM3 COM4 kitchen=/dev/ttyUSB2 --csv multi_sensor.csv
+    python acquisition.py COM3 COM4 --duty-cycle 300    # sleep between 5-minute samples
+"""
+
+import argparse
+import asyncio
+import inspect
+import os
+import signal
+import threading
+import time
+from collections import namedtuple
+
+import serial
+
+from sds011_reader import (SDS011FrameDecoder, FRAME_LEN, QUERY_DATA, COMMAND_TIMEOUT,
+                           sleep_command, reporting_mode_command, query_command)
+from csv_sink import CsvSink, handle_sigterm
+from inference_worker import InferenceWorker, make_predictor, forecast_series, forecast_cells
+from feature_window import ScaledWindow
+from metrics import SERIAL_READ_SECONDS, FRAME_DECODE_SECONDS, RECONNECTS, MISSED_QUERIES
+
+# ---------------- CONFIG ----------------
+BAUD_RATE = 9600
+POLL_INTERVAL = 0.2      # seconds between polls where the loop can't watch the port fd
+READ_TIMEOUT = 3         # seconds without data before a port is treated as stalled
+RECONNECT_BACKOFF = 1    # initial seconds between reconnect attempts
+MAX_RECONNECT_BACKOFF = 30
+WARMUP_SECONDS = 30      # fan run time after waking before a reading is trusted (datasheet)
+MIN_SLEEP_SECONDS = 10   # shorter gaps keep the sensor awake in query mode instead
+MAX_MISSED_QUERIES = 3   # unanswered queries in a row before the port is reopened
+CSV_FILE = "multi_sensor_air_quality.csv"
+CSV_HEADER = ["timestamp", "sensor_id", "pm25", "pm10", "predicted_pm25", "forecast_pm25", "forecast_pm10"]
+# --------------------------------------
+
+Reading = namedtuple("Reading", ["sensor_id", "timestamp", "pm25", "pm10", "predicted_pm25", "forecast"])
+Reading.__new__.__defaults__ = (None, None)
+
+
+class SensorChannel:
+    """One SDS011 port opened non-blocking, with its own decoder and backoff state."""
+
+    def __init__(self, sensor_id, port, baudrate=BAUD_RATE):
+        self.sensor_id = sensor_id
+        self.port = port
+        self.baudrate = baudrate
+        self.ser = None
+        self.decoder = SDS011FrameDecoder()
+        self.reconnects = 0
+        self.backoff = RECONNECT_BACKOFF
+
+    def open(self):
+        # timeout=0 makes every read return immediately with whatever is buffered
+        self.ser = serial.Serial(self.port, self.baudrate, timeout=0)
+        self.decoder.reset()
+
+    def read_frames(self):
+        started = time.perf_counter()
+        data = self.ser.read(self.ser.in_waiting or FRAME_LEN)
+        read = time.perf_counter()
+        frames = self.decoder.feed(data)
+        SERIAL_READ_SECONDS.observe(read - started)
+        FRAME_DECODE_SECONDS.observe(time.perf_counter() - read)
+        return frames
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.ser = None
+
+
+class AcquisitionEngine:
+    """Reads N sensors concurrently and dispatches readings to consumers.
+
+    A consumer is any callable taking a Reading; coroutine functions are
+    awaited. Consumers run on the event loop, so anything slow (model
+    inference, disk sync) should hand off to an executor.
+    """
+
+    def __init__(self, sensors, consumers=(), poll_interval=POLL_INTERVAL):
+        if isinstance(sensors, dict):
+            sensors = sensors.items()
+        self.channels = [SensorChannel(sensor_id, port) for sensor_id, port in sensors]
+        self.consumers = list(consumers)
+        self.poll_interval = poll_interval
+        self._stopping = None
+
+    def add_consumer(self, consumer):
+        self.consumers.append(consumer)
+
+    async def dispatch(self, reading):
+        for consumer in self.consumers:
+            try:
+                result = consumer(reading)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"⚠️ Consumer {consumer!r} failed for {reading.sensor_id}: {e}")
+
+    async def _wait_readable(self, channel, readable, timeout=READ_TIMEOUT):
+        """Wait until the port has data, using the loop's fd watcher when available."""
+        if readable is None:
+            await asyncio.sleep(min(self.poll_interval, timeout))
+            return
+        try:
+            await asyncio.wait_for(readable.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        readable.clear()
+
+    def _watch(self, channel):
+        """Register the port fd with the loop; returns None where that isn't supported."""
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        try:
+            loop.add_reader(channel.ser.fileno(), readable.set)
+        except (NotImplementedError, AttributeError, ValueError, OSError):
+            # Windows COM ports and proactor loops fall back to polling
+            return None
+        return readable
+
+    def _unwatch(self, channel, readable):
+        if readable is not None and channel.ser is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(channel.ser.fileno())
+            except Exception:
+                pass
+
+    async def _run_channel(self, channel):
+        while not self._stopping.is_set():
+            try:
+                channel.open()
+            except (serial.SerialException, OSError) as e:
+                print(f"❌ {channel.sensor_id}: cannot open {channel.port}: {e}")
+                await self._sleep_backoff(channel)
+                continue
+
+            print(f"✅ {channel.sensor_id} connected on {channel.port}")
+            readable = self._watch(channel)
+            try:
+                await self._stream(channel, readable)
+            except (serial.SerialException, OSError) as e:
+                print(f"⚠️ {channel.sensor_id}: read error, reconnecting: {e}")
+                channel.reconnects += 1
+                RECONNECTS.inc()
+            finally:
+                self._unwatch(channel, readable)
+                channel.close()
+            if not self._stopping.is_set():
+                await self._sleep_backoff(channel)
+
+    async def _stream(self, channel, readable):
+        """Dispatch every frame the sensor streams until stopped; I/O errors propagate."""
+        # A duty-cycled sensor may have been left asleep or in query mode
+        channel.ser.write(sleep_command(False))
+        channel.ser.write(reporting_mode_command(query=False))
+        while not self._stopping.is_set():
+            await self._wait_readable(channel, readable)
+            frames = channel.read_frames()
+            if not frames:
+                continue
+            channel.backoff = RECONNECT_BACKOFF
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            for frame in frames:
+                await self.dispatch(Reading(channel.sensor_id, timestamp, frame.pm25, frame.pm10))
+
+    async def _sleep_backoff(self, channel):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), channel.backoff)
+        except asyncio.TimeoutError:
+            pass
+        channel.backoff = min(channel.backoff * 2, MAX_RECONNECT_BACKOFF)
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        await asyncio.gather(*(self._run_channel(c) for c in self.channels))
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+
+class DutyCycleEngine(AcquisitionEngine):
+    """Samples each sensor every `interval` seconds in query mode, asleep in between.
+
+    In active mode the SDS011 streams a frame every second with the laser
+    and fan always on; the laser is rated for about 8000 hours. Here each
+    sensor is switched to query mode, woken `warmup` seconds before a
+    sample, asked for one reading and put back to sleep, so there is one
+    serial exchange per sample instead of a frame per second. Intervals
+    too short to be worth sleeping just query an awake sensor. On stop
+    the sensor is woken and returned to active mode.
+    """
+
+    def __init__(self, sensors, consumers=(), interval=60, warmup=WARMUP_SECONDS, poll_interval=POLL_INTERVAL):
+        super().__init__(sensors, consumers, poll_interval)
+        self.interval = interval
+        self.warmup = warmup
+        self.sleeps = interval >= warmup + MIN_SLEEP_SECONDS
+
+    async def _command(self, channel, readable, command, timeout=COMMAND_TIMEOUT):
+        """Send a host command and await its reply frame, or None after `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        channel.read_frames()  # drop anything stale so a query can't return an old frame
+        channel.decoder.replies.clear()
+        channel.ser.write(command)
+        expect = command[2]
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            await self._wait_readable(channel, readable, remaining)
+            frames = channel.read_frames()
+            if expect == QUERY_DATA:
+                if frames:
+                    return frames[-1]
+                continue
+            for reply in channel.decoder.replies:
+                if reply.command == expect:
+                    return reply
+
+    async def _pause(self, seconds):
+        """Sleep up to `seconds`; returns True if the engine is stopping."""
+        if seconds > 0:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+        return self._stopping.is_set()
+
+    async def _stream(self, channel, readable):
+        # A sleeping sensor ignores everything but a wake command, so wake it first
+        await self._command(channel, readable, sleep_command(False))
+        if await self._command(channel, readable, reporting_mode_command(query=True)) is None:
+            raise serial.SerialException("no reply to the query-mode command")
+        print(f"🔁 {channel.sensor_id}: sampling every {self.interval:g}s"
+              + (f", asleep between samples ({self.warmup:g}s warmup)" if self.sleeps else ""))
+
+        loop = asyncio.get_running_loop()
+        next_sample = loop.time() + (self.warmup if self.sleeps else 0)
+        missed = 0
+        restore = True
+        try:
+            while True:
+                if self.sleeps:
+                    if await self._pause(next_sample - self.warmup - loop.time()):
+                        break
+                    await self._command(channel, readable, sleep_command(False))
+                if await self._pause(next_sample - loop.time()):
+                    break
+                frame = await self._command(channel, readable, query_command())
+                if frame is None:
+                    missed += 1
+                    MISSED_QUERIES.inc()
+                    if missed >= MAX_MISSED_QUERIES:
+                        raise serial.SerialException(f"{missed} queries in a row went unanswered")
+                else:
+                    missed = 0
+                    channel.backoff = RECONNECT_BACKOFF
+                    await self.dispatch(Reading(channel.sensor_id, time.strftime("%Y-%m-%d %H:%M:%S"),
+                                                frame.pm25, frame.pm10))
+                if self.sleeps:
+                    await self._command(channel, readable, sleep_command(True))
+                # After a stall, resume on schedule instead of catching up in a burst
+                next_sample = max(next_sample + self.interval, loop.time())
+        except (serial.SerialException, OSError):
+            restore = False  # the port failed; the next connect sets the sensor up again
+            raise
+        finally:
+            # On stop, and on cancellation (Ctrl+C under asyncio.run), hand the sensor back
+            # awake and streaming, the state it powers up in and every other reader expects
+            if restore and channel.ser is not None:
+                try:
+                    await self._command(channel, readable, sleep_command(False))
+                    await self._command(channel, readable, reporting_mode_command(query=False))
+                except (serial.SerialException, OSError):
+                    pass
+
+
+# ---------------- CONSUMERS ----------------
+class CsvConsumer:
+    """Appends readings from every sensor to one batched CSV file."""
+
+    def __init__(self, path=CSV_FILE, **sink_options):
+        self.sink = CsvSink(path, CSV_HEADER, **sink_options)
+
+    def __call__(self, reading):
+        self.sink.write([reading.timestamp, reading.sensor_id, reading.pm25,
+                         reading.pm10, reading.predicted_pm25] + forecast_cells(reading.forecast))
+
+    def close(self):
+        self.sink.close()
+
+
+class PredictionConsumer:
+    """Keeps a PM2.5 window per sensor and forwards readings with a prediction attached.
+
+    Windows go to an InferenceWorker thread, which batches every sensor
+    with a window ready into one forward pass and drops stale windows
+    when it falls behind; results are handed back to the event loop.
+    """
+
+    def __init__(self, model, scaler, downstream=(), time_step=None):
+        self.time_step = time_step or model.input_shape[1]
+        self.scaler = scaler
+        self.downstream = list(downstream)
+        self.windows = {}
+        self._loop = None
+        self.worker = InferenceWorker(make_predictor(model, scaler, prescaled=True), self._on_result)
+
+    def _on_result(self, job, pred):
+        reading = job.context
+        if pred is not None:
+            reading = reading._replace(predicted_pm25=float(pred[0, 0]), forecast=forecast_series(pred))
+        asyncio.run_coroutine_threadsafe(self._forward(reading), self._loop)
+
+    async def _forward(self, reading):
+        for consumer in self.downstream:
+            try:
+                result = consumer(reading)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"⚠️ Consumer {consumer!r} failed for {reading.sensor_id}: {e}")
+
+    async def __call__(self, reading):
+        self._loop = asyncio.get_running_loop()
+        window = self.windows.get(reading.sensor_id)
+        if window is None:
+            window = self.windows[reading.sensor_id] = ScaledWindow.from_scaler(self.time_step, self.scaler)
+        window.push_reading(reading.pm25, reading.pm10)
+        if window.full:
+            self.worker.submit(reading.sensor_id, window.values(), reading)
+        else:
+            await self._forward(reading)
+
+    def close(self):
+        self.worker.stop(timeout=5)
+
+
+class DashboardConsumer:
+    """Feeds one sensor's readings to the dashboard module's buffers, /api/live snapshot and /api/stream.
+
+    Goes through the same record/publish path as dashboard.sensor_loop,
+    under its state_lock, so the snapshot ETag and the event feed move
+    with every reading.
+    """
+
+    def __init__(self, dashboard, sensor_id=None):
+        self.dashboard = dashboard
+        self.sensor_id = sensor_id
+
+    def __call__(self, reading):
+        if self.sensor_id is not None and reading.sensor_id != self.sensor_id:
+            return
+        dashboard = self.dashboard
+        with dashboard.state_lock:
+            dashboard.record_reading(reading.timestamp, reading.pm25, reading.pm10)
+            dashboard.latest["predicted_pm25"] = reading.predicted_pm25
+            dashboard.latest["forecast"] = reading.forecast
+            dashboard.publish_reading()
+
+
+def parse_sensors(specs):
+    """Turn ["COM3", "kitchen=/dev/ttyUSB0"] into [(sensor_id, port), ...]."""
+    sensors = []
+    for spec in specs:
+        sensor_id, sep, port = spec.partition("=")
+        sensors.append((sensor_id, port) if sep else (spec, spec))
+    return sensors
+
+
+def load_prediction_model(model_file="pm25_lstm_model.h5", scaler_file="scaler.save"):
+    try:
+        from numpy_lstm import load_model
+        from joblib import load as joblib_load
+        if os.path.exists(model_file) and os.path.exists(scaler_file):
+            return load_model(model_file), joblib_load(scaler_file)
+        print("⚠️ Model or scaler files not found — predictions disabled.")
+    except Exception as e:
+        print("⚠️ Error loading model/scaler:", e)
+    return None, None
+
+
+async def run_until_signalled(engine):
+    """engine.run() with SIGINT/SIGTERM mapped to engine.stop(), so channels finish cleanly."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, engine.stop)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass  # Windows: Ctrl+C cancels the tasks instead, which also restores the sensors
+    await engine.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read many SDS011 sensors from one process")
+    parser.add_argument("sensors", nargs="+", help="PORT or SENSOR_ID=PORT")
+    parser.add_argument("--csv", default=CSV_FILE, help="CSV file for all readings")
+    parser.add_argument("--no-predict", action="store_true", help="skip the LSTM prediction step")
+    parser.add_argument("--dashboard", metavar="SENSOR_ID",
+                        help="also serve the live dashboard for this sensor")
+    parser.add_argument("--duty-cycle", type=float, metavar="SECONDS",
+                        help="query each sensor every SECONDS in query mode, asleep in between")
+    parser.add_argument("--warmup", type=float, default=WARMUP_SECONDS,
+                        help="seconds a sensor runs after waking before it is read (default 30)")
+    args = parser.parse_args()
+    handle_sigterm()
+
+    sinks = [CsvConsumer(args.csv)]
+    if args.dashboard:
+        import dashboard
+        sinks.append(DashboardConsumer(dashboard, sensor_id=args.dashboard))
+        threading.Thread(target=dashboard.app.run,
+                         kwargs={"host": "0.0.0.0", "port": 5000, "debug": False},
+                         daemon=True).start()
+
+    model, scaler = (None, None) if args.no_predict else load_prediction_model()
+    predictor = None
+    if model is not None:
+        predictor = PredictionConsumer(model, scaler, downstream=sinks)
+        consumers = [predictor]
+    else:
+        consumers = sinks
+
+    if args.duty_cycle:
+        engine = DutyCycleEngine(parse_sensors(args.sensors), consumers, args.duty_cycle, args.warmup)
+    else:
+        engine = AcquisitionEngine(parse_sensors(args.sensors), consumers)
+    print(f"🟢 Reading {len(engine.channels)} sensor(s) (Press Ctrl+C to stop)")
+    try:
+        asyncio.run(run_until_signalled(engine))
+        print("\n🛑 Acquisition stopped.")
+    except KeyboardInterrupt:
+        print("\n🛑 Acquisition stopped by user.")
+    finally:
+        if predictor is not None:
+            predictor.close()
+        sinks[0].close()
+
+
+if __name__ == "__main__":
+    main()
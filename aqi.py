@@ -0,0 +1,269 @@
+"""
+US EPA Air Quality Index for PM2.5 and PM10.
+
+Concentrations map to the index by piecewise-linear interpolation
+between breakpoints; the breakpoint row of every value is found with one
+np.searchsorted call, so whole arrays convert at once. NowCastTracker
+keeps hourly buckets of a live stream and gives the 12-hour NowCast and
+the 24-hour average with O(1) work per sample.
+
+    python aqi.py backfill air_quality_log.csv     # writes air_quality_log.aqi.csv
+"""
+
+import argparse
+import math
+import os
+from collections import deque
+
+import numpy as np
+
+# (C_lo, C_hi, I_lo, I_hi) rows, µg/m³. Concentrations are truncated to
+# 0.1 µg/m³ (PM2.5) and 1 µg/m³ (PM10) before lookup, as the EPA specifies.
+BREAKPOINTS = {
+    "pm25": np.array([
+        [0.0, 12.0, 0, 50],
+        [12.1, 35.4, 51, 100],
+        [35.5, 55.4, 101, 150],
+        [55.5, 150.4, 151, 200],
+        [150.5, 250.4, 201, 300],
+        [250.5, 350.4, 301, 400],
+        [350.5, 500.4, 401, 500],
+    ]),
+    "pm10": np.array([
+        [0, 54, 0, 50],
+        [55, 154, 51, 100],
+        [155, 254, 101, 150],
+        [255, 354, 151, 200],
+        [355, 424, 201, 300],
+        [425, 504, 301, 400],
+        [505, 604, 401, 500],
+    ]),
+}
+TRUNCATE = {"pm25": 10.0, "pm10": 1.0}  # 1 / truncation step
+
+CATEGORY_LIMITS = np.array([50, 100, 150, 200, 300])  # upper AQI of each category but the last
+CATEGORIES = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy",
+              "Very Unhealthy", "Hazardous"]
+CATEGORY_COLORS = {
+    "Good": "green",
+    "Moderate": "yellow",
+    "Unhealthy for Sensitive Groups": "orange",
+    "Unhealthy": "red",
+    "Very Unhealthy": "purple",
+    "Hazardous": "maroon",
+}
+
+NOWCAST_HOURS = 12
+AVERAGE_HOURS = 24
+NOWCAST_MIN_WEIGHT = 0.5  # EPA floor on the NowCast weight factor for particulates
+
+
+# ---------------- INDEX ----------------
+def aqi(concentration, pollutant="pm25"):
+    """AQI for a concentration or array of them; NaN in, NaN out. Values past the table cap at 500."""
+    table = BREAKPOINTS[pollutant]
+    c = np.asarray(concentration, dtype=np.float64)
+    step = TRUNCATE[pollutant]
+    c = np.floor(np.maximum(c, 0) * step + 1e-9) / step
+    row = np.minimum(np.searchsorted(table[:, 1], c, side="left"), len(table) - 1)
+    c_lo, c_hi, i_lo, i_hi = table[row].T
+    index = np.floor((i_hi - i_lo) / (c_hi - c_lo) * (np.minimum(c, c_hi) - c_lo) + i_lo + 0.5)
+    index = np.where(np.isnan(c), np.nan, index)
+    return index if index.ndim else float(index)
+
+
+def category_index(index):
+    """Position in CATEGORIES for an AQI value or array (NaN maps to 0)."""
+    idx = np.searchsorted(CATEGORY_LIMITS, np.nan_to_num(np.asarray(index, dtype=np.float64)), side="left")
+    return idx if np.ndim(idx) else int(idx)
+
+
+def category(index):
+    if index is None or (isinstance(index, float) and math.isnan(index)):
+        return None
+    return CATEGORIES[category_index(index)]
+
+
+def compute_aqi(pm25, pm10=None):
+    """(AQI, category) for one reading: the higher of the PM2.5 and PM10 indexes."""
+    index = aqi(pm25, "pm25")
+    if pm10 is not None:
+        index = max(index, aqi(pm10, "pm10"))
+    return int(index), category(index)
+
+
+def compute_aqi_columns(pm25, pm10=None):
+    """Vectorized compute_aqi: (AQI array, category array) for whole columns."""
+    index = aqi(pm25, "pm25")
+    if pm10 is not None:
+        index = np.fmax(index, aqi(pm10, "pm10"))
+    names = np.array(CATEGORIES, dtype=object)[category_index(index)]
+    names[np.isnan(index)] = None
+    return index, names
+
+
+# ---------------- NOWCAST ----------------
+class NowCastTracker:
+    """Running 12-hour NowCast and 24-hour average for one pollutant.
+
+    Samples land in per-hour (sum, count) buckets; the hour in progress
+    counts as the most recent hour. Each add() is O(1): a bucket update,
+    plus a constant number of bucket shifts when hours roll over.
+    """
+
+    def __init__(self, pollutant="pm25"):
+        self.pollutant = pollutant
+        self._buckets = deque()  # [hour, sum, count], oldest first, at most AVERAGE_HOURS
+        self._sum = 0.0
+        self._count = 0
+
+    def add(self, timestamp, value):
+        """Add a sample; `timestamp` in seconds (e.g. ts_store epoch)."""
+        if value is None or value != value:
+            return
+        self._add(int(timestamp // 3600), value, 1)
+
+    def add_many(self, timestamps, values):
+        """Add time-ordered arrays of samples, e.g. history loaded at startup."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        if not keep.any():
+            return
+        hours = (timestamps[keep] // 3600).astype(np.int64)
+        # Only the last 24 hours can matter; sum them per hour in one pass
+        recent = hours >= hours[-1] - AVERAGE_HOURS + 1
+        uniq, inverse = np.unique(hours[recent], return_inverse=True)
+        sums = np.bincount(inverse, weights=values[keep][recent])
+        counts = np.bincount(inverse)
+        for hour, total, count in zip(uniq, sums, counts):
+            self._add(int(hour), float(total), int(count))
+
+    def _add(self, hour, total, count):
+        buckets = self._buckets
+        if not buckets or hour > buckets[-1][0]:
+            first = hour - AVERAGE_HOURS + 1
+            # Drop buckets older than the 24-hour window, then open the new hour
+            while buckets and buckets[0][0] < first:
+                _, s, n = buckets.popleft()
+                self._sum -= s
+                self._count -= n
+            buckets.append([hour, 0.0, 0])
+        # A clock stepping backwards keeps filling the newest bucket
+        bucket = buckets[-1]
+        bucket[1] += total
+        bucket[2] += count
+        self._sum += total
+        self._count += count
+
+    def hourly(self, hours=NOWCAST_HOURS):
+        """Hourly averages, most recent hour first; None for hours without samples."""
+        if not self._buckets:
+            return [None] * hours
+        latest = self._buckets[-1][0]
+        out = [None] * hours
+        for hour, s, n in self._buckets:
+            age = latest - hour
+            if age < hours and n:
+                out[age] = s / n
+        return out
+
+    def average_24h(self):
+        return self._sum / self._count if self._count else None
+
+    def nowcast(self):
+        """EPA NowCast concentration, or None without 2 of the 3 most recent hours."""
+        hourly = self.hourly(NOWCAST_HOURS)
+        if sum(c is not None for c in hourly[:3]) < 2:
+            return None
+        valid = [c for c in hourly if c is not None]
+        c_max = max(valid)
+        weight = max(min(valid) / c_max, NOWCAST_MIN_WEIGHT) if c_max > 0 else 1.0
+        num = den = 0.0
+        for age, c in enumerate(hourly):
+            if c is not None:
+                w = weight ** age
+                num += w * c
+                den += w
+        return num / den
+
+    def nowcast_aqi(self):
+        c = self.nowcast()
+        return None if c is None else aqi(c, self.pollutant)
+
+
+def describe(pm25, pm10, tracker=None):
+    """AQI summary of one reading for APIs; `tracker` (PM2.5) adds the NowCast."""
+    pm25_index = aqi(pm25, "pm25")
+    pm10_index = aqi(pm10, "pm10")
+    summary = {
+        "pm25": int(pm25_index), "pm25_category": category(pm25_index),
+        "pm10": int(pm10_index), "pm10_category": category(pm10_index),
+        "nowcast": None, "category": category(max(pm25_index, pm10_index)),
+    }
+    if tracker is not None:
+        nowcast = tracker.nowcast_aqi()
+        if nowcast is not None:
+            summary["nowcast"] = int(nowcast)
+            summary["category"] = category(nowcast)
+    return summary
+
+
+# ---------------- BACKFILL ----------------
+def backfill_output(csv_path):
+    stem, ext = os.path.splitext(csv_path)
+    return f"{stem}.aqi{ext or '.csv'}"
+
+
+def backfill_csv(csv_path, output=None):
+    """Recompute the AQI_Level and Category columns of a logger CSV in one pass.
+
+    Writes `output` (default <name>.aqi.csv); pass csv_path itself to
+    replace the log. Files with rows wider than their header are refused,
+    since those fields have no column to be kept in.
+    """
+    import csv
+    import pandas as pd
+    from ts_store import read_log_csv, PM25_COLUMNS
+
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        width = len(next(reader, []))
+        ragged = sum(1 for row in reader if len(row) > width)
+    if ragged:
+        raise ValueError(f"{csv_path}: {ragged} rows have more fields than its {width}-column header; "
+                         "add the missing column names to the header first")
+
+    frame = read_log_csv(csv_path)
+    pm25_col = next((c for c in PM25_COLUMNS if c in frame.columns), None)
+    if pm25_col is None:
+        raise ValueError(f"{csv_path} has no PM2.5 column (expected one of {PM25_COLUMNS})")
+    pm25 = pd.to_numeric(frame[pm25_col], errors="coerce").to_numpy(dtype=np.float64)
+    pm10 = pd.to_numeric(frame["pm10"], errors="coerce").to_numpy(dtype=np.float64) if "pm10" in frame.columns else None
+    index, names = compute_aqi_columns(pm25, pm10)
+    frame["AQI_Level"] = pd.array(np.where(np.isnan(index), np.nan, index), dtype="Int64")
+    frame["Category"] = names
+
+    target = output or backfill_output(csv_path)
+    tmp = target + ".tmp"
+    frame.to_csv(tmp, index=False, na_rep="")
+    os.replace(tmp, target)
+    return len(frame)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PM2.5 / PM10 Air Quality Index tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    back = sub.add_parser("backfill", help="recompute AQI_Level and Category for a whole CSV")
+    back.add_argument("csv", nargs="?", default="air_quality_log.csv")
+    where = back.add_mutually_exclusive_group()
+    where.add_argument("-o", "--output", help="output CSV (default: <name>.aqi.csv)")
+    where.add_argument("--in-place", action="store_true", help="replace the CSV itself (stop the logger first)")
+    args = parser.parse_args()
+
+    output = args.csv if args.in_place else args.output or backfill_output(args.csv)
+    try:
+        rows = backfill_csv(args.csv, output)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"✅ Recomputed AQI for {rows} rows in {output}")
@@ -0,0 +1,181 @@
+"""
+Backtest the deployed model against a logged history in one vectorized pass.
+
+The whole log is loaded into arrays, every complete window is located at
+once (no window spans a gap, an invalid reading or a sensor change), and
+the windows run through the model in large batches. Errors of the
+next-step prediction are reported overall, by hour of day and by AQI
+band; with --fill the predictions are also written into the log's empty
+predicted_pm25 cells, the way the dashboard would have recorded them.
+
+    python backtest.py live_air_quality.csv
+    python backtest.py air_quality_log.csv --fill -o air_quality_log.backtest.csv
+    python backtest.py live_air_quality.store --fill
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ts_store import TimeSeriesStore, load_log
+from aqi import aqi, category_index, CATEGORIES
+
+MODEL_FILE = "pm25_lstm_model.h5"
+SCALER_FILE = "scaler.save"
+MAX_GAP_SECONDS = 60     # same rule as training: a longer gap breaks the window
+CHUNK_WINDOWS = 65_536   # windows copied out and predicted per step, to bound memory
+
+
+# ---------------- WINDOWS ----------------
+def find_windows(ts, values, codes, time_step, max_gap=MAX_GAP_SECONDS):
+    """End rows of every complete window, plus the run id of each row.
+
+    A run is a stretch of valid rows from one sensor with no gap longer
+    than `max_gap`; a window ending at row e covers rows e-time_step+1..e
+    and is complete when all of them belong to the same run.
+    """
+    n = len(ts)
+    valid = np.isfinite(ts) & np.isfinite(values).all(axis=1)
+    starts_run = np.ones(n, dtype=bool)
+    if n > 1:
+        dt = np.diff(ts)
+        starts_run[1:] = (dt > max_gap) | (dt < 0) | (codes[1:] != codes[:-1]) | ~valid[1:] | ~valid[:-1]
+    run = np.cumsum(starts_run)
+    ends = np.arange(time_step - 1, n)
+    ends = ends[(run[ends] == run[ends - time_step + 1]) & valid[ends]]
+    return ends, run, valid
+
+
+def predict_windows(model, scaled, ends, time_step, chunk=CHUNK_WINDOWS):
+    """Scaled model outputs (len(ends), outputs) for the windows ending at `ends`."""
+    windows = sliding_window_view(scaled, time_step, axis=0)  # (rows - time_step + 1, features, time_step)
+    batch_predict = getattr(model, "predict_batch", None)
+    out = []
+    for i in range(0, len(ends), chunk):
+        x = np.ascontiguousarray(windows[ends[i:i + chunk] - time_step + 1].transpose(0, 2, 1), dtype=np.float32)
+        out.append(batch_predict(x) if batch_predict else model.predict(x, batch_size=4096, verbose=0))
+    return np.concatenate(out) if out else np.empty((0, 1), dtype=np.float32)
+
+
+# ---------------- METRICS ----------------
+def grouped_errors(err, groups, labels):
+    """Rows of (label, count, MAE, RMSE) for each group id in `groups`."""
+    k = len(labels)
+    count = np.bincount(groups, minlength=k)
+    abs_sum = np.bincount(groups, weights=np.abs(err), minlength=k)
+    sq_sum = np.bincount(groups, weights=err ** 2, minlength=k)
+    rows = []
+    for i, label in enumerate(labels):
+        if count[i]:
+            rows.append((label, int(count[i]), abs_sum[i] / count[i], np.sqrt(sq_sum[i] / count[i])))
+    return rows
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'':<32}{'n':>9}{'MAE':>9}{'RMSE':>9}")
+    for label, n, mae, rmse in rows:
+        print(f"  {label:<32}{n:>9}{mae:>9.2f}{rmse:>9.2f}")
+
+
+# ---------------- BACKTEST ----------------
+def backtest(source, model_file=MODEL_FILE, scaler_file=SCALER_FILE, max_gap=MAX_GAP_SECONDS,
+             fill=False, output=None, inplace=False):
+    from joblib import load as joblib_load
+    from numpy_lstm import load_model
+
+    model = load_model(model_file)
+    scaler = joblib_load(scaler_file)
+    features = len(scaler.scale_)
+    time_step = model.input_shape[1]
+
+    started = time.perf_counter()
+    ts, values, codes, frame = load_log(source, features)
+    # Keep each sensor's rows together (in log order) so windows never mix sensors
+    order = np.argsort(codes, kind="stable")
+    ts, values, codes = ts[order], values[order], codes[order]
+    loaded = time.perf_counter()
+
+    ends, run, valid = find_windows(ts, values, codes, time_step, max_gap)
+    scaled = values * scaler.scale_ + scaler.min_
+    raw = predict_windows(model, scaled, ends, time_step)
+    forecast = (raw.reshape(len(ends), -1, features) - scaler.min_) / scaler.scale_  # (windows, H, F)
+    predicted = time.perf_counter()
+    print(f"✅ {len(ts)} rows, {len(ends)} windows: loaded in {loaded - started:.1f}s, "
+          f"predicted in {predicted - loaded:.1f}s")
+
+    # Step k of the window ending at e forecasts row e+k, if that row continues the same run
+    horizon = forecast.shape[1]
+    report = {}
+    for step in range(1, horizon + 1):
+        target = ends + step
+        ok = target < len(ts)
+        ok[ok] = (run[target[ok]] == run[ends[ok]]) & valid[target[ok]]
+        err = forecast[ok, step - 1, 0] - values[target[ok], 0]
+        if step == 1:
+            first_err, first_target = err, target[ok]
+        if len(err):
+            report[step] = (len(err), float(np.abs(err).mean()), float(np.sqrt((err ** 2).mean())))
+
+    if not report:
+        print("⚠️ No window has a following reading to score against.")
+    else:
+        print_table("Next-step PM2.5 error (µg/m³)", [("all", *report[1])])
+        if horizon > 1:
+            print_table("By forecast step", [(f"+{k}", *v) for k, v in report.items()])
+        hours = ((ts[first_target] // 3600) % 24).astype(np.int64)
+        print_table("By hour of day", grouped_errors(first_err, hours, [f"{h:02d}:00" for h in range(24)]))
+        bands = category_index(aqi(values[first_target, 0], "pm25"))
+        print_table("By AQI band (measured PM2.5)", grouped_errors(first_err, bands, CATEGORIES))
+
+    if fill:
+        # Like the dashboard: the prediction made after row e is stored with row e
+        rows = order[ends]
+        fill_predictions(source, frame, rows, forecast[:, 0, 0], output, inplace)
+    return report
+
+
+def fill_predictions(source, frame, rows, predictions, output=None, inplace=False):
+    """Write predictions into predicted_pm25 cells that are still empty."""
+    if frame is None:
+        store = TimeSeriesStore(source)
+        current = np.asarray(store.read(["predicted_pm25"])["predicted_pm25"][rows])
+        empty = np.isnan(current)
+        store.update("predicted_pm25", rows[empty], predictions[empty])
+        print(f"✅ Filled {int(empty.sum())} predictions in {source}")
+        return
+
+    import pandas as pd
+
+    if "predicted_pm25" not in frame.columns:
+        frame["predicted_pm25"] = np.nan
+    column = pd.to_numeric(frame["predicted_pm25"], errors="coerce").to_numpy(dtype=np.float64, copy=True)
+    empty = np.isnan(column[rows])
+    column[rows[empty]] = np.round(predictions[empty], 3)
+    frame["predicted_pm25"] = column
+    if inplace:
+        target, tmp = source, source + ".tmp"
+    else:
+        target = output or os.path.splitext(source)[0] + ".backtest.csv"
+        tmp = target
+    frame.to_csv(tmp, index=False, na_rep="")
+    if tmp != target:
+        os.replace(tmp, target)
+    print(f"✅ Filled {int(empty.sum())} predictions; wrote {target}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the PM2.5 model against a logged history")
+    parser.add_argument("source", nargs="?", default="live_air_quality.csv", help="log CSV or store directory")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--scaler", default=SCALER_FILE)
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP_SECONDS)
+    parser.add_argument("--fill", action="store_true", help="write predictions into empty predicted_pm25 cells")
+    parser.add_argument("-o", "--output", help="CSV written by --fill (default: <log>.backtest.csv)")
+    parser.add_argument("--inplace", action="store_true",
+                        help="with --fill, replace the CSV itself (stop whatever writes it first)")
+    args = parser.parse_args()
+    backtest(args.source, args.model, args.scaler, args.max_gap, args.fill, args.output, args.inplace)
@@ -0,0 +1,359 @@
+"""
+Benchmarks for the hot paths, with regression checks against a baseline.
+
+No hardware is needed: sensor bytes come from in-memory frame streams
+(with the same garbage and truncation sds011_sim.py injects), CSV writes
+go to a temporary directory and /api/live is served by a local server
+to concurrent keep-alive clients. Each benchmark keeps its best of
+--repeat runs, which is the most stable number on a shared CI box.
+
+    python benchmark.py                          # run all, write bench_results.json
+    python benchmark.py --save-baseline          # ...and store it as bench_baseline.json
+    python benchmark.py --only frame_parse,inference_single
+    python benchmark.py --ci                     # fail if there's no baseline to compare against
+
+Baselines are machine-specific, so none is committed: save one on the
+reference commit of the machine that runs the comparison. --ci (or the
+CI environment variable most CI services set) turns a missing baseline
+into a failure instead of a warning.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from sds011_reader import SDS011, SDS011FrameDecoder, encode_measurement, FRAME_LEN
+
+# ---------------- CONFIG ----------------
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+TOLERANCE = 0.25          # a result this much worse than the baseline fails the run
+REPEAT = 5
+MODEL_FILE = "pm25_lstm_model.h5"
+FRAMES = 100_000          # frames per parse run
+CSV_ROWS = 50_000         # rows per CSV append run
+SERIES_ROWS = 500_000     # readings windowed by prepare_data
+BATCH = 1024              # windows per batched inference call
+HTTP_CLIENTS = 8
+HTTP_SECONDS = 3.0
+# --------------------------------------
+
+BENCHMARKS = {}
+
+
+def benchmark(unit, higher_is_better=True):
+    """Register a benchmark function returning (value, extra-info dict)."""
+    def register(fn):
+        BENCHMARKS[fn.__name__] = (fn, unit, higher_is_better)
+        return fn
+    return register
+
+
+def best_time(fn, repeat):
+    """Shortest wall time of `repeat` calls to fn()."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# ---------------- STUBBED HARDWARE ----------------
+def frame_stream(frames, garbage=0.01, truncate=0.01, seed=0):
+    """Bytes of `frames` measurement frames with occasional garbage and truncated frames."""
+    rng = random.Random(seed)
+    out = bytearray()
+    for i in range(frames):
+        if rng.random() < garbage:
+            out += bytes(rng.getrandbits(8) for _ in range(rng.randint(1, 2 * FRAME_LEN)))
+        frame = encode_measurement(10 + (i % 500) / 10, 20 + (i % 700) / 10, 0x1000)
+        out += frame[:rng.randint(1, FRAME_LEN - 1)] if rng.random() < truncate else frame
+    return bytes(out)
+
+
+class StubSerial:
+    """Stands in for serial.Serial: serves a byte string in reads of at most `chunk` bytes."""
+
+    def __init__(self, data, chunk=64):
+        self.data = data
+        self.chunk = chunk
+        self.pos = 0
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk, len(self.data) - self.pos)
+
+    def read(self, size=1):
+        out = self.data[self.pos:self.pos + size]
+        self.pos += len(out)
+        return out
+
+    def close(self):
+        pass
+
+
+# ---------------- BENCHMARKS ----------------
+@benchmark("frames/s")
+def frame_parse(repeat):
+    """SDS011.read_all over a stub port delivering 64-byte reads, as pyserial would."""
+    data = frame_stream(FRAMES)
+    decoded = []
+
+    def run():
+        sensor = SDS011.__new__(SDS011)
+        sensor.decoder = SDS011FrameDecoder()
+        sensor.ser = StubSerial(data)
+        count = 0
+        while sensor.ser.in_waiting:
+            count += len(sensor.read_all())
+        decoded.append(count)
+
+    seconds = best_time(run, repeat)
+    return decoded[-1] / seconds, {"frames": decoded[-1], "bytes": len(data)}
+
+
+@benchmark("rows/s")
+def csv_append(repeat):
+    """CsvSink.write for every reading, as data_logger and the dashboard sensor loop do."""
+    from csv_sink import CsvSink
+
+    row = ["2025-10-21 21:21:51", 23.4, 25.9, 22.871, "", ""]
+    header = ["timestamp", "pm25", "pm10", "predicted_pm25", "forecast_pm25", "forecast_pm10"]
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = iter(range(repeat))
+
+        def run():
+            sink = CsvSink(os.path.join(tmp, f"bench{next(runs)}.csv"), header)
+            for _ in range(CSV_ROWS):
+                sink.write(row)
+            sink.close()
+
+        seconds = best_time(run, repeat)
+    return CSV_ROWS / seconds, {"rows": CSV_ROWS}
+
+
+@benchmark("windows/s")
+def prepare_data(repeat):
+    """model_training.prepare_data on a long series, windows copied out as training would."""
+    from model_training import prepare_data as prepare
+
+    series = np.random.default_rng(0).random((SERIES_ROWS, 2), dtype=np.float32)
+    count = []
+
+    def run():
+        X, y = prepare(series, time_step=10, horizon=1)
+        X = np.ascontiguousarray(X)
+        count.append(len(X))
+
+    seconds = best_time(run, repeat)
+    return count[-1] / seconds, {"rows": SERIES_ROWS, "time_step": 10, "features": 2}
+
+
+def load_bench_model():
+    if not os.path.exists(MODEL_FILE):
+        raise FileNotFoundError(f"{MODEL_FILE} not found; train a model first")
+    from numpy_lstm import load_model
+    return load_model(MODEL_FILE)
+
+
+@benchmark("µs", higher_is_better=False)
+def inference_single(repeat):
+    """Median latency of one-window predicts, the dashboard's per-reading path."""
+    model = load_bench_model()
+    x = np.random.default_rng(0).random((1,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    model.predict(x, verbose=0)
+    runs = 200
+    best = []
+    for _ in range(repeat):
+        times = np.empty(runs)
+        for i in range(runs):
+            start = time.perf_counter()
+            model.predict(x, verbose=0)
+            times[i] = time.perf_counter() - start
+        best.append(times)
+    times = min(best, key=np.median)
+    return float(np.median(times) * 1e6), {"p99_us": round(float(np.percentile(times, 99) * 1e6), 1),
+                                          "input_shape": list(model.input_shape)}
+
+
+@benchmark("windows/s")
+def inference_batched(repeat):
+    """Throughput of large predict batches, the backtest and training-eval path."""
+    model = load_bench_model()
+    x = np.random.default_rng(0).random((BATCH,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    model.predict(x, verbose=0)
+    seconds = best_time(lambda: model.predict(x, verbose=0), repeat)
+    return BATCH / seconds, {"batch": BATCH}
+
+
+@benchmark("requests/s")
+def api_live(repeat):
+    """GET /api/live from concurrent clients against the threaded dev server."""
+    import logging
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The dashboard looks for its model registry relative to the working directory
+        os.chdir(tmp)
+        try:
+            import dashboard
+        finally:
+            os.chdir(cwd)
+        for i in range(dashboard.WINDOW_SIZE):
+            dashboard.record_reading(f"2025-10-21 21:{i // 60:02d}:{i % 60:02d}", 20.0 + i, 30.0 + i)
+        dashboard.publish_reading()
+
+        server = make_server("127.0.0.1", 0, dashboard.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            rates = [measure_http(server.server_port, "/api/live") for _ in range(repeat)]
+        finally:
+            server.shutdown()
+    return max(rates), {"clients": HTTP_CLIENTS, "seconds": HTTP_SECONDS}
+
+
+def measure_http(port, path, clients=HTTP_CLIENTS, seconds=HTTP_SECONDS):
+    counts = [0] * clients
+    errors = [0] * clients
+    stop = time.perf_counter() + seconds
+
+    def client(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while time.perf_counter() < stop:
+            try:
+                conn.request("GET", path)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status == 200:
+                    counts[i] += 1
+                else:
+                    errors[i] += 1
+            except (OSError, http.client.HTTPException):
+                errors[i] += 1
+                conn.close()
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if sum(errors):
+        print(f"⚠️ {sum(errors)} failed requests to {path}")
+    return sum(counts) / elapsed
+
+
+# ---------------- RESULTS ----------------
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_benchmarks(names, repeat=REPEAT):
+    results = {}
+    for name in names:
+        fn, unit, higher_is_better = BENCHMARKS[name]
+        try:
+            value, info = fn(repeat)
+        except Exception as e:
+            print(f"⚠️ {name}: skipped ({e})")
+            results[name] = {"unit": unit, "error": str(e)}
+            continue
+        results[name] = dict(value=round(value, 3), unit=unit, higher_is_better=higher_is_better, **info)
+        print(f"⏱️ {name:<20}{value:>14,.1f} {unit}")
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Print the change against the baseline; returns the names that regressed past `tolerance`.
+
+    A benchmark the baseline measured but that now fails counts as regressed.
+    """
+    regressed = []
+    print(f"\n{'benchmark':<20}{'baseline':>14}{'now':>14}{'change':>10}")
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        if not base.get("value"):
+            continue
+        if "value" not in result:
+            regressed.append(name)
+            print(f"{name:<20}{base['value']:>14,.1f}{'error':>14}{'':>10}  ❌ {result.get('error')}")
+            continue
+        change = result["value"] / base["value"] - 1
+        worse = -change if result["higher_is_better"] else change
+        flag = ""
+        if worse > tolerance:
+            regressed.append(name)
+            flag = "  ❌ regression"
+        print(f"{name:<20}{base['value']:>14,.1f}{result['value']:>14,.1f}{change:>+10.1%}{flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DeepAir hot paths")
+    parser.add_argument("--only", help="comma-separated benchmarks: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("-o", "--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="fractional slowdown that counts as a regression (default 0.25)")
+    parser.add_argument("--ci", action="store_true", default=bool(os.environ.get("CI")),
+                        help="exit non-zero when there is no baseline (default when $CI is set)")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"❌ Unknown benchmark(s): {', '.join(unknown)}")
+
+    report = {"environment": environment(), "results": run_benchmarks(names, args.repeat)}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(report["results"], baseline["results"], args.tolerance)
+        if regressed:
+            print(f"❌ Failing, or slower than the baseline by more than {args.tolerance:.0%}: "
+                  f"{', '.join(regressed)}")
+            sys.exit(1)
+        print("✅ No regressions against the baseline.")
+    elif args.ci:
+        print(f"❌ No baseline at {args.baseline}, so regressions can't be checked; "
+              "run with --save-baseline on the reference commit first.")
+        sys.exit(2)
+    else:
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline to create one.")
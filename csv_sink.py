@@ -0,0 +1,230 @@
+"""
+Batched CSV writer shared by the loggers and the dashboard.
+
+Keeps the file open, buffers rows in memory and writes them out when
+`flush_rows` rows are pending or `flush_interval` seconds have passed,
+instead of an open/write/close per sample. Files can rotate by size or
+by day, and buffered rows are flushed on close, at interpreter exit and
+on SIGTERM (see handle_sigterm).
+"""
+
+import atexit
+import csv
+import os
+import signal
+import threading
+import time
+from datetime import date, datetime
+
+from metrics import CSV_FLUSH_SECONDS
+
+FSYNC_NEVER = "never"    # leave durability to the OS page cache
+FSYNC_FLUSH = "flush"    # fsync after every batch is written
+FSYNC_CLOSE = "close"    # fsync once when the sink is closed or rotated
+
+
+class CsvSink:
+    """Append-only CSV writer with in-memory batching and optional rotation.
+
+    rotate_bytes: start a new file once the current one reaches this size.
+    rotate_daily: start a new file on the first row of a new day.
+    Rotated files keep the original name with a date/time suffix, so the
+    active file is always at `path`. An existing file whose header is a
+    prefix of `header` gets the new columns added in place; any other
+    header is refused rather than mixed with the new layout.
+    """
+
+    def __init__(self, path, header, flush_rows=100, flush_interval=5.0,
+                 fsync=FSYNC_NEVER, rotate_bytes=None, rotate_daily=False):
+        if fsync not in (FSYNC_NEVER, FSYNC_FLUSH, FSYNC_CLOSE):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.header = list(header)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+
+        self._rows = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._day = None
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._open()
+
+        self._stop = threading.Event()
+        if flush_interval:
+            # Flush idle buffers even when no new rows arrive to trigger it
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    # ---------------- file handling ----------------
+    def _open(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if not new_file:
+            existing = self._existing_header()
+            if existing != self.header:
+                if self.header[:len(existing)] != existing:
+                    raise ValueError(f"{self.path} has columns {existing}, expected {self.header}; "
+                                     "move it aside or log to another file")
+                # Columns were appended: extend the header in place, keeping every row
+                extend_csv_header(self.path, self.header)
+        self._file = open(self.path, "a", newline="")
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(self.header)
+        self._day = date.fromtimestamp(os.path.getmtime(self.path)) if not new_file else date.today()
+
+    def _existing_header(self):
+        with open(self.path, newline="") as f:
+            return next(csv.reader(f), [])
+
+    def _rotated_name(self, suffix):
+        stem, ext = os.path.splitext(self.path)
+        candidate = f"{stem}.{suffix}{ext}"
+        n = 1
+        while os.path.exists(candidate):
+            candidate = f"{stem}.{suffix}-{n}{ext}"
+            n += 1
+        return candidate
+
+    def _rotate(self, suffix):
+        self._sync(final=True)
+        self._file.close()
+        os.replace(self.path, self._rotated_name(suffix))
+        self._open()
+
+    def _maybe_rotate(self):
+        today = date.today()
+        if self.rotate_daily and today != self._day:
+            self._rotate(self._day.isoformat())
+        elif self.rotate_bytes and self._file.tell() >= self.rotate_bytes:
+            self._rotate(datetime.now().strftime("%Y-%m-%dT%H-%M-%S"))
+
+    def _sync(self, final=False):
+        self._file.flush()
+        if self.fsync == FSYNC_FLUSH or (final and self.fsync == FSYNC_CLOSE):
+            os.fsync(self._file.fileno())
+
+    # ---------------- public API ----------------
+    def write(self, row):
+        """Queue one row; writes the batch out if a threshold is reached."""
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"CsvSink for {self.path} is closed")
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_rows or \
+                    time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            if not self._closed:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        with CSV_FLUSH_SECONDS.time():
+            self._maybe_rotate()
+            self._writer.writerows(self._rows)
+            self._rows.clear()
+            self._sync()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if not self._closed and self._rows and \
+                        time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    def prune_before(self, cutoff):
+        """Drop rows older than `cutoff` ("%Y-%m-%d %H:%M:%S") from the active file; returns how many."""
+        with self._lock:
+            if self._closed:
+                return 0
+            self._flush_locked()
+            self._sync(final=True)
+            self._file.close()
+            try:
+                return prune_csv(self.path, cutoff)
+            finally:
+                self._open()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._sync(final=True)
+            self._file.close()
+            self._closed = True
+        self._stop.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def extend_csv_header(path, header):
+    """Rewrite a CSV under a longer `header`, padding short rows with empty fields.
+
+    Rows that already have more fields (e.g. written by an older logger
+    that never updated the header) are kept whole.
+    """
+    tmp = path + ".tmp"
+    with open(path, newline="") as src, open(tmp, "w", newline="") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        next(reader, None)
+        writer.writerow(header)
+        width = len(header)
+        for row in reader:
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            writer.writerow(row)
+    os.replace(tmp, path)
+
+
+def prune_csv(path, cutoff):
+    """Rewrite a time-ordered CSV without the rows whose timestamp (first column) is before `cutoff`.
+
+    Timestamps in "%Y-%m-%d %H:%M:%S" sort as text, so rows are compared as
+    bytes and everything after the first kept row is copied unparsed.
+    Returns the number of rows removed.
+    """
+    import shutil
+
+    cutoff = cutoff.encode()
+    removed = 0
+    with open(path, "rb") as src:
+        header = src.readline()
+        while True:
+            line = src.readline()
+            if not line or line[:len(cutoff)] >= cutoff:
+                break
+            removed += 1
+        if removed == 0:
+            return 0
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as dst:
+            dst.write(header)
+            dst.write(line)
+            shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(tmp, path)
+    return removed
+
+
+def handle_sigterm():
+    """Turn SIGTERM into SystemExit so finally blocks and atexit flush buffered rows."""
+    def _raise_exit(signum, frame):
+        raise SystemExit(128 + signum)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _raise_exit)
@@ -1,28 +1,52 @@
 # live_dashboard.py
 import time
 import threading
-from collections import deque
+from collections import deque, namedtuple
+import importlib.util
 import os
-import csv
+import sys
 
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, Response, g, jsonify, render_template_string, request
 from flask_cors import CORS
 
 from sds011_reader import SDS011
+from csv_sink import CsvSink
+from ts_store import TimeSeriesStore, format_epoch, to_epoch, now_epoch
+from downsample import METHODS as DOWNSAMPLE_METHODS
+from live_feed import LiveFeed, SnapshotCache
+from shm_ring import ShmRing
+from inference_worker import InferenceWorker, make_predictor, forecast_series, forecast_cells
+from feature_window import ScaledWindow
 
-# Optional model imports
-try:
-    from tensorflow.keras.models import load_model
-    from joblib import load as joblib_load
-    MODEL_AVAILABLE = True
-except Exception:
-    MODEL_AVAILABLE = False
+from model_registry import ModelWatcher, current_version
+from aqi import NowCastTracker, describe as describe_aqi, CATEGORY_COLORS, AVERAGE_HOURS
+from rollups import Rollups, build as build_rollups, read_tier, to_json as rollups_json, TIERS as ROLLUP_TIERS, STATE_FILE as ROLLUP_STATE
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_SECONDS, SAMPLE_AGE, SENSOR_ERRORS
+from metrics import serve as serve_metrics
+
+# Optional model support (numpy_lstm runs the LSTM without TensorFlow)
+MODEL_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("numpy_lstm", "joblib"))
 
 # ---------------- CONFIG ----------------
 PORT = "COM3"           # Your sensor COM port
 READ_INTERVAL = 2        # seconds between reads
 WINDOW_SIZE = 30        # number of points for dashboard graph
 CSV_FILE = "live_air_quality.csv"  # auto-save file
+CSV_HEADER = ["timestamp", "pm25", "pm10", "predicted_pm25", "forecast_pm25", "forecast_pm10"]
+CSV_FLUSH_INTERVAL = 10  # seconds readings may sit in memory before being written
+STORE_DIR = "live_air_quality.store"  # binary copy of the CSV for fast history loads
+HISTORY_POINTS = 500     # default max points returned by /api/history
+MAX_HISTORY_POINTS = 5000
+# Multi-process mode: `python dashboard.py --acquire` owns the sensor and writes
+# readings to this shared-memory ring; web workers (e.g. gunicorn) started with
+# DEEPAIR_SHM set follow the ring instead of opening the port themselves.
+SHM_NAME = os.environ.get("DEEPAIR_SHM")
+SHM_POLL_INTERVAL = 0.2  # seconds between ring checks in web workers
+ACQUIRE_METRICS_PORT = 5002  # /metrics of the --acquire process (serial, decode, predict, CSV)
+MODEL_REGISTRY = "models"  # versioned models; falls back to pm25_lstm_model.h5 + scaler.save
+ROLLUP_DIR = "live_air_quality.rollups"  # 1m/15m/1h/1d aggregates, kept when raw rows are pruned
+RAW_RETENTION_DAYS = None  # e.g. 30 to drop raw CSV/store rows older than that; None keeps everything
+RETENTION_CHECK_INTERVAL = 3600  # seconds between retention passes
 # --------------------------------------
 
 app = Flask(__name__)
@@ -32,27 +56,156 @@ CORS(app)
 pm25_buf = deque(maxlen=WINDOW_SIZE)
 pm10_buf = deque(maxlen=WINDOW_SIZE)
 ts_buf = deque(maxlen=WINDOW_SIZE)
-latest = {"pm25": None, "pm10": None, "timestamp": None, "predicted_pm25": None}
+latest = {"pm25": None, "pm10": None, "timestamp": None, "predicted_pm25": None, "forecast": None, "aqi": None}
+nowcast = NowCastTracker("pm25")  # running 12 h NowCast behind latest["aqi"]
+feed = LiveFeed()  # pushes each new reading to /api/stream clients
+snapshots = SnapshotCache()  # pre-encoded /api/live body, replaced once per reading
+shm_ring = None  # set in the acquisition process when readings are shared with web workers
+# Guards latest/buffers/snapshot/store, which the sensor and inference threads both update
+state_lock = threading.Lock()
 
-# Load model & scaler if available
-model = None
-scaler = None
-if MODEL_AVAILABLE:
-    try:
-        if os.path.exists("pm25_lstm_model.h5") and os.path.exists("scaler.save"):
-            model = load_model("pm25_lstm_model.h5")
-            scaler = joblib_load("scaler.save")
-            print("✅ Prediction model and scaler loaded.")
-        else:
-            print("⚠️ Model or scaler files not found — predictions disabled.")
-    except Exception as e:
-        print("⚠️ Error loading model/scaler:", e)
+# Web workers imported by a WSGI server follow the acquisition process's ring
+FOLLOW_SHM = SHM_NAME is not None and __name__ != "__main__"
+
+# Load model & scaler if available; the watcher hot-swaps newly published versions
+watcher = None
+if MODEL_AVAILABLE and not FOLLOW_SHM:
+    watcher = ModelWatcher(MODEL_REGISTRY).start()
+    if watcher.active is None:
+        print("⚠️ Model or scaler files not found — predictions disabled until one is published.")
 
-# Create CSV with headers if doesn't exist
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "pm25", "pm10", "predicted_pm25"])
+# Storage is opened at startup (open_storage), never on import, so importing the
+# module (tests, benchmark.py, acquisition.py --dashboard) leaves the logs untouched
+csv_sink = None
+store = None
+rollups = None
+
+def open_storage(record=True):
+    """Open the binary store, plus the CSV log and rollups when this process records readings."""
+    global csv_sink, store, rollups
+    store = TimeSeriesStore(STORE_DIR)
+    if not record:
+        # Web workers only read the store and the rollup tier files
+        return
+    # CSV writer (creates the file with headers if it doesn't exist)
+    csv_sink = CsvSink(CSV_FILE, CSV_HEADER, flush_interval=CSV_FLUSH_INTERVAL)
+    if not os.path.exists(os.path.join(ROLLUP_DIR, ROLLUP_STATE)) and len(store):
+        rollups = build_rollups(STORE_DIR, ROLLUP_DIR)
+        print(f"✅ Rolled up {len(store)} stored readings into {ROLLUP_DIR}")
+    else:
+        rollups = Rollups(ROLLUP_DIR)
+
+def preload_history():
+    """Fill the graph buffers from the binary store so a restart keeps recent history."""
+    if store is None:
+        return
+    recent = store.tail(WINDOW_SIZE)
+    if len(recent["timestamp"]):
+        # The NowCast needs the last 12 hours, not just the graph window
+        day = store.range(recent["timestamp"][-1] - AVERAGE_HOURS * 3600, None, ["timestamp", "pm25"])
+        nowcast.add_many(day["timestamp"], day["pm25"])
+    for ts, pm25, pm10 in zip(recent["timestamp"], recent["pm25"], recent["pm10"]):
+        ts_buf.append(format_epoch(ts))
+        pm25_buf.append(round(float(pm25), 1))
+        pm10_buf.append(round(float(pm10), 1))
+        if engine is not None:
+            engine.window.push_reading(float(pm25), float(pm10))
+    publish_snapshot()
+
+def publish_snapshot():
+    """Encode the current state for /api/live; only the sensor thread calls this."""
+    snapshots.publish({
+        "latest": dict(latest),
+        "seq": feed.seq,
+        "model": model_status(),
+        "history": {
+            "timestamps": list(ts_buf),
+            "pm25": list(pm25_buf),
+            "pm10": list(pm10_buf)
+        }
+    })
+
+def model_status():
+    if watcher is None:
+        # Web workers don't run the model; report what the registry points at
+        return {"version": current_version(MODEL_REGISTRY), "loaded_at": None, "previous": None}
+    current = engine.model if engine is not None else None
+    previous = watcher.previous
+    return {
+        "version": current.version if current else None,
+        "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current.loaded_at)) if current else None,
+        "previous": previous.version if previous and previous is not current else None,
+    }
+
+def record_reading(timestamp, pm25, pm10):
+    pm25_buf.append(float(pm25))
+    pm10_buf.append(float(pm10))
+    ts_buf.append(timestamp)
+    latest["pm25"] = float(pm25)
+    latest["pm10"] = float(pm10)
+    latest["timestamp"] = timestamp
+    nowcast.add(to_epoch(timestamp), float(pm25))
+    latest["aqi"] = describe_aqi(float(pm25), float(pm10), nowcast)
+
+def publish_reading():
+    feed.publish(dict(latest))
+    publish_snapshot()
+
+def save_reading(timestamp, pm25, pm10, predicted, forecast=None):
+    if shm_ring is not None:
+        shm_ring.append(to_epoch(timestamp), pm25, pm10, predicted)
+    csv_sink.write([timestamp, pm25, pm10, predicted] + forecast_cells(forecast))
+    store.append(timestamp, pm25, pm10, predicted)
+    rollups.add(to_epoch(timestamp), float(pm25), float(pm10))
+
+def on_prediction(job, pred):
+    """Inference worker callback: publish the forecast and persist the reading it belongs to."""
+    timestamp, pm25, pm10 = job.context
+    predicted = forecast = None
+    if pred is not None:
+        predicted = float(pred[0, 0])  # next PM2.5 step
+        forecast = forecast_series(pred)
+    with state_lock:
+        if predicted is not None and latest["timestamp"] == timestamp:
+            latest["predicted_pm25"] = predicted
+            latest["forecast"] = forecast
+            feed.publish({"timestamp": timestamp, "predicted_pm25": predicted, "forecast": forecast},
+                         event="prediction")
+            publish_snapshot()
+        save_reading(timestamp, pm25, pm10, predicted, forecast)
+
+# Inference runs off the sensor thread so serial reads never wait on model.predict.
+# An engine pairs one model version with its worker and its scaled input window;
+# only the sensor thread replaces it, so a reading never mixes two versions.
+PredictionEngine = namedtuple("PredictionEngine", ["model", "inference", "window"])
+engine = None
+
+def build_engine(model_version):
+    model = model_version.model
+    window = ScaledWindow.from_scaler(model.input_shape[1], model_version.scaler)
+    for pm25, pm10 in list(zip(pm25_buf, pm10_buf))[-window.size:]:
+        window.push_reading(pm25, pm10)
+    inference = InferenceWorker(make_predictor(model, model_version.scaler, prescaled=True), on_prediction)
+    return PredictionEngine(model_version, inference, window)
+
+def sync_engine():
+    """Switch to the watcher's active model version if it changed; sensor thread only."""
+    global engine
+    if watcher is None or watcher.active is None:
+        return
+    active = watcher.active
+    if engine is not None and engine.model is active:
+        return
+    old = engine
+    with state_lock:
+        engine = build_engine(active)
+        publish_snapshot()
+    if old is not None:
+        # Let the old worker finish (and save) the readings it already has
+        threading.Thread(target=old.inference.stop, kwargs={"timeout": 5}, daemon=True).start()
+
+sync_engine()
+publish_snapshot()
 
 # ---------------- SENSOR THREAD ----------------
 def sensor_loop():
@@ -64,54 +217,185 @@ def sensor_loop():
             if pm25 is None:
                 time.sleep(1)
                 continue
-            pm25_buf.append(float(pm25))
-            pm10_buf.append(float(pm10))
-            ts_buf.append(timestamp)
-            latest["pm25"] = float(pm25)
-            latest["pm10"] = float(pm10)
-            latest["timestamp"] = timestamp
-
-            # Prediction
-            if model is not None and scaler is not None and len(pm25_buf) >= model.input_shape[1]:
-                import numpy as np
-                window = list(pm25_buf)[-model.input_shape[1]:]
-                arr = np.array(window).reshape(-1,1)
-                try:
-                    scaled = scaler.transform(arr)
-                    scaled = scaled.reshape(1, scaled.shape[0],1)
-                    pred_scaled = model.predict(scaled, verbose=0)
-                    pred = scaler.inverse_transform(pred_scaled)[0][0]
-                    latest["predicted_pm25"] = float(pred)
-                except Exception:
-                    latest["predicted_pm25"] = None
-            else:
-                latest["predicted_pm25"] = None
+            sync_engine()
+            with state_lock:
+                record_reading(timestamp, pm25, pm10)
+                publish_reading()
 
-            # Save to CSV
-            with open(CSV_FILE, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    timestamp, pm25, pm10, latest["predicted_pm25"]
-                ])
+            # Prediction (the reading is saved once its prediction comes back)
+            if engine is not None:
+                engine.window.push_reading(float(pm25), float(pm10))
+            if engine is not None and engine.window.full:
+                engine.inference.submit(PORT, engine.window.values(), (timestamp, pm25, pm10))
+            else:
+                with state_lock:
+                    save_reading(timestamp, pm25, pm10, None)
 
             time.sleep(READ_INTERVAL)
     except Exception as e:
+        SENSOR_ERRORS.inc()
         print("Sensor loop error:", e)
     finally:
+        if engine is not None:
+            engine.inference.stop(timeout=5)
+        csv_sink.flush()
+        with state_lock:
+            store.close()
+            rollups.close()
         sensor.close()
 
+# ---------------- RETENTION ----------------
+def enforce_retention():
+    """Every RETENTION_CHECK_INTERVAL, drop raw rows older than RAW_RETENTION_DAYS; rollups keep them."""
+    while True:
+        cutoff = now_epoch() - RAW_RETENTION_DAYS * 86400
+        try:
+            with state_lock:
+                rollups.flush()
+                from_store = store.prune_before(cutoff)
+            from_csv = csv_sink.prune_before(format_epoch(cutoff))
+            if from_store or from_csv:
+                print(f"🧹 Pruned raw rows before {format_epoch(cutoff)}: {from_csv} CSV, {from_store} store")
+        except Exception as e:
+            print("⚠️ Retention error:", e)
+        time.sleep(RETENTION_CHECK_INTERVAL)
+
+# ---------------- SHARED-MEMORY FOLLOWER ----------------
+def follow_shm():
+    """Mirror the acquisition process's ring into this worker's buffers, feed and snapshot."""
+    ring = None
+    seen = 0
+    while True:
+        if ring is None:
+            try:
+                ring = ShmRing(SHM_NAME)
+            except FileNotFoundError:
+                time.sleep(1)
+                continue
+            # History up to now was preloaded from the store
+            seen = ring.count
+        count = ring.count
+        if count < seen:
+            seen = 0
+        if count == seen:
+            time.sleep(SHM_POLL_INTERVAL)
+            continue
+        count, rows = ring.tail(min(count - seen, WINDOW_SIZE))
+        for row in rows:
+            pred = float(row["predicted_pm25"])
+            with state_lock:
+                record_reading(format_epoch(row["timestamp"]), round(float(row["pm25"]), 1),
+                               round(float(row["pm10"]), 1))
+                latest["predicted_pm25"] = None if pred != pred else pred
+                publish_reading()
+        seen = count
+
+if FOLLOW_SHM:
+    open_storage(record=False)
+    preload_history()
+    threading.Thread(target=follow_shm, daemon=True).start()
+
 # ---------------- FLASK API ----------------
+# Scrape-time gauge: no work on the sensor thread
+SAMPLE_AGE.set_function(lambda: now_epoch() - to_epoch(latest["timestamp"]) if latest["timestamp"] else None)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_latency(response):
+    started = g.get("request_started")
+    if started is not None:
+        # SSE streams return before they are consumed, so this times the handler, not the stream
+        HTTP_REQUEST_SECONDS.labels(request.endpoint or "unmatched").observe(time.perf_counter() - started)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of this process's latency histograms, counters and gauges."""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route("/api/live")
 def api_live():
+    snap = snapshots.current
+    if request.if_none_match.contains(snap.etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(snap.body, mimetype="application/json")
+    resp.set_etag(snap.etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/api/stream")
+def api_stream():
+    """Server-Sent Events stream of new readings; resumes from Last-Event-ID or ?since=."""
+    cursor = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        cursor = None
+    return Response(feed.stream(cursor), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/model")
+def api_model():
+    """Model version currently serving predictions, and the one kept for rollback."""
+    return jsonify(model_status())
+
+def parse_time(value):
+    """Accept epoch seconds or "YYYY-mm-dd HH:MM:SS" in query params."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return to_epoch(value)
+
+@app.route("/api/history")
+def api_history():
+    """Readings between ?from= and ?to=, downsampled on the server to at most ?points=."""
+    try:
+        start = parse_time(request.args.get("from"))
+        end = parse_time(request.args.get("to"))
+        points = min(int(request.args.get("points", HISTORY_POINTS)), MAX_HISTORY_POINTS)
+    except ValueError as e:
+        return jsonify({"error": f"Bad query parameter: {e}"}), 400
+    method = request.args.get("method", "lttb")
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({"error": f"Unknown method '{method}'"}), 400
+    if store is None:
+        return jsonify({"error": "No history store in this process"}), 503
+
+    rows = store.range(start, end)
+    ts = rows["timestamp"]
+    idx = DOWNSAMPLE_METHODS[method](ts, rows["pm25"], points)
     return jsonify({
-        "latest": latest,
-        "history": {
-            "timestamps": list(ts_buf),
-            "pm25": list(pm25_buf),
-            "pm10": list(pm10_buf)
-        }
+        "count": int(len(ts)),
+        "returned": int(len(idx)),
+        "timestamps": [format_epoch(t) for t in ts[idx]],
+        "pm25": [round(float(v), 1) for v in rows["pm25"][idx]],
+        "pm10": [round(float(v), 1) for v in rows["pm10"][idx]],
     })
 
+@app.route("/api/rollups")
+def api_rollups():
+    """Aggregates of ?tier= (1m, 15m, 1h, 1d) between ?from= and ?to=: count, min, max and mean."""
+    tier = request.args.get("tier", "1h")
+    if tier not in ROLLUP_TIERS:
+        return jsonify({"error": f"Unknown tier '{tier}' (choose from {', '.join(ROLLUP_TIERS)})"}), 400
+    try:
+        start = parse_time(request.args.get("from"))
+        end = parse_time(request.args.get("to"))
+    except ValueError as e:
+        return jsonify({"error": f"Bad query parameter: {e}"}), 400
+    if rollups is None:
+        records = read_tier(ROLLUP_DIR, tier, start, end)
+    else:
+        with state_lock:
+            records = rollups.read(tier, start, end)
+    return jsonify(dict(tier=tier, returned=int(len(records)), **rollups_json(records)))
+
 # ---------------- DASHBOARD HTML ----------------
 HTML = """
 <!doctype html>
@@ -133,6 +417,8 @@ HTML = """
     <div>Measured PM2.5: <span id="pm25" class="val">—</span> µg/m³</div>
     <div>Measured PM10: <span id="pm10" class="val">—</span> µg/m³</div>
     <div>Predicted Next PM2.5: <span id="pred" class="val">—</span> µg/m³</div>
+    <div id="forecast-box" style="display:none">Forecast PM2.5: <span id="forecast">—</span> µg/m³</div>
+    <div>AQI (NowCast): <span id="aqi" class="val">—</span></div>
     <div>Last Update: <span id="last" class="val">—</span></div>
   </div>
 
@@ -144,70 +430,105 @@ HTML = """
 const ctx = document.getElementById('chart').getContext('2d');
 let chart;
 
-function getColorPM25(value){
-  if(value <= 12) return 'green';
-  if(value <= 35) return 'yellow';
-  if(value <= 55) return 'orange';
-  if(value <= 150) return 'red';
-  return 'purple';
+// AQI categories are computed on the server (aqi.py); only their colors live here
+const AQI_COLORS = {{ aqi_colors|tojson }};
+
+const WINDOW_SIZE = {{ window_size }};
+let hist = { timestamps: [], pm25: [], pm10: [] };
+let seq = 0;
+
+function showLatest(latest){
+  const pm25_val = latest.pm25 !== null ? latest.pm25.toFixed(2) : "—";
+  const pm10_val = latest.pm10 !== null ? latest.pm10.toFixed(2) : "—";
+  const pred_val = latest.predicted_pm25 !== null ? latest.predicted_pm25.toFixed(2) : "—";
+
+  document.getElementById('pm25').innerText = pm25_val;
+  document.getElementById('pm10').innerText = pm10_val;
+  document.getElementById('pred').innerText = pred_val;
+  document.getElementById('last').innerText = latest.timestamp || "—";
+  showForecast(latest.forecast);
+
+  // set background colors
+  const aqi = latest.aqi;
+  document.getElementById('pm25').style.backgroundColor = aqi ? AQI_COLORS[aqi.pm25_category] : 'transparent';
+  document.getElementById('pm10').style.backgroundColor = aqi ? AQI_COLORS[aqi.pm10_category] : 'transparent';
+  document.getElementById('pm25').style.color = 'white';
+  document.getElementById('pm10').style.color = 'white';
+  const aqi_el = document.getElementById('aqi');
+  aqi_el.innerText = aqi ? ((aqi.nowcast !== null ? aqi.nowcast : Math.max(aqi.pm25, aqi.pm10)) + ' ' + aqi.category) : "—";
+  aqi_el.style.backgroundColor = aqi ? AQI_COLORS[aqi.category] : 'transparent';
+  aqi_el.style.color = aqi ? 'white' : '';
+}
+
+function showForecast(forecast){
+  // Only multi-step models have an outlook worth showing beyond the next value
+  const steps = forecast && forecast.pm25 ? forecast.pm25 : [];
+  document.getElementById('forecast-box').style.display = steps.length > 1 ? '' : 'none';
+  document.getElementById('forecast').innerText = steps.map(v => v.toFixed(1)).join(' → ');
 }
 
-function getColorPM10(value){
-  if(value <= 54) return 'green';
-  if(value <= 154) return 'yellow';
-  if(value <= 254) return 'orange';
-  if(value <= 354) return 'red';
-  return 'purple';
+function drawChart(){
+  if(!chart){
+    chart = new Chart(ctx, {
+      type: 'line',
+      data: {
+        labels: hist.timestamps,
+        datasets: [
+          { label: 'PM2.5', data: hist.pm25, fill: false, borderColor: 'red', tension: 0.2 },
+          { label: 'PM10', data: hist.pm10, fill: false, borderColor: 'blue', tension: 0.2 }
+        ]
+      },
+      options: { responsive: true, scales: { y: { beginAtZero: true } } }
+    });
+  } else {
+    chart.data.labels = hist.timestamps;
+    chart.data.datasets[0].data = hist.pm25;
+    chart.data.datasets[1].data = hist.pm10;
+    chart.update();
+  }
 }
 
 async function fetchLive(){
   try{
     const res = await fetch('/api/live');
     const data = await res.json();
-    const hist = data.history;
-
-    const pm25_val = data.latest.pm25 !== null ? data.latest.pm25.toFixed(2) : "—";
-    const pm10_val = data.latest.pm10 !== null ? data.latest.pm10.toFixed(2) : "—";
-    const pred_val = data.latest.predicted_pm25 !== null ? data.latest.predicted_pm25.toFixed(2) : "—";
-
-    document.getElementById('pm25').innerText = pm25_val;
-    document.getElementById('pm10').innerText = pm10_val;
-    document.getElementById('pred').innerText = pred_val;
-    document.getElementById('last').innerText = data.latest.timestamp || "—";
-
-    // set background colors
-    document.getElementById('pm25').style.backgroundColor = pm25_val !== "—" ? getColorPM25(parseFloat(pm25_val)) : 'transparent';
-    document.getElementById('pm10').style.backgroundColor = pm10_val !== "—" ? getColorPM10(parseFloat(pm10_val)) : 'transparent';
-    document.getElementById('pm25').style.color = 'white';
-    document.getElementById('pm10').style.color = 'white';
-
-    const labels = hist.timestamps.length ? hist.timestamps : [];
-    const pm25 = hist.pm25.length ? hist.pm25 : [];
-    const pm10 = hist.pm10.length ? hist.pm10 : [];
-
-    if(!chart){
-      chart = new Chart(ctx, {
-        type: 'line',
-        data: {
-          labels: labels,
-          datasets: [
-            { label: 'PM2.5', data: pm25, fill: false, borderColor: 'red', tension: 0.2 },
-            { label: 'PM10', data: pm10, fill: false, borderColor: 'blue', tension: 0.2 }
-          ]
-        },
-        options: { responsive: true, scales: { y: { beginAtZero: true } } }
-      });
-    } else {
-      chart.data.labels = labels;
-      chart.data.datasets[0].data = pm25;
-      chart.data.datasets[1].data = pm10;
-      chart.update();
-    }
+    hist = data.history;
+    seq = data.seq;
+    showLatest(data.latest);
+    drawChart();
   } catch(e){ console.error("fetch error", e); }
 }
 
-setInterval(fetchLive, 2000);
-fetchLive();
+function appendReading(latest){
+  hist.timestamps.push(latest.timestamp);
+  hist.pm25.push(latest.pm25);
+  hist.pm10.push(latest.pm10);
+  if(hist.timestamps.length > WINDOW_SIZE){
+    hist.timestamps.shift();
+    hist.pm25.shift();
+    hist.pm10.shift();
+  }
+  showLatest(latest);
+  drawChart();
+}
+
+fetchLive().then(() => {
+  if(window.EventSource){
+    // Only new readings are pushed; the browser resumes with Last-Event-ID after a drop
+    const source = new EventSource('/api/stream?since=' + seq);
+    source.onmessage = (e) => appendReading(JSON.parse(e.data));
+    source.addEventListener('prediction', (e) => {
+      const p = JSON.parse(e.data);
+      if(p.timestamp === document.getElementById('last').innerText){
+        document.getElementById('pred').innerText = p.predicted_pm25.toFixed(2);
+        showForecast(p.forecast);
+      }
+    });
+    source.addEventListener('reset', fetchLive);
+  } else {
+    setInterval(fetchLive, 2000);
+  }
+});
 </script>
 </body>
 </html>
@@ -215,10 +536,28 @@ fetchLive();
 
 @app.route("/")
 def index():
-    return render_template_string(HTML)
+    return render_template_string(HTML, window_size=WINDOW_SIZE, aqi_colors=CATEGORY_COLORS)
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
-    t = threading.Thread(target=sensor_loop, daemon=True)
-    t.start()
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    open_storage()
+    preload_history()
+    if RAW_RETENTION_DAYS:
+        threading.Thread(target=enforce_retention, daemon=True).start()
+    if "--acquire" in sys.argv:
+        # Sensor only; serve HTTP from workers with DEEPAIR_SHM set to the same name
+        shm_ring = ShmRing(SHM_NAME or "deepair", create=True)
+        print(f"🟢 Sharing readings through shared memory '{shm_ring.name}'")
+        # Web workers only see their own HTTP metrics; the sensor-side ones live here
+        serve_metrics(ACQUIRE_METRICS_PORT)
+        print(f"🟢 Metrics at http://localhost:{ACQUIRE_METRICS_PORT}/metrics")
+        try:
+            sensor_loop()
+        except KeyboardInterrupt:
+            print("\n🛑 Acquisition stopped by user.")
+        finally:
+            shm_ring.close()
+    else:
+        t = threading.Thread(target=sensor_loop, daemon=True)
+        t.start()
+        app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
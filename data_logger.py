@@ -1,20 +1,33 @@
 import serial
 import serial.tools.list_ports
-import struct
 import time
-import csv
-import os
 from datetime import datetime
 import sys
 import requests
 
+from sds011_reader import SDS011FrameDecoder, FRAME_LEN, sleep_command, reporting_mode_command
+from csv_sink import CsvSink, handle_sigterm
+from aqi import compute_aqi, NowCastTracker
+from ts_store import now_epoch
+from metrics import RECONNECTS
+
 # ---------------------------------------------------
 # Configuration
 # ---------------------------------------------------
 BAUD_RATE = 9600
 CSV_FILE = "air_quality_log.csv"
-LOG_INTERVAL = 5  # seconds
+LOG_INTERVAL = 1  # seconds (SDS011 streams one frame per second)
 GRAPH_WIDTH = 50
+READ_TIMEOUT = 3  # seconds to wait for a frame before reporting a failed read
+RECONNECT_BACKOFF = 1  # initial seconds between reconnect attempts
+MAX_RECONNECT_BACKOFF = 30
+CSV_FLUSH_INTERVAL = 10  # seconds rows may sit in memory before being written
+CSV_ROTATE_DAILY = False
+
+CSV_HEADER = [
+    "timestamp", "pm2_5", "pm10", "temperature", "humidity",
+    "latitude", "longitude", "AQI_Level", "Category"
+]
 
 # ANSI color codes
 GREEN = "\033[92m"
@@ -23,17 +36,6 @@ RED = "\033[91m"
 BLUE = "\033[94m"
 RESET = "\033[0m"
 
-# ---------------------------------------------------
-# Initialize CSV with headers
-# ---------------------------------------------------
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "timestamp", "pm2_5", "pm10", "temperature", "humidity",
-            "latitude", "longitude", "AQI_Level", "Category"
-        ])
-
 # Keep last readings for ASCII graph
 pm2_5_history = []
 pm10_history = []
@@ -52,22 +54,6 @@ def get_location():
         return None, None
 
 
-def compute_aqi(pm2_5):
-    """Compute approximate AQI and category based on PM2.5."""
-    if pm2_5 <= 12:
-        return 50, "Good"
-    elif pm2_5 <= 35.4:
-        return 100, "Moderate"
-    elif pm2_5 <= 55.4:
-        return 150, "Unhealthy for Sensitive Groups"
-    elif pm2_5 <= 150.4:
-        return 200, "Unhealthy"
-    elif pm2_5 <= 250.4:
-        return 300, "Very Unhealthy"
-    else:
-        return 400, "Hazardous"
-
-
 def color_bar(value):
     """Return color code based on AQI level."""
     if value <= 50:
@@ -80,15 +66,13 @@ def color_bar(value):
 
 def wake_sds011(ser):
     """Send wake command to SDS011 sensor"""
-    wake_cmd = bytes([0xAA, 0xB4, 0x06, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-    ser.write(wake_cmd)
+    ser.write(sleep_command(False))
     time.sleep(0.1)
 
 
 def set_sds011_continuous_mode(ser):
     """Set SDS011 to continuous reporting mode"""
-    continuous_cmd = bytes([0xAA, 0xB4, 0x02, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-    ser.write(continuous_cmd)
+    ser.write(reporting_mode_command(query=False))
     time.sleep(0.1)
 
 
@@ -110,24 +94,93 @@ def find_sds011_port():
     return None
 
 
-def read_sds011(port):
-    """Read PM2.5 and PM10 from SDS011 sensor"""
-    if port is None:
-        return None, None, "No sensor port available"
+class SensorSession:
+    """Long-lived SDS011 serial session.
+
+    Keeps the port open between samples so frames are never lost to an
+    open/close cycle. The port found by find_sds011_port() is cached and
+    only re-probed when reopening it fails; reconnects back off
+    exponentially up to MAX_RECONNECT_BACKOFF seconds.
+    """
+
+    def __init__(self, port=None, baudrate=BAUD_RATE, timeout=READ_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.ser = None
+        self.decoder = SDS011FrameDecoder()
+        self.reconnects = 0
+        self._backoff = RECONNECT_BACKOFF
+        self._retry_at = 0.0
+
+    def open(self):
+        """Open the cached port, re-probing for the sensor if that fails."""
+        if self.port is not None:
+            try:
+                self._connect(self.port)
+                return self.port
+            except (serial.SerialException, OSError):
+                self.port = None
+        self.port = find_sds011_port()
+        if self.port is None:
+            raise serial.SerialException("No sensor port available")
+        self._connect(self.port)
+        return self.port
+
+    def _connect(self, port):
+        ser = serial.Serial(port, self.baudrate, timeout=self.timeout)
+        try:
+            wake_sds011(ser)
+            set_sds011_continuous_mode(ser)
+        except Exception:
+            ser.close()
+            raise
+        self.ser = ser
+        self.decoder.reset()
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.ser = None
+
+    def _drop(self, error):
+        """Close a failed port and schedule the next reconnect attempt."""
+        self.close()
+        self._retry_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, MAX_RECONNECT_BACKOFF)
+        return None, None, f"Error: {error}"
+
+    def read(self):
+        """Return (pm2_5, pm10, status) for the newest frame on the port."""
+        if self.ser is None:
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                return None, None, f"Reconnecting in {wait:.0f}s"
+            try:
+                self.open()
+            except (serial.SerialException, OSError) as e:
+                return self._drop(e)
+            self.reconnects += 1
+            RECONNECTS.inc()
 
-    try:
-        with serial.Serial(port, BAUD_RATE, timeout=3) as ser:
-            for attempt in range(3):
-                data = ser.read(10)
-                if len(data) == 10 and data[0] == 0xAA and data[1] == 0xC0:
-                    pm25 = (data[2] + data[3] * 256) / 10.0
-                    pm10 = (data[4] + data[5] * 256) / 10.0
-                    return pm25, pm10, "Success"
-                time.sleep(0.1)
-    except Exception as e:
-        return None, None, f"Error: {e}"
+        try:
+            frames = self.decoder.feed(self.ser.read(self.ser.in_waiting or FRAME_LEN))
+        except (serial.SerialException, OSError) as e:
+            return self._drop(e)
+
+        if not frames:
+            return None, None, "Read failed"
+        self._backoff = RECONNECT_BACKOFF
+        return frames[-1].pm25, frames[-1].pm10, "Success"
 
-    return None, None, "Read failed"
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 def draw_graph(history, label):
@@ -146,65 +199,88 @@ def draw_graph(history, label):
 # ---------------------------------------------------
 # Main Logging Process
 # ---------------------------------------------------
-sensor_port = find_sds011_port()
-
-if sensor_port is None:
-    print(f"{RED}❌ No SDS011 sensor found!{RESET}")
-    print(f"{YELLOW}Please check:{RESET}")
-    print("1. Sensor connected via USB")
-    print("2. USB-to-serial driver installed")
-    print("3. Sensor powered ON")
-    print("4. Try a different USB port")
-    sys.exit(1)
-
-print(f"{GREEN}✅ SDS011 sensor found on {sensor_port}{RESET}")
-print(f"{BLUE}🟢 Logging SDS011 data every {LOG_INTERVAL}s (Press Ctrl+C to stop)\n{RESET}")
-
-lat, lon = get_location()
-
-try:
-    while True:
-        pm2_5, pm10, status = read_sds011(sensor_port)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        if pm2_5 is not None and pm10 is not None:
-            aqi_value, category = compute_aqi(pm2_5)
-
-            # Save to CSV
-            row = [timestamp, pm2_5, pm10, "", "", lat, lon, aqi_value, category]
-            with open(CSV_FILE, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(row)
-
-            # Update graph history
-            pm2_5_history.append(pm2_5)
-            pm10_history.append(pm10)
-            if len(pm2_5_history) > GRAPH_WIDTH:
-                pm2_5_history.pop(0)
-                pm10_history.pop(0)
-
-            # Build live output
-            output = f"\n🕒 {timestamp}\n"
-            output += f"PM2.5: {pm2_5:.1f} µg/m³ | PM10: {pm10:.1f} µg/m³\n"
-            output += f"AQI: {aqi_value} ({category})\n"
-            if lat and lon:
-                output += f"📍 Location: {lat}, {lon}\n"
-            output += draw_graph(pm2_5_history, "PM2.5") + "\n"
-            output += draw_graph(pm10_history, "PM10") + "\n"
-
-        else:
-            output = f"\n⚠️ Sensor read failed: {status}\n"
-            output += f"{YELLOW}Troubleshooting:{RESET}\n"
-            output += " - Check sensor connection\n"
-            output += " - Ensure sensor is powered ON\n"
-            output += " - Try reconnecting USB cable\n"
-
-        # Clear terminal and display
-        sys.stdout.write("\033[2J\033[H")
-        sys.stdout.write(output)
-        sys.stdout.flush()
-
-        time.sleep(LOG_INTERVAL)
-
-except KeyboardInterrupt:
-    print(f"\n{BLUE}🛑 Logging stopped by user.{RESET}")
\ No newline at end of file
+def main():
+    handle_sigterm()
+    session = SensorSession()
+    try:
+        sensor_port = session.open()
+    except (serial.SerialException, OSError):
+        print(f"{RED}❌ No SDS011 sensor found!{RESET}")
+        print(f"{YELLOW}Please check:{RESET}")
+        print("1. Sensor connected via USB")
+        print("2. USB-to-serial driver installed")
+        print("3. Sensor powered ON")
+        print("4. Try a different USB port")
+        sys.exit(1)
+
+    print(f"{GREEN}✅ SDS011 sensor found on {sensor_port}{RESET}")
+    print(f"{BLUE}🟢 Logging SDS011 data every {LOG_INTERVAL}s (Press Ctrl+C to stop)\n{RESET}")
+
+    lat, lon = get_location()
+    last_logged = 0.0
+    nowcast = NowCastTracker("pm25")
+    sink = CsvSink(CSV_FILE, CSV_HEADER, flush_interval=CSV_FLUSH_INTERVAL,
+                   rotate_daily=CSV_ROTATE_DAILY)
+
+    try:
+        while True:
+            # The read blocks until the sensor's next frame, so the loop runs at its native rate
+            pm2_5, pm10, status = session.read()
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            if pm2_5 is not None and pm10 is not None:
+                now = time.monotonic()
+                if now - last_logged < LOG_INTERVAL:
+                    continue
+                last_logged = now
+
+                aqi_value, category = compute_aqi(pm2_5, pm10)
+                nowcast.add(now_epoch(), pm2_5)
+                nowcast_aqi = nowcast.nowcast_aqi()
+
+                # Save to CSV
+                sink.write([timestamp, pm2_5, pm10, "", "", lat, lon, aqi_value, category])
+
+                # Update graph history
+                pm2_5_history.append(pm2_5)
+                pm10_history.append(pm10)
+                if len(pm2_5_history) > GRAPH_WIDTH:
+                    pm2_5_history.pop(0)
+                    pm10_history.pop(0)
+
+                # Build live output
+                output = f"\n🕒 {timestamp}\n"
+                output += f"PM2.5: {pm2_5:.1f} µg/m³ | PM10: {pm10:.1f} µg/m³\n"
+                output += f"AQI: {aqi_value} ({category})"
+                if nowcast_aqi is not None:
+                    output += f" | NowCast AQI: {nowcast_aqi:.0f}"
+                output += "\n"
+                if lat and lon:
+                    output += f"📍 Location: {lat}, {lon}\n"
+                output += draw_graph(pm2_5_history, "PM2.5") + "\n"
+                output += draw_graph(pm10_history, "PM10") + "\n"
+
+            else:
+                output = f"\n⚠️ Sensor read failed: {status}\n"
+                output += f"{YELLOW}Troubleshooting:{RESET}\n"
+                output += " - Check sensor connection\n"
+                output += " - Ensure sensor is powered ON\n"
+                output += " - Try reconnecting USB cable\n"
+                if session.ser is None:
+                    # Nothing to block on while waiting for the reconnect backoff
+                    time.sleep(1)
+
+            # Clear terminal and display
+            sys.stdout.write("\033[2J\033[H")
+            sys.stdout.write(output)
+            sys.stdout.flush()
+
+    except KeyboardInterrupt:
+        print(f"\n{BLUE}🛑 Logging stopped by user.{RESET}")
+    finally:
+        sink.close()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Downsampling for chart payloads.
+
+Both functions take the x (timestamps) and y (values) arrays of a series
+and return the sorted indices of the points to keep, so the same
+selection can be applied to companion series (pm10, predictions).
+"""
+
+import numpy as np
+
+
+def minmax_indices(y, points):
+    """Keep the min and max of each of points/2 equal-width buckets."""
+    n = len(y)
+    if points >= n or n == 0:
+        return np.arange(n)
+    buckets = max(points // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    y = np.asarray(y)
+    lengths = np.diff(edges)
+    # Build one flat index per bucket position, padded to the longest bucket
+    width = int(lengths.max())
+    offsets = np.arange(width)
+    idx = starts[:, None] + offsets[None, :]
+    valid = offsets[None, :] < lengths[:, None]
+    idx = np.where(valid, idx, starts[:, None])
+    vals = y[idx]
+    lo = idx[np.arange(buckets), np.argmin(np.where(valid, vals, np.inf), axis=1)]
+    hi = idx[np.arange(buckets), np.argmax(np.where(valid, vals, -np.inf), axis=1)]
+    return np.unique(np.concatenate([lo, hi]))
+
+
+def lttb_indices(x, y, points):
+    """Largest-Triangle-Three-Buckets: keeps the visual shape with `points` samples."""
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n) if points >= n else np.linspace(0, n - 1, max(points, 0)).astype(np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    out = np.empty(points, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+METHODS = {
+    "lttb": lambda x, y, points: lttb_indices(x, y, points),
+    "minmax": lambda x, y, points: minmax_indices(y, points),
+}
@@ -0,0 +1,87 @@
+"""
+Preallocated sliding window of model inputs, stored already scaled.
+
+MinMaxScaler.transform is just x * scale_ + min_, so the window applies
+that affine map once per sample as values arrive. Values are written
+twice into a buffer of twice the window length, which keeps the newest
+`size` values contiguous at all times: model input is a ready-made
+(1, size, features) view, with no list copies, array building or scaler
+calls per sample. Multi-feature windows (PM2.5 and PM10) take one value
+per feature on each push.
+"""
+
+import numpy as np
+
+
+class ScaledWindow:
+    def __init__(self, size, scale=1.0, offset=0.0, clip=None, dtype=np.float32):
+        scale = np.atleast_1d(np.asarray(scale, dtype=np.float64))
+        self.size = size
+        self.features = len(scale)
+        if self.features == 1:
+            # Plain floats keep the single-feature push cheap
+            self.scale = float(scale[0])
+            self.offset = float(np.atleast_1d(offset)[0])
+        else:
+            self.scale = scale
+            self.offset = np.asarray(offset, dtype=np.float64)
+        self.clip = clip
+        self.count = 0
+        self._head = 0
+        shape = (2 * size,) if self.features == 1 else (2 * size, self.features)
+        self._buf = np.zeros(shape, dtype=dtype)
+        # One view per head position, built once so reading the window allocates nothing
+        self._views = [self._buf[h:h + size].reshape(1, size, self.features) for h in range(size)]
+
+    @classmethod
+    def from_scaler(cls, size, scaler, feature=None):
+        """Fuse a fitted MinMaxScaler's transform for one feature column, or all of them."""
+        clip = scaler.feature_range if getattr(scaler, "clip", False) else None
+        if feature is None:
+            return cls(size, scaler.scale_, scaler.min_, clip=clip)
+        return cls(size, scaler.scale_[feature], scaler.min_[feature], clip=clip)
+
+    @property
+    def full(self):
+        return self.count >= self.size
+
+    def push(self, value):
+        """Add one reading (a tuple with one value per feature for multi-feature windows)."""
+        if self.features == 1:
+            v = value * self.scale + self.offset
+            if self.clip is not None:
+                v = min(max(v, self.clip[0]), self.clip[1])
+        else:
+            v = np.asarray(value, dtype=np.float64) * self.scale + self.offset
+            if self.clip is not None:
+                v = np.clip(v, self.clip[0], self.clip[1])
+        head = self._head
+        self._buf[head] = v
+        self._buf[head + self.size] = v
+        self._head = head + 1 if head + 1 < self.size else 0
+        self.count += 1
+
+    def push_reading(self, pm25, pm10):
+        """Push a sensor reading; PM10 is only used by two-feature (PM2.5, PM10) windows."""
+        self.push(pm25 if self.features == 1 else (pm25, pm10))
+
+    def view(self):
+        """Zero-copy (1, size, features) view of the scaled window, oldest value first.
+
+        The view changes on the next push(); copy it if it must outlive that.
+        """
+        return self._views[self._head]
+
+    def values(self):
+        """Scaled window as a (size,) view, or (size, features) for multi-feature windows."""
+        view = self._views[self._head][0]
+        return view[:, 0] if self.features == 1 else view
+
+    def inverse(self, scaled):
+        """Map model output back to µg/m³ (the last axis is the feature axis)."""
+        return (scaled - self.offset) / self.scale
+
+    def reset(self):
+        self.count = 0
+        self._head = 0
+        self._buf[:] = 0
@@ -0,0 +1,170 @@
+"""
+Background inference worker for the PM2.5 model.
+
+Sensor loops submit windows and move straight on to the next serial
+read; a single worker thread runs the model. Pending work is bounded and
+latest-wins: a newer window for the same sensor replaces the one still
+waiting, and when too many sensors are queued the oldest is dropped.
+Everything pending when the worker wakes up is stacked into one batch
+and run through a single forward pass. Results for one key are reported
+in submission order, so readings saved from the callback stay in time
+order even when a newer one is dropped while an older one is in flight.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from metrics import PREDICT_SECONDS, DROPPED_PREDICTIONS, PREDICTION_ERRORS, QUEUE_DEPTH
+
+MAX_PENDING = 32  # sensors with a window waiting for inference
+TARGETS = ("pm25", "pm10")  # feature order of the scaler and of multi-output forecasts
+
+
+class InferenceJob:
+    __slots__ = ("key", "window", "context", "submitted", "done", "result")
+
+    def __init__(self, key, window, context):
+        self.key = key
+        self.window = window
+        self.context = context
+        self.submitted = time.monotonic()
+        self.done = False
+        self.result = None
+
+
+def make_predictor(model, scaler, prescaled=False):
+    """Wrap a Keras-style model and fitted MinMaxScaler as windows -> forecasts (B, H, F).
+
+    Windows are (B, n) for a PM2.5-only model or (B, n, F) with one column
+    per scaler feature. The model's outputs are read as H steps of F
+    features, step-major, so a single-output model gives H = 1. The scaler
+    is applied as its fused affine map (x * scale_ + min_). Pass
+    prescaled=True when windows come from a ScaledWindow.
+    """
+    scale = np.asarray(scaler.scale_, dtype=np.float32)
+    offset = np.asarray(scaler.min_, dtype=np.float32)
+    features = len(scale)
+
+    def predict(windows):
+        batch, steps = windows.shape[:2]
+        x = windows.reshape(batch, steps, features)
+        scaled = x if prescaled else x * scale + offset
+        pred_scaled = np.asarray(model.predict(scaled, verbose=0)).reshape(batch, -1, features)
+        return (pred_scaled - offset) / scale
+    return predict
+
+
+def forecast_series(forecast):
+    """{"pm25": [...], "pm10": [...]} from one window's (H, F) forecast."""
+    return {name: [round(float(v), 2) for v in forecast[:, i]]
+            for i, name in enumerate(TARGETS[:forecast.shape[1]])}
+
+
+def forecast_cells(series):
+    """CSV cells for forecast_series() output: one "v1;v2;..." cell per target, blank if absent."""
+    series = series or {}
+    return [";".join(str(v) for v in series.get(name, [])) for name in TARGETS]
+
+
+class InferenceWorker:
+    """Runs `predict` on a daemon thread and reports each job through `on_result(job, prediction)`.
+
+    `prediction` is that window's row of the predict output (an (H, F)
+    forecast for make_predictor), or None when the job was dropped as
+    stale or inference failed, so callers can still persist the reading
+    it belonged to. Each key's jobs are reported in the order they were
+    submitted; a finished job waits for earlier ones still in flight.
+    """
+
+    def __init__(self, predict, on_result, max_pending=MAX_PENDING):
+        self.predict = predict
+        self.on_result = on_result
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._order = {}  # key -> deque of submitted jobs not yet reported, oldest first
+        self._order_lock = threading.Lock()  # held while reporting, so reports never interleave
+        self._stopped = False
+        self.dropped = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def submit(self, key, window, context=None):
+        """Queue a window for `key`; the window is copied, so callers may reuse its buffer."""
+        job = InferenceJob(key, np.array(window, dtype=np.float32), context)
+        with self._order_lock:
+            self._order.setdefault(key, deque()).append(job)
+        dropped = []
+        with self._cond:
+            old = self._pending.pop(key, None)
+            if old is not None:
+                dropped.append(old)
+            while len(self._pending) >= self.max_pending:
+                dropped.append(self._pending.popitem(last=False)[1])
+            self._pending[key] = job
+            self.dropped += len(dropped)
+            QUEUE_DEPTH.set(len(self._pending))
+            self._cond.notify()
+        if dropped:
+            DROPPED_PREDICTIONS.inc(len(dropped))
+            self._complete([(stale, None) for stale in dropped])
+
+    def _complete(self, results):
+        """Record (job, prediction) pairs and report each key's finished jobs in submission order."""
+        with self._order_lock:
+            for job, prediction in results:
+                job.done = True
+                job.result = prediction
+            for key in {job.key for job, _ in results}:
+                queue = self._order.get(key)
+                while queue and queue[0].done:
+                    job = queue.popleft()
+                    self._report(job, job.result)
+                if not queue:
+                    self._order.pop(key, None)
+
+    def _report(self, job, prediction):
+        try:
+            self.on_result(job, prediction)
+        except Exception as e:
+            print("⚠️ Prediction callback error:", e)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopped)
+                if self._stopped and not self._pending:
+                    return
+                jobs = list(self._pending.values())
+                self._pending.clear()
+                QUEUE_DEPTH.set(0)
+
+            # Windows of different lengths can't share a forward pass
+            groups = {}
+            for job in jobs:
+                groups.setdefault(len(job.window), []).append(job)
+            for group in groups.values():
+                try:
+                    with PREDICT_SECONDS.time():
+                        preds = self.predict(np.stack([job.window for job in group]))
+                except Exception as e:
+                    PREDICTION_ERRORS.inc()
+                    print("⚠️ Prediction error:", e)
+                    preds = [None] * len(group)
+                self.batches += 1
+                self._complete(list(zip(group, preds)))
+
+    def stop(self, timeout=None):
+        """Finish the jobs already queued, then end the worker thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
@@ -0,0 +1,399 @@
+"""
+Spatial PM2.5 interpolation from located sensors.
+
+Readings are projected onto a local kilometre plane and interpolated onto
+a regular lat/lon grid: ordinary kriging (pykrige's fitted variogram) for
+up to KRIGING_MAX_SENSORS sensors, otherwise inverse-distance weighting
+over each grid cell's nearest sensors found with a KD-tree.
+
+Once the sensor positions are fixed both methods are linear in the
+readings, so the costly part (variogram fit, kriging solve, neighbour
+search) is done once per sensor layout and cached; every later time step
+is a single matrix product. Finished surfaces and their PNGs are cached
+per time bucket, so repeated map requests cost nothing.
+
+    python interpolation.py                                # air_quality_data_with_coords.csv → PNG
+    python interpolation.py render sensors.csv --at "2025-10-21 21:30:00"
+    python interpolation.py serve sensors.csv              # /map.png and /map.json
+
+Any CSV with latitude/longitude and PM2.5 columns works, e.g. logs of
+several data_logger.py sites concatenated into one file.
+"""
+
+import argparse
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+try:
+    from pykrige.ok import OrdinaryKriging
+except ImportError:
+    OrdinaryKriging = None
+
+from ts_store import PM25_COLUMNS, TIME_FORMAT
+
+DATA_FILE = "air_quality_data_with_coords.csv"
+OUTPUT_IMAGE = "pm25_interpolation.png"
+GRID_SIZE = 100              # cells per side
+GRID_PADDING = 0.1           # fraction of the sensor extent added around it
+MIN_EXTENT_DEG = 0.01        # grid span for a single sensor or a tight cluster
+VARIOGRAM_MODEL = "spherical"
+KRIGING_MAX_SENSORS = 200    # above this, IDW: the kriging solve grows as n³
+IDW_NEIGHBORS = 12
+IDW_POWER = 2
+LAYOUT_CACHE_SIZE = 4        # sensor layouts whose weights are kept
+TILE_BUCKET_SECONDS = 300    # map requests within one bucket share a surface
+TILE_CACHE_SIZE = 288        # one day of 5-minute buckets
+STALE_SECONDS = 600          # a sensor's reading counts for this long after it
+COLOR_MAX = 150.4            # PM2.5 at the top of the colour scale (AQI 200)
+
+LAT_COLUMNS = ("lat", "latitude")
+LON_COLUMNS = ("lon", "lng", "longitude")
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320     # at the equator; scaled by cos(latitude)
+
+Surface = namedtuple("Surface", ["lats", "lons", "values", "method", "sensors"])
+Points = namedtuple("Points", ["lats", "lons", "values"])
+
+
+# ---------------- GEOMETRY ----------------
+def project(lats, lons, lat0):
+    """(n, 2) kilometre coordinates on a plane tangent at latitude `lat0`."""
+    x = np.asarray(lons, dtype=np.float64) * KM_PER_DEG_LON * np.cos(np.radians(lat0))
+    y = np.asarray(lats, dtype=np.float64) * KM_PER_DEG_LAT
+    return np.column_stack([x, y])
+
+
+def grid_bounds(lats, lons, padding=GRID_PADDING):
+    """(lat_min, lat_max, lon_min, lon_max) around the sensors."""
+    bounds = []
+    for values in (lats, lons):
+        lo, hi = float(np.min(values)), float(np.max(values))
+        pad = max((hi - lo) * padding, (MIN_EXTENT_DEG - (hi - lo)) / 2, 0)
+        bounds += [lo - pad, hi + pad]
+    return tuple(bounds)
+
+
+# ---------------- WEIGHTS ----------------
+def kriging_weights(xy, values, grid_xy, variogram_model=VARIOGRAM_MODEL):
+    """(grid, n) ordinary-kriging weights, using a variogram fitted to `values`.
+
+    pykrige fits the variogram; the kriging system is then solved for every
+    grid cell at once, so the result can be reused for new readings.
+    """
+    ok = OrdinaryKriging(xy[:, 0], xy[:, 1], values, variogram_model=variogram_model)
+    gamma = lambda d: ok.variogram_function(ok.variogram_model_parameters, d)
+    n = len(xy)
+    a = np.ones((n + 1, n + 1))
+    a[:n, :n] = gamma(np.linalg.norm(xy[:, None] - xy[None], axis=2))
+    a[np.diag_indices(n)] = 0.0
+    a[n, n] = 0.0
+    dist = np.linalg.norm(grid_xy[:, None] - xy[None], axis=2)
+    b = np.ones((n + 1, len(grid_xy)))
+    b[:n] = gamma(dist).T
+    b[:n][dist.T < 1e-10] = 0.0  # a cell on a sensor takes its reading exactly
+    return np.linalg.solve(a, b)[:n].T, ok.variogram_model_parameters
+
+
+def idw_weights(xy, grid_xy, neighbors=IDW_NEIGHBORS, power=IDW_POWER):
+    """(index, weights), both (grid, k): each cell's nearest sensors and their normalised weights."""
+    k = min(neighbors, len(xy))
+    dist, index = cKDTree(xy).query(grid_xy, k=k)
+    dist, index = dist.reshape(len(grid_xy), k), index.reshape(len(grid_xy), k)
+    hit = dist < 1e-10
+    weights = np.where(hit.any(axis=1, keepdims=True), hit, 1.0 / np.maximum(dist, 1e-10) ** power)
+    return index, weights / weights.sum(axis=1, keepdims=True)
+
+
+class LayoutModel:
+    """Interpolation weights for one set of sensor positions on one grid."""
+
+    def __init__(self, lats, lons, values, size=GRID_SIZE, bounds=None, method=None):
+        self.bounds = bounds or grid_bounds(lats, lons)
+        lat_min, lat_max, lon_min, lon_max = self.bounds
+        self.lats = np.linspace(lat_min, lat_max, size)
+        self.lons = np.linspace(lon_min, lon_max, size)
+        lat0 = (lat_min + lat_max) / 2
+        xy = project(lats, lons, lat0)
+        grid_lat, grid_lon = np.meshgrid(self.lats, self.lons, indexing="ij")
+        grid_xy = project(grid_lat.ravel(), grid_lon.ravel(), lat0)
+
+        self.sensors = len(xy)
+        if method is None:
+            method = "kriging" if OrdinaryKriging is not None and 3 <= self.sensors <= KRIGING_MAX_SENSORS else "idw"
+        self.method = method
+        self.variogram = None
+        if method == "kriging":
+            if OrdinaryKriging is None:
+                raise RuntimeError("kriging needs pykrige (pip install pykrige)")
+            self.weights, self.variogram = kriging_weights(xy, values, grid_xy)
+        else:
+            self.index, self.weights = idw_weights(xy, grid_xy)
+
+    def surface(self, values):
+        """Grid of interpolated values, shape (len(lats), len(lons))."""
+        values = np.asarray(values, dtype=np.float64)
+        if self.method == "kriging":
+            grid = self.weights @ values
+        else:
+            grid = (self.weights * values[self.index]).sum(axis=1)
+        return Surface(self.lats, self.lons, grid.reshape(len(self.lats), len(self.lons)),
+                       self.method, self.sensors)
+
+
+# ---------------- INTERPOLATOR ----------------
+class Interpolator:
+    """Builds surfaces, keeping LayoutModels per sensor layout and surfaces per time bucket.
+
+    A layout is the sorted set of sensor positions: the variogram and the
+    weights are reused until a sensor appears, moves or drops out. Safe to
+    share between request threads.
+    """
+
+    def __init__(self, size=GRID_SIZE, bounds=None, method=None, bucket_seconds=TILE_BUCKET_SECONDS,
+                 tile_cache_size=TILE_CACHE_SIZE):
+        self.size = size
+        self.bounds = bounds
+        self.method = method
+        self.bucket_seconds = bucket_seconds
+        self.tile_cache_size = tile_cache_size
+        self._layouts = OrderedDict()
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def layout(self, lats, lons, values):
+        """The cached LayoutModel for these positions (fitted on `values` when new)."""
+        key = np.round(np.column_stack([lats, lons]), 5).tobytes()
+        with self._lock:
+            model = self._layouts.get(key)
+            if model is not None:
+                self._layouts.move_to_end(key)
+                return model
+        model = LayoutModel(lats, lons, values, self.size, self.bounds, self.method)
+        with self._lock:
+            self._layouts[key] = model
+            while len(self._layouts) > LAYOUT_CACHE_SIZE:
+                self._layouts.popitem(last=False)
+        return model
+
+    def interpolate(self, points):
+        """Surface for one snapshot of Points; positions are put in a canonical order first."""
+        keep = np.isfinite(points.values) & np.isfinite(points.lats) & np.isfinite(points.lons)
+        lats, lons, values = points.lats[keep], points.lons[keep], points.values[keep]
+        if len(values) == 0:
+            raise ValueError("No located readings to interpolate")
+        order = np.lexsort((lons, lats))
+        lats, lons, values = lats[order], lons[order], values[order]
+        return self.layout(lats, lons, values).surface(values)
+
+    def bucket(self, at):
+        return int(at // self.bucket_seconds)
+
+    def tile(self, key, build):
+        """Cached result for `key`, else build() stored under it (LRU, tile_cache_size entries)."""
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+        value = build()
+        with self._lock:
+            self._tiles[key] = value
+            while len(self._tiles) > self.tile_cache_size:
+                self._tiles.popitem(last=False)
+        return value
+
+
+# ---------------- READINGS ----------------
+class PointHistory:
+    """Located readings from a CSV, sorted by time, snapshotted per moment.
+
+    Works with the logger CSV (timestamp, pm2_5, latitude, longitude, ...)
+    and with a plain lat,lon,pm25 file, which is treated as one snapshot.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.version = None
+        self.reload()
+
+    def reload(self):
+        """Re-read the CSV if it changed; returns True when it did."""
+        import pandas as pd
+        from ts_store import read_log_csv
+
+        stat = os.stat(self.csv_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self.version:
+            return False
+        frame = read_log_csv(self.csv_path)
+        lat_col = next((c for c in LAT_COLUMNS if c in frame.columns), None)
+        lon_col = next((c for c in LON_COLUMNS if c in frame.columns), None)
+        pm25_col = next((c for c in PM25_COLUMNS if c in frame.columns), None)
+        if lat_col is None or lon_col is None or pm25_col is None:
+            raise ValueError(f"{self.csv_path} needs latitude, longitude and PM2.5 columns in its header "
+                             f"(it has {', '.join(map(str, frame.columns))})")
+        number = lambda col: pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype=np.float64)
+        lats, lons, values = number(lat_col), number(lon_col), number(pm25_col)
+        if "timestamp" in frame.columns:
+            ts = pd.to_datetime(frame["timestamp"], format=TIME_FORMAT, errors="coerce")
+            seconds = ts.to_numpy().astype("datetime64[s]").astype(np.float64)
+            seconds[ts.isna().to_numpy()] = np.nan
+        else:
+            seconds = np.zeros(len(frame))
+        keep = np.isfinite(seconds) & np.isfinite(lats) & np.isfinite(lons) & np.isfinite(values)
+        order = np.argsort(seconds[keep], kind="stable")
+        self.ts = seconds[keep][order]
+        self.lats, self.lons, self.values = lats[keep][order], lons[keep][order], values[keep][order]
+        self.version = version
+        return True
+
+    @property
+    def last_time(self):
+        return float(self.ts[-1]) if len(self.ts) else None
+
+    def snapshot(self, at=None, max_age=STALE_SECONDS):
+        """Latest reading of every location in (at - max_age, at]; everything if the file has no times."""
+        if len(self.ts) == 0:
+            return Points(np.empty(0), np.empty(0), np.empty(0))
+        if not self.ts.any():
+            lo, hi = 0, len(self.ts)
+        else:
+            at = self.last_time if at is None else at
+            lo = int(np.searchsorted(self.ts, at - max_age, side="right"))
+            hi = int(np.searchsorted(self.ts, at, side="right"))
+        coords = np.round(np.column_stack([self.lats[lo:hi], self.lons[lo:hi]]), 5)[::-1]
+        # Reversed, so np.unique's first occurrence is each location's newest reading
+        _, first = np.unique(coords, axis=0, return_index=True)
+        rows = hi - 1 - first
+        return Points(self.lats[rows], self.lons[rows], self.values[rows])
+
+
+# ---------------- RENDERING ----------------
+def render_png(surface, points=None, title=None, dpi=100):
+    """PNG bytes of a surface, with the sensors marked when `points` is given."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(7, 6), dpi=dpi)
+    ax = fig.add_subplot()
+    extent = [surface.lons[0], surface.lons[-1], surface.lats[0], surface.lats[-1]]
+    image = ax.imshow(surface.values, origin="lower", extent=extent, aspect="auto",
+                      cmap="RdYlGn_r", vmin=0, vmax=COLOR_MAX)
+    fig.colorbar(image, ax=ax, label="PM2.5 (µg/m³)")
+    if points is not None:
+        ax.scatter(points.lons, points.lats, c="black", s=12, marker="^")
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.set_title(title or f"PM2.5 ({surface.method}, {surface.sensors} sensors)")
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def surface_json(surface, at=None):
+    return {
+        "time": at,
+        "method": surface.method,
+        "sensors": surface.sensors,
+        "lats": [round(float(v), 6) for v in surface.lats],
+        "lons": [round(float(v), 6) for v in surface.lons],
+        "pm25": np.round(surface.values, 1).tolist(),
+    }
+
+
+# ---------------- SERVER ----------------
+def create_app(history, interpolator):
+    """Flask app serving cached surfaces: /map.png and /map.json, both taking ?at=<timestamp>."""
+    from flask import Flask, Response, jsonify, request
+    from flask_cors import CORS
+    from ts_store import to_epoch, format_epoch
+
+    app = Flask(__name__)
+    CORS(app)
+    reload_lock = threading.Lock()
+
+    def cached(kind):
+        with reload_lock:
+            history.reload()
+        at = request.args.get("at")
+        at = to_epoch(at) if at else history.last_time
+        if at is None:
+            return None, None
+        bucket = interpolator.bucket(at)
+        at = (bucket + 1) * interpolator.bucket_seconds
+        # The bucket still receiving readings is keyed by file version, so it refreshes as data arrives
+        live = history.last_time is not None and at > history.last_time
+        key = (bucket, history.version if live else None)
+        points = lambda: history.snapshot(at)
+        surface = interpolator.tile(key + ("surface",), lambda: interpolator.interpolate(points()))
+        if kind == "png":
+            return interpolator.tile(key + ("png",), lambda: render_png(
+                surface, points(), f"PM2.5 at {format_epoch(at)}")), at
+        return surface, at
+
+    @app.route("/map.png")
+    def map_png():
+        try:
+            body, _ = cached("png")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 404
+        if body is None:
+            return jsonify({"error": "no readings"}), 404
+        return Response(body, mimetype="image/png")
+
+    @app.route("/map.json")
+    def map_json():
+        try:
+            surface, at = cached("json")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 404
+        if surface is None:
+            return jsonify({"error": "no readings"}), 404
+        return jsonify(surface_json(surface, format_epoch(at)))
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interpolate PM2.5 between located sensors")
+    parser.set_defaults(command="render", csv=DATA_FILE, at=None, output=OUTPUT_IMAGE,
+                        grid=GRID_SIZE, method=None)
+    sub = parser.add_subparsers(dest="command")
+    ren = sub.add_parser("render", help="write one PM2.5 map as a PNG (the default)")
+    ren.add_argument("csv", nargs="?", default=DATA_FILE)
+    ren.add_argument("--at", help='timestamp "YYYY-mm-dd HH:MM:SS" (default: latest readings)')
+    ren.add_argument("-o", "--output", default=OUTPUT_IMAGE)
+    srv = sub.add_parser("serve", help="serve cached maps over HTTP")
+    srv.add_argument("csv", nargs="?", default=DATA_FILE)
+    srv.add_argument("--port", type=int, default=5001)
+    for p in (ren, srv):
+        p.add_argument("--grid", type=int, default=GRID_SIZE, help="cells per side")
+        p.add_argument("--method", choices=["kriging", "idw"], help="default: kriging up to "
+                       f"{KRIGING_MAX_SENSORS} sensors, IDW above")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        raise SystemExit(f"❌ {args.csv} not found (needs latitude, longitude and PM2.5 columns)")
+    try:
+        history = PointHistory(args.csv)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    interpolator = Interpolator(args.grid, method=args.method)
+
+    if args.command == "serve":
+        print(f"✅ Serving PM2.5 maps from {args.csv} on port {args.port}")
+        create_app(history, interpolator).run(host="0.0.0.0", port=args.port, threaded=True)
+    else:
+        from ts_store import to_epoch
+
+        try:
+            points = history.snapshot(to_epoch(args.at) if args.at else None)
+            surface = interpolator.interpolate(points)
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}")
+        with open(args.output, "wb") as f:
+            f.write(render_png(surface, points))
+        print(f"✅ {surface.method} map of {surface.sensors} sensors written to {args.output}")
@@ -0,0 +1,119 @@
+"""
+In-process publishing of live readings to HTTP clients.
+
+LiveFeed: the sensor loop publishes each reading once; any number of
+streaming clients wait on a shared condition and receive only the
+readings newer than their cursor. A bounded backlog lets reconnecting
+clients resume from their last seen sequence number.
+
+SnapshotCache: the full /api/live body, encoded once per reading and
+served as-is with an ETag.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+BACKLOG = 300            # readings kept for clients that reconnect
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on idle streams
+
+
+class LiveFeed:
+    def __init__(self, backlog=BACKLOG):
+        self._events = deque(maxlen=backlog)   # (seq, encoded JSON, event type)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, reading, event=None):
+        """Encode a reading once and wake every waiting client; returns its sequence number.
+
+        `event` names a Server-Sent Events type; None sends a plain message.
+        """
+        data = json.dumps(reading)
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, data, event))
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, cursor):
+        """Events after `cursor`, plus a flag telling whether some were already evicted."""
+        with self._cond:
+            return self._since_locked(cursor)
+
+    def _since_locked(self, cursor):
+        events = self._events
+        if not events or cursor >= self._seq:
+            return [], False
+        oldest = events[0][0]
+        missed = cursor < oldest - 1
+        skip = max(cursor - oldest + 1, 0)
+        return [events[i] for i in range(skip, len(events))], missed
+
+    def wait(self, cursor, timeout=HEARTBEAT_INTERVAL):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > cursor, timeout)
+            return self._since_locked(cursor)
+
+    def stream(self, cursor=None):
+        """Server-Sent Events generator starting after `cursor` (None = only new readings)."""
+        yield "retry: 2000\n\n"
+        if cursor is None:
+            cursor = self._seq
+        elif cursor > self._seq:
+            # Cursor from before a server restart
+            cursor = self._seq
+            yield "event: reset\ndata: {}\n\n"
+        while True:
+            events, missed = self.wait(cursor)
+            if missed:
+                # Client was gone longer than the backlog covers: tell it to reload
+                yield "event: reset\ndata: {}\n\n"
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            chunks = []
+            for seq, data, event in events:
+                if event:
+                    chunks.append(f"id: {seq}\nevent: {event}\ndata: {data}\n\n")
+                else:
+                    chunks.append(f"id: {seq}\ndata: {data}\n\n")
+            cursor = events[-1][0]
+            yield "".join(chunks)
+
+
+class Snapshot:
+    """Immutable, pre-encoded response body published once per reading."""
+
+    __slots__ = ("version", "etag", "body")
+
+    def __init__(self, version, etag, body):
+        self.version = version
+        self.etag = etag
+        self.body = body
+
+
+class SnapshotCache:
+    """Holds the latest Snapshot; publishing swaps one reference, so readers never see a torn state."""
+
+    def __init__(self, initial=None):
+        # Boot id keeps ETags from a previous process from matching new versions
+        self._boot = format(int(time.time()), "x")
+        self._version = 0
+        self._current = None
+        self.publish(initial if initial is not None else {})
+
+    @property
+    def current(self):
+        return self._current
+
+    def publish(self, payload):
+        self._version += 1
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        self._current = Snapshot(self._version, f"{self._boot}-{self._version}", body)
+        return self._current
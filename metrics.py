@@ -0,0 +1,278 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and fixed-bucket histograms cost one short lock and a
+few integer updates per event, so they can sit on the sensor loop. Gauges
+can instead be backed by a function that runs only when /metrics is
+scraped. Every metric the project records is declared at the bottom of
+this file, so names and units stay in one place.
+
+    from metrics import PREDICT_SECONDS
+    with PREDICT_SECONDS.time():
+        model.predict(x)
+
+Processes without a web app (dashboard.py --acquire) expose the same
+text with serve(port).
+"""
+
+import bisect
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; spans a fast in-memory decode (µs) to a serial read waiting out its timeout
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Timer:
+    """Context manager observing the elapsed time into a histogram."""
+
+    __slots__ = ("_metric", "_start")
+
+    def __init__(self, metric):
+        self._metric = metric
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metric.observe(time.perf_counter() - self._start)
+
+
+class Metric:
+    """Base for one metric family; label values select a child via labels()."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._init_values()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _init_values(self):
+        pass
+
+    def labels(self, *values):
+        """The child metric for these label values (created on first use)."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self.__class__.__new__(self.__class__)
+                    child.name, child.labelnames = self.name, ()
+                    child._lock = threading.Lock()
+                    child._children = {}
+                    child._copy_config(self)
+                    child._init_values()
+                    self._children[values] = child
+        return child
+
+    def _copy_config(self, parent):
+        pass
+
+    def _series(self):
+        """(label values, metric) pairs to expose."""
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, metric in self._series():
+            lines.extend(metric._samples(self.labelnames, values))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _init_values(self):
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def _samples(self, names, values):
+        return [f"{self.name}_total{_format_labels(names, values)} {_format_value(self._value)}"]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _init_values(self):
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time; it may return None for "no value"."""
+        self._function = function
+        return self
+
+    @property
+    def value(self):
+        if self._function is None:
+            return self._value
+        try:
+            return self._function()
+        except Exception:
+            return None
+
+    def _samples(self, names, values):
+        value = self.value
+        if value is None:
+            return []
+        return [f"{self.name}{_format_labels(names, values)} {_format_value(float(value))}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _copy_config(self, parent):
+        self.buckets = parent.buckets
+
+    def _init_values(self):
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self):
+        """`with hist.time():` observes the block's duration in seconds."""
+        return _Timer(self)
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    def _samples(self, names, values):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = _format_labels(names, values, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """All metrics in the text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def serve(port, host="0.0.0.0", registry=REGISTRY):
+    """Serve GET /metrics from a daemon thread; returns the server (call shutdown() to stop)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # no access log line per scrape
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ---------------- PROJECT METRICS ----------------
+SERIAL_READ_SECONDS = Histogram("deepair_serial_read_seconds", "Time spent in serial port reads.")
+FRAME_DECODE_SECONDS = Histogram("deepair_frame_decode_seconds", "Time to decode one batch of received bytes.")
+PREDICT_SECONDS = Histogram("deepair_predict_seconds", "Scaling plus model.predict per inference batch.")
+CSV_FLUSH_SECONDS = Histogram("deepair_csv_flush_seconds", "Time to write and sync one batch of CSV rows.")
+HTTP_REQUEST_SECONDS = Histogram("deepair_http_request_seconds", "HTTP handler latency.", ["endpoint"])
+
+BAD_FRAMES = Counter("deepair_bad_frames", "Frames rejected for a bad checksum or tail byte.")
+RECONNECTS = Counter("deepair_reconnects", "Sensor port reopen attempts after a failure or stall.")
+SENSOR_ERRORS = Counter("deepair_sensor_errors", "Exceptions raised while reading the sensor.")
+DROPPED_PREDICTIONS = Counter("deepair_dropped_predictions", "Inference jobs superseded before they ran.")
+PREDICTION_ERRORS = Counter("deepair_prediction_errors", "Inference batches that raised an exception.")
+MISSED_QUERIES = Counter("deepair_missed_queries", "Duty-cycle data queries the sensor did not answer.")
+
+QUEUE_DEPTH = Gauge("deepair_inference_queue_depth", "Windows waiting for the inference worker.")
+SAMPLE_AGE = Gauge("deepair_sample_age_seconds", "Seconds since the newest reading was taken.")
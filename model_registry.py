@@ -0,0 +1,220 @@
+"""
+Versioned model registry with hot reload.
+
+Each trained model/scaler pair is published into its own directory under
+`models/`, and `models/CURRENT` names the version that should be serving.
+ModelWatcher polls that pointer from a background thread; a new version
+is loaded and warmed up with a dummy predict off the hot path, then
+swapped in as one object. The version it replaced is kept loaded, so
+rolling back (pointing CURRENT at it again) is instant.
+
+    python model_registry.py publish                 # pm25_lstm_model.h5 + scaler.save
+    python model_registry.py list
+    python model_registry.py activate 20240101-120000
+    python model_registry.py rollback
+"""
+
+import argparse
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+REGISTRY_DIR = "models"
+CURRENT_FILE = "CURRENT"
+MODEL_NAME = "pm25_lstm_model.h5"
+SCALER_NAME = "scaler.save"
+RELOAD_INTERVAL = 5  # seconds between checks of the CURRENT pointer
+LOCAL_VERSION = "local"  # the loose model/scaler files used when the registry is empty
+
+ModelVersion = namedtuple("ModelVersion", ["version", "model", "scaler", "loaded_at"])
+
+
+# ---------------- REGISTRY FILES ----------------
+def list_versions(registry=REGISTRY_DIR):
+    """Published versions, oldest first (names sort by publish time)."""
+    if not os.path.isdir(registry):
+        return []
+    return sorted(name for name in os.listdir(registry)
+                  if not name.startswith(".")
+                  and os.path.exists(os.path.join(registry, name, MODEL_NAME))
+                  and os.path.exists(os.path.join(registry, name, SCALER_NAME)))
+
+
+def current_version(registry=REGISTRY_DIR):
+    """The version CURRENT points at, else the newest one published."""
+    try:
+        with open(os.path.join(registry, CURRENT_FILE)) as f:
+            version = f.read().strip()
+        if version:
+            return version
+    except OSError:
+        pass
+    versions = list_versions(registry)
+    return versions[-1] if versions else None
+
+
+def set_current(version, registry=REGISTRY_DIR):
+    if version not in list_versions(registry):
+        raise ValueError(f"Unknown model version {version!r}")
+    tmp = os.path.join(registry, f".{CURRENT_FILE}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(registry, CURRENT_FILE))
+
+
+def publish(model_file=MODEL_NAME, scaler_file=SCALER_NAME, registry=REGISTRY_DIR,
+            version=None, activate=True):
+    """Copy a model/scaler pair into a new version directory; returns the version name."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(registry, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"Model version {version} already exists")
+    # Assemble in a hidden directory and rename it into place, so watchers never see half a version
+    staging = os.path.join(registry, f".{version}.tmp")
+    os.makedirs(staging, exist_ok=True)
+    shutil.copy2(model_file, os.path.join(staging, MODEL_NAME))
+    shutil.copy2(scaler_file, os.path.join(staging, SCALER_NAME))
+    os.rename(staging, target)
+    if activate:
+        set_current(version, registry)
+    return version
+
+
+def load_files(model_file, scaler_file, version):
+    """Load and warm up a model/scaler pair."""
+    from joblib import load as joblib_load
+    from numpy_lstm import load_model
+
+    model = load_model(model_file)
+    scaler = joblib_load(scaler_file)
+    # The first predict pays for lazy allocations; do it here instead of on a live reading
+    dummy = np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    out = np.asarray(model.predict(dummy, verbose=0))
+    if not np.all(np.isfinite(out)):
+        raise ValueError("warm-up prediction is not finite")
+    return ModelVersion(version, model, scaler, time.time())
+
+
+def load_version(version, registry=REGISTRY_DIR):
+    path = os.path.join(registry, version)
+    return load_files(os.path.join(path, MODEL_NAME), os.path.join(path, SCALER_NAME), version)
+
+
+# ---------------- WATCHER ----------------
+class ModelWatcher:
+    """Keeps `active` in sync with the registry's CURRENT pointer.
+
+    `on_swap(new, old)` runs on the watcher thread after each swap. When the
+    registry is empty, the loose `fallback` (model_file, scaler_file) pair is
+    served as version "local".
+    """
+
+    def __init__(self, registry=REGISTRY_DIR, on_swap=None, interval=RELOAD_INTERVAL,
+                 fallback=(MODEL_NAME, SCALER_NAME)):
+        self.registry = registry
+        self.on_swap = on_swap
+        self.interval = interval
+        self.fallback = fallback
+        self.active = None
+        self.previous = None
+        self.failed = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _target(self):
+        version = current_version(self.registry)
+        if version is None and self.fallback and all(os.path.exists(p) for p in self.fallback):
+            return LOCAL_VERSION
+        return version
+
+    def poll(self):
+        """Load and swap in the target version if it changed; returns True on a swap."""
+        target = self._target()
+        active = self.active
+        if target is None or target in self.failed or (active is not None and active.version == target):
+            return False
+        previous = self.previous
+        if previous is not None and previous.version == target:
+            new = previous  # rollback: still loaded
+        else:
+            try:
+                if target == LOCAL_VERSION:
+                    new = load_files(*self.fallback, LOCAL_VERSION)
+                else:
+                    new = load_version(target, self.registry)
+            except Exception as e:
+                self.failed.add(target)
+                print(f"⚠️ Could not load model version {target}: {e}")
+                return False
+        with self._lock:
+            self.previous, self.active = self.active, new
+        print(f"✅ Model version {new.version} active"
+              + (f" (previous: {self.previous.version})" if self.previous else ""))
+        if self.on_swap is not None:
+            try:
+                self.on_swap(new, self.previous)
+            except Exception as e:
+                print("⚠️ Model swap callback error:", e)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        self.poll()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        with self._lock:
+            active, previous = self.active, self.previous
+        return {
+            "version": active.version if active else None,
+            "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(active.loaded_at)) if active else None,
+            "previous": previous.version if previous else None,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage published PM2.5 model versions")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="add a model/scaler pair as a new version")
+    pub.add_argument("model", nargs="?", default=MODEL_NAME)
+    pub.add_argument("scaler", nargs="?", default=SCALER_NAME)
+    pub.add_argument("--version")
+    pub.add_argument("--no-activate", action="store_true")
+    sub.add_parser("list", help="show published versions")
+    act = sub.add_parser("activate", help="point CURRENT at a version")
+    act.add_argument("version")
+    sub.add_parser("rollback", help="point CURRENT at the version before it")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        version = publish(args.model, args.scaler, args.registry, args.version, not args.no_activate)
+        print(f"✅ Published model version {version}")
+    elif args.command == "list":
+        current = current_version(args.registry)
+        for version in list_versions(args.registry):
+            print(("* " if version == current else "  ") + version)
+    elif args.command == "activate":
+        set_current(args.version, args.registry)
+        print(f"✅ Model version {args.version} is now current")
+    else:
+        versions = list_versions(args.registry)
+        current = current_version(args.registry)
+        if current not in versions or versions.index(current) == 0:
+            raise SystemExit("❌ No earlier version to roll back to.")
+        version = versions[versions.index(current) - 1]
+        set_current(version, args.registry)
+        print(f"✅ Rolled back to model version {version}")
@@ -0,0 +1,204 @@
+"""
+Walk-forward hyperparameter and window-size search for the PM2.5 LSTM.
+
+Every configuration is trained and scored on expanding-window folds:
+fold k trains on the first k/(FOLDS+1) of the log and validates on the
+slice right after it, so a model is never scored on data older than what
+it trained on. Trials run in a process pool; each worker gets an equal
+share of the CPU threads so trials don't fight over cores. Inference
+latency is measured with the NumPy engine the dashboard actually runs.
+
+    python model_search.py                       # full grid on the default log
+    python model_search.py air_quality_log.csv --random 12 --budget 1800
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+import multiprocessing
+
+import numpy as np
+
+SEARCH_SPACE = {
+    "time_step": [5, 10, 20, 30],
+    "units": [16, 32, 50],
+    "dense_units": [8, 25],
+    "batch_size": [16, 64],
+    "epochs": [5, 10],
+}
+FOLDS = 3
+RESULTS_FILE = "search_results.csv"
+LATENCY_RUNS = 200  # single-window predicts timed per trial
+RESULT_COLUMNS = list(SEARCH_SPACE) + ["mae", "rmse", "latency_ms", "train_seconds", "status",
+                                       "rank_error", "rank_latency", "pareto"]
+
+
+# ---------------- WORKER ----------------
+def init_worker(threads):
+    """Cap math-library and TensorFlow threads before TensorFlow is imported in this process."""
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def fold_bounds(rows, folds=FOLDS):
+    """(train_end, val_end) row offsets for expanding-window folds."""
+    cuts = [rows * k // (folds + 1) for k in range(1, folds + 2)]
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def measure_latency(model, time_step, runs=LATENCY_RUNS):
+    """Median single-window predict time in ms, using the NumPy engine."""
+    from numpy_lstm import NumpyLSTMModel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trial.h5")
+        model.save(path)
+        np_model = NumpyLSTMModel.from_h5(path)
+    x = np.random.default_rng(0).random((1, time_step, 1), dtype=np.float32)
+    np_model.predict(x)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        np_model.predict(x)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def run_trial(config, source, rows, folds, deadline):
+    """Train and score one configuration on every fold; returns a result row."""
+    import tensorflow as tf
+    import model_training as mt
+
+    class Deadline(tf.keras.callbacks.Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            if time.time() > deadline:
+                self.model.stop_training = True
+
+    time_step = config["time_step"]
+    abs_err = sq_err = 0.0
+    count = 0
+    started = time.time()
+    model = None
+    for train_end, val_end in fold_bounds(rows, folds):
+        if time.time() > deadline:
+            return dict(config, status="timeout", train_seconds=round(time.time() - started, 1))
+        scaler = mt.fit_scaler(source, stop=train_end)  # fitted on the training rows only
+        dataset = mt.make_dataset(time_step=time_step, batch_size=config["batch_size"],
+                                  windows=lambda: mt.iter_windows(source, time_step, scaler, stop=train_end))
+        model = mt.build_model(time_step, config["units"], config["dense_units"])
+        model.fit(dataset, epochs=config["epochs"], verbose=0, callbacks=[Deadline()])
+        # Validation windows start `time_step` rows early so the first target is row train_end
+        for X, y in mt.iter_windows(source, time_step, scaler, start=max(train_end - time_step, 0), stop=val_end):
+            pred = model.predict(X.astype(np.float32), batch_size=4096, verbose=0)
+            err = (pred - y) / scaler.scale_[0]
+            abs_err += float(np.abs(err).sum())
+            sq_err += float((err ** 2).sum())
+            count += len(y)
+    if count == 0 or model is None:
+        return dict(config, status="no data", train_seconds=round(time.time() - started, 1))
+    if time.time() > deadline:
+        return dict(config, status="timeout", train_seconds=round(time.time() - started, 1))
+    return dict(config, status="ok",
+                mae=round(abs_err / count, 4), rmse=round(float(np.sqrt(sq_err / count)), 4),
+                latency_ms=round(measure_latency(model, time_step), 4),
+                train_seconds=round(time.time() - started, 1))
+
+
+# ---------------- SEARCH ----------------
+def configurations(space=SEARCH_SPACE, sample=None, seed=0):
+    """Every grid point in random order (so a time budget still covers the space), or `sample` of them."""
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    random.Random(seed).shuffle(grid)
+    return grid[:sample] if sample else grid
+
+
+def rank(results):
+    """Add error/latency ranks and a Pareto flag to finished trials; returns them sorted by error."""
+    done = [r for r in results if r.get("status") == "ok"]
+    for i, r in enumerate(sorted(done, key=lambda r: r["rmse"]), 1):
+        r["rank_error"] = i
+    for i, r in enumerate(sorted(done, key=lambda r: r["latency_ms"]), 1):
+        r["rank_latency"] = i
+    for r in done:
+        # Pareto-optimal: no other trial is at least as accurate and as fast, and strictly better in one
+        r["pareto"] = not any(o["rmse"] <= r["rmse"] and o["latency_ms"] <= r["latency_ms"]
+                              and (o["rmse"] < r["rmse"] or o["latency_ms"] < r["latency_ms"])
+                              for o in done)
+    return sorted(done, key=lambda r: r["rank_error"]) + [r for r in results if r.get("status") != "ok"]
+
+
+def write_results(results, path=RESULTS_FILE):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def search(source=None, sample=None, budget=None, workers=None, folds=FOLDS, out=RESULTS_FILE):
+    from model_training import count_rows, default_source
+
+    source = source or default_source()
+    rows = count_rows(source)
+    configs = configurations(sample=sample)
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(configs)))
+    threads = max(1, cpus // workers)
+    deadline = time.time() + budget if budget else float("inf")
+    print(f"🔎 {len(configs)} configurations × {folds} folds on {rows} rows, "
+          f"{workers} workers × {threads} threads")
+
+    results = []
+    # spawn, not fork: each worker must import TensorFlow fresh, after its thread caps are set
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=init_worker, initargs=(threads,)) as pool:
+        futures = {pool.submit(run_trial, config, source, rows, folds, deadline): config for config in configs}
+        try:
+            for future in as_completed(futures, timeout=None if budget is None else max(deadline - time.time(), 0) + 60):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = dict(futures[future], status=f"error: {e}")
+                results.append(result)
+                print(f"  {len(results)}/{len(configs)} {futures[future]} → "
+                      + (f"RMSE {result['rmse']:.3f}, {result['latency_ms']:.3f} ms" if result["status"] == "ok"
+                         else result["status"]))
+                if time.time() > deadline:
+                    print("⏱️ Time budget used up; skipping the remaining configurations.")
+                    break
+        except FuturesTimeout:  # not the builtin TimeoutError before Python 3.11
+            print("⏱️ Time budget used up while trials were still running.")
+        finally:
+            for future in futures:
+                future.cancel()
+
+    ranked = rank(results)
+    write_results(ranked, out)
+    best = [r for r in ranked if r.get("status") == "ok"]
+    if best:
+        fastest = min(best, key=lambda r: r["latency_ms"])
+        print(f"✅ Most accurate: {dict((k, best[0][k]) for k in SEARCH_SPACE)} (RMSE {best[0]['rmse']})")
+        print(f"✅ Fastest:       {dict((k, fastest[k]) for k in SEARCH_SPACE)} ({fastest['latency_ms']} ms)")
+    print(f"✅ {len(best)} finished trials written to {out}")
+    return ranked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward hyperparameter search for the PM2.5 LSTM")
+    parser.add_argument("source", nargs="?", help="log CSV or store directory (default: as model_training.py)")
+    parser.add_argument("--random", type=int, metavar="N", help="evaluate N random configurations instead of the full grid")
+    parser.add_argument("--budget", type=float, metavar="SECONDS", help="stop starting trials after this long")
+    parser.add_argument("--workers", type=int, help="parallel trials (default: one per CPU core)")
+    parser.add_argument("--folds", type=int, default=FOLDS)
+    parser.add_argument("-o", "--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+    search(args.source, args.random, args.budget, args.workers, args.folds, args.output)
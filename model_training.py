@@ -1,49 +1,403 @@
+import argparse
+import json
+import os
+import time
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import MinMaxScaler
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense
-from joblib import dump
+from joblib import dump, load
+from ts_store import TimeSeriesStore, read_log_csv, PM25_COLUMNS, TIME_FORMAT
 
-DATA_FILE = "air_quality_data.csv"
+DATA_FILE = "live_air_quality.csv"   # dashboard log; the data_logger CSV works too
+STORE_DIR = "live_air_quality.store"  # preferred over the CSV when it has rows
+CHUNK_ROWS = 200_000   # rows read per chunk, so logs never have to fit in memory
+MAX_GAP_SECONDS = 60   # readings further apart than this start a new segment
+TIME_STEP = 10
+HORIZON = 1            # steps predicted at once; the model emits all of them in one forward pass
+TARGETS = ("pm25",)    # ("pm25", "pm10") forecasts both; the same columns are the model inputs
+BATCH_SIZE = 16
+EPOCHS = 10
 
-def load_data():
-    df = pd.read_csv(DATA_FILE)
-    df["pm25"] = df["pm25"].astype(float)
-    return df["pm25"].values.reshape(-1, 1)
+MODEL_FILE = "pm25_lstm_model.h5"
+SCALER_FILE = "scaler.save"
+CHECKPOINT_FILE = "training_state.json"
+FINETUNE_EPOCHS = 2
+FINETUNE_LEARNING_RATE = 1e-4
+REPLAY_RATIO = 0.5      # replayed older windows per new window, against forgetting
+REPLAY_MAX = 50_000     # cap on the replay sample
+REPLAY_BLOCK = 512      # rows per contiguous block read for the replay sample
 
-def prepare_data(data, time_step=10):
-    X, y = [], []
-    for i in range(len(data) - time_step - 1):
-        X.append(data[i:(i + time_step), 0])
-        y.append(data[i + time_step, 0])
-    return np.array(X), np.array(y)
+def default_source():
+    # An empty store (e.g. from a dashboard that never saw the sensor) must not hide the CSV
+    if os.path.isdir(STORE_DIR) and len(TimeSeriesStore(STORE_DIR)):
+        return STORE_DIR
+    return DATA_FILE
 
-def build_model(input_shape):
+def count_rows(source=None):
+    """Number of complete data rows in a store directory or log CSV."""
+    source = source or default_source()
+    if os.path.isdir(source):
+        return len(TimeSeriesStore(source))
+    newlines = 0
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            newlines += block.count(b"\n")
+    return max(newlines - 1, 0)  # minus the header; a half-written last line isn't counted
+
+def iter_chunks(source=None, chunksize=CHUNK_ROWS, start=0, stop=None, targets=TARGETS):
+    """Yield (timestamps in seconds, values) pairs from a store directory or log CSV.
+
+    `values` has one column per name in `targets`. `start`/`stop` select
+    data rows [start, stop), counted like count_rows().
+    """
+    source = source or default_source()
+    if os.path.isdir(source):
+        data = TimeSeriesStore(source).read(["timestamp"] + list(targets))
+        stop = len(data["timestamp"]) if stop is None else min(stop, len(data["timestamp"]))
+        for i in range(start, stop, chunksize):
+            j = min(i + chunksize, stop)
+            yield (np.asarray(data["timestamp"][i:j], dtype=np.float64),
+                   np.stack([np.asarray(data[name][i:j], dtype=np.float64) for name in targets], axis=1))
+        return
+    nrows = None if stop is None else max(stop - start, 0)
+    if nrows == 0:
+        return
+    for chunk in read_log_csv(source, chunksize=chunksize, skip_rows=start, nrows=nrows):
+        pm25_col = next((c for c in PM25_COLUMNS if c in chunk.columns), None)
+        if pm25_col is None:
+            raise ValueError(f"{source} has no PM2.5 column (expected one of {PM25_COLUMNS})")
+        ts = pd.to_datetime(chunk["timestamp"], format=TIME_FORMAT, errors="coerce")
+        columns = [pd.to_numeric(chunk[pm25_col if name == "pm25" else name], errors="coerce")
+                   for name in targets]
+        keep = ts.notna().to_numpy()
+        for col in columns:
+            keep = keep & col.notna().to_numpy()
+        seconds = ts[keep].to_numpy().astype("datetime64[s]").astype(np.float64)
+        yield seconds, np.stack([col.to_numpy(dtype=np.float64)[keep] for col in columns], axis=1)
+
+def last_timestamp(source, stop):
+    """Timestamp (seconds) of the last valid row before data row `stop`, or None."""
+    last = None
+    for back in (CHUNK_ROWS, stop):
+        for ts, _ in iter_chunks(source, start=max(stop - back, 0), stop=stop, targets=("pm25",)):
+            if len(ts):
+                last = float(ts[-1])
+        if last is not None:
+            break
+    return last
+
+def first_row_after(source, seconds):
+    """Index of the first data row timestamped after `seconds`, counted like count_rows().
+
+    Logs are time-ordered, so this stays right when retention prunes rows
+    from the front, which a saved row offset would not.
+    """
+    if os.path.isdir(source):
+        ts = TimeSeriesStore(source).read(["timestamp"])["timestamp"]
+        return int(np.searchsorted(ts, seconds, side="right"))
+    offset = 0
+    for chunk in read_log_csv(source, chunksize=CHUNK_ROWS):
+        ts = pd.to_datetime(chunk["timestamp"], format=TIME_FORMAT, errors="coerce")
+        seconds_col = ts.to_numpy().astype("datetime64[s]").astype(np.float64)
+        after = np.flatnonzero(ts.notna().to_numpy() & (seconds_col > seconds))
+        if len(after):
+            return offset + int(after[0])
+        offset += len(chunk)
+    return offset
+
+def load_data(source=None, targets=TARGETS):
+    """Whole series as an (n, len(targets)) array (small logs / quick experiments)."""
+    parts = [values for _, values in iter_chunks(source, targets=targets)]
+    return np.concatenate(parts) if parts else np.empty((0, len(targets)))
+
+def prepare_data(data, time_step=10, horizon=1):
+    """Windows of `time_step` rows and the `horizon` rows that follow each, as strided views.
+
+    A 1-D series gives X of shape (n, time_step) and y of shape (n,) (or
+    (n, horizon)); an (rows, features) array gives X (n, time_step, features)
+    and y (n, horizon * features), step-major.
+    """
+    series = np.asarray(data)
+    flat = series.ndim == 1
+    if flat:
+        series = series[:, None]
+    n = len(series) - time_step - horizon + 1
+    features = series.shape[1]
+    if n <= 0:
+        X, y = np.empty((0, time_step, features)), np.empty((0, horizon * features))
+    else:
+        X = sliding_window_view(series, time_step, axis=0)[:n].transpose(0, 2, 1)
+        y = sliding_window_view(series[time_step:], horizon, axis=0).transpose(0, 2, 1).reshape(n, -1)
+    if flat:
+        X = X[:, :, 0]
+        y = y[:, 0] if horizon == 1 else y
+    return X, y
+
+def iter_windows(source=None, time_step=TIME_STEP, scaler=None, max_gap=MAX_GAP_SECONDS,
+                 chunksize=CHUNK_ROWS, start=0, stop=None, horizon=HORIZON, targets=TARGETS):
+    """Yield (X, y) per chunk, X (n, time_step, features) and y (n, horizon * features).
+
+    Windows (including their forecast steps) never span a gap longer than
+    `max_gap` seconds. The readings of an unfinished window at the end of
+    a chunk carry over to the next one, so windows crossing a chunk
+    boundary are still produced exactly once.
+    """
+    carry_t = np.empty(0)
+    carry_v = np.empty((0, len(targets)))
+    for ts, values in iter_chunks(source, chunksize, start, stop, targets):
+        if scaler is not None:
+            values = values * scaler.scale_ + scaler.min_
+        t = np.concatenate([carry_t, ts])
+        v = np.concatenate([carry_v, values])
+        if len(v) == 0:
+            continue
+        dt = np.diff(t)
+        # Outages (and clock jumps backwards) split the series into segments
+        starts = np.concatenate([[0], np.flatnonzero((dt > max_gap) | (dt < 0)) + 1, [len(v)]])
+        X_parts, y_parts = [], []
+        for a, b in zip(starts[:-1], starts[1:]):
+            X, y = prepare_data(v[a:b], time_step, horizon)
+            if len(y):
+                X_parts.append(X)
+                y_parts.append(y)
+        keep_from = max(starts[-2], len(v) - (time_step + horizon - 1))
+        carry_t, carry_v = t[keep_from:], v[keep_from:]
+        if X_parts:
+            yield np.concatenate(X_parts), np.concatenate(y_parts)
+
+def fit_scaler(source=None, stop=None, targets=TARGETS):
+    """Fit the MinMaxScaler chunk by chunk, one feature per target column."""
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    for _, values in iter_chunks(source, stop=stop, targets=targets):
+        if len(values):
+            scaler.partial_fit(values)
+    return scaler
+
+def make_dataset(source=None, scaler=None, time_step=TIME_STEP, batch_size=BATCH_SIZE, seed=0,
+                 windows=None, horizon=HORIZON, features=len(TARGETS)):
+    """tf.data pipeline streaming shuffled batches chunk by chunk.
+
+    `windows` is a callable returning an (X, y) chunk iterator; it defaults
+    to iter_windows over the whole source.
+    """
+    import tensorflow as tf
+
+    windows = windows or (lambda: iter_windows(source, time_step, scaler))
+
+    def batches():
+        rng = np.random.default_rng(seed)
+        for X, y in windows():
+            order = rng.permutation(len(y))
+            for i in range(0, len(order), batch_size):
+                idx = order[i:i + batch_size]
+                yield X[idx].astype(np.float32), y[idx].astype(np.float32)
+
+    return tf.data.Dataset.from_generator(batches, output_signature=(
+        tf.TensorSpec(shape=(None, time_step, features), dtype=tf.float32),
+        tf.TensorSpec(shape=(None, horizon * features), dtype=tf.float32),
+    )).prefetch(tf.data.AUTOTUNE)
+
+def build_model(input_shape, units=50, dense_units=25, horizon=1, features=1):
+    """Stacked LSTM; the last layer emits `horizon` steps of every feature, step-major."""
     model = Sequential([
-        LSTM(50, return_sequences=True, input_shape=(input_shape, 1)),
-        LSTM(50, return_sequences=False),
-        Dense(25),
-        Dense(1)
+        LSTM(units, return_sequences=True, input_shape=(input_shape, features)),
+        LSTM(units, return_sequences=False),
+        Dense(dense_units),
+        Dense(horizon * features)
     ])
     model.compile(optimizer="adam", loss="mean_squared_error")
     return model
 
-def train_model():
-    data = load_data()
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(data)
+def save_atomic(obj, path, save):
+    """Write through a temp file in the same directory, then rename over `path`."""
+    stem, ext = os.path.splitext(path)
+    tmp = f"{stem}.tmp{ext}"
+    save(obj, tmp)
+    os.replace(tmp, path)
+
+def load_checkpoint(path=CHECKPOINT_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(source, rows, scaler, time_step, horizon=HORIZON, targets=TARGETS, path=CHECKPOINT_FILE):
+    state = {
+        "source": os.path.abspath(source),
+        "rows": int(rows),
+        "last_timestamp": last_timestamp(source, rows),
+        "time_step": int(time_step),
+        "horizon": int(horizon),
+        "targets": list(targets),
+        "scaler": {
+            "data_min": scaler.data_min_.tolist(),
+            "data_max": scaler.data_max_.tolist(),
+            "n_samples_seen": int(scaler.n_samples_seen_),
+        },
+        "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    save_atomic(state, path, write_json)
+
+def write_json(obj, path):
+    with open(path, "w") as f:
+        json.dump(obj, f, indent=2)
+
+def save_trained(model, scaler, source, rows, time_step, horizon=HORIZON, targets=TARGETS):
+    # Model and scaler first, checkpoint last: a crash in between only means the rows get retrained
+    save_atomic(model, MODEL_FILE, lambda m, p: m.save(p))
+    save_atomic(scaler, SCALER_FILE, dump)
+    save_checkpoint(source, rows, scaler, time_step, horizon, targets)
+
+def sample_replay(source, scaler, time_step, end, size, seed=0, horizon=HORIZON, targets=TARGETS):
+    """Random contiguous blocks of windows from rows [0, end), about `size` windows in total."""
+    if end <= time_step or size <= 0:
+        return None
+    rng = np.random.default_rng(seed)
+    blocks = min(-(-size // REPLAY_BLOCK), max(end // REPLAY_BLOCK, 1))
+    starts = np.sort(rng.integers(0, max(end - REPLAY_BLOCK, 1), size=blocks))
+    X_parts, y_parts = [], []
+    for a in starts:
+        for X, y in iter_windows(source, time_step, scaler, start=int(a), stop=min(int(a) + REPLAY_BLOCK, end),
+                                 horizon=horizon, targets=targets):
+            X_parts.append(X)
+            y_parts.append(y)
+    if not X_parts:
+        return None
+    return np.concatenate(X_parts)[:size], np.concatenate(y_parts)[:size]
+
+def train_model(source=None, horizon=HORIZON, targets=TARGETS):
+    source = source or default_source()
+    rows = count_rows(source)
+    scaler = fit_scaler(source, stop=rows, targets=targets)
+    if getattr(scaler, "n_samples_seen_", 0) == 0:
+        raise ValueError(f"{source} has no readings to train on")
+
+    time_step = TIME_STEP
+    # Checked before fitting so a failed run never overwrites the saved model and scaler
+    if not any(len(y) for _, y in iter_windows(source, time_step, scaler, stop=rows,
+                                              horizon=horizon, targets=targets)):
+        raise ValueError(f"{source} has {rows} rows but no gap-free run of "
+                         f"{time_step + horizon} readings to form a training window")
+    dataset = make_dataset(source, scaler, time_step, BATCH_SIZE, horizon=horizon, features=len(targets),
+                           windows=lambda: iter_windows(source, time_step, scaler, stop=rows,
+                                                        horizon=horizon, targets=targets))
+
+    model = build_model(time_step, horizon=horizon, features=len(targets))
+    model.fit(dataset, epochs=EPOCHS)
+
+    save_trained(model, scaler, source, rows, time_step, horizon, targets)
+    print(f"✅ Model trained and saved as '{MODEL_FILE}'")
+    return True
+
+def train_incremental(source=None, horizon=HORIZON, targets=TARGETS):
+    """Fine-tune the saved model on rows logged since the last run, plus a replay sample.
+
+    The scaler is kept as it was: the model's weights are tied to its scaling, and
+    so are its horizon and targets, which come from the checkpoint. `horizon` and
+    `targets` only apply when there's no usable checkpoint and it falls back to
+    full training. Returns whether the model changed.
+    """
+    from tensorflow.keras.models import load_model as keras_load_model
+    from tensorflow.keras.optimizers import Adam
+
+    source = source or default_source()
+    state = load_checkpoint()
+    if (state is None or state["source"] != os.path.abspath(source)
+            or not os.path.exists(MODEL_FILE) or not os.path.exists(SCALER_FILE)):
+        print("⚠️ No checkpoint for this data source; training from scratch.")
+        return train_model(source, horizon, targets)
+
+    rows = count_rows(source)
+    if state.get("last_timestamp") is not None:
+        # Resume after the last trained reading: retention may have dropped rows from the front
+        start = min(first_row_after(source, state["last_timestamp"]), rows)
+    else:
+        start = state["rows"]
+        if rows < start:
+            # The log was rotated or replaced: everything in it is new
+            print(f"⚠️ {source} has fewer rows than the checkpoint ({rows} < {start}); treating all rows as new.")
+            start = 0
+    if rows - start <= 0:
+        print("✅ No new rows since the last training run.")
+        return False
+
+    time_step = state["time_step"]
+    horizon = state.get("horizon", 1)
+    targets = tuple(state.get("targets", ["pm25"]))
+    scaler = load(SCALER_FILE)
+    # Start `time_step` rows early so the first new reading gets a full window of context
+    context = max(start - time_step, 0)
+    new_windows = lambda: iter_windows(source, time_step, scaler, start=context, stop=rows,
+                                       horizon=horizon, targets=targets)
+    n_new = sum(len(y) for _, y in new_windows())
+    if n_new == 0:
+        print("✅ New rows don't form any complete window yet.")
+        return False
+
+    replay = sample_replay(source, scaler, time_step, context, min(int(n_new * REPLAY_RATIO), REPLAY_MAX),
+                           horizon=horizon, targets=targets)
+    n_replay = 0 if replay is None else len(replay[1])
+
+    def mixed():
+        # Spread the replay sample across the new chunks so every chunk's shuffle mixes both;
+        # it was read in contiguous blocks, so permute it first to give each chunk several periods
+        order = np.random.default_rng(1).permutation(n_replay)
+        pos = 0
+        for X, y in new_windows():
+            if not n_replay:
+                yield X, y
+                continue
+            take = -(-len(y) * n_replay // n_new)
+            idx = order[(pos + np.arange(take)) % n_replay]
+            pos += take
+            yield np.concatenate([X, replay[0][idx]]), np.concatenate([y, replay[1][idx]])
 
-    time_step = 10
-    X, y = prepare_data(scaled_data, time_step)
-    X = X.reshape(X.shape[0], X.shape[1], 1)
+    lo = np.full(len(targets), np.inf)
+    hi = np.full(len(targets), -np.inf)
+    for _, values in iter_chunks(source, start=start, stop=rows, targets=targets):
+        if len(values):
+            lo, hi = np.minimum(lo, values.min(axis=0)), np.maximum(hi, values.max(axis=0))
+    for i, name in enumerate(targets):
+        if lo[i] < scaler.data_min_[i] or hi[i] > scaler.data_max_[i]:
+            print(f"⚠️ New {name} readings ({lo[i]:.1f}–{hi[i]:.1f}) fall outside the scaler range "
+                  f"({scaler.data_min_[i]:.1f}–{scaler.data_max_[i]:.1f}); consider a full retrain.")
 
-    model = build_model(time_step)
-    model.fit(X, y, batch_size=16, epochs=10)
+    model = keras_load_model(MODEL_FILE, compile=False)
+    model.compile(optimizer=Adam(learning_rate=FINETUNE_LEARNING_RATE), loss="mean_squared_error")
+    dataset = make_dataset(time_step=time_step, batch_size=BATCH_SIZE, windows=mixed,
+                           horizon=horizon, features=len(targets))
+    print(f"🔁 Fine-tuning on {n_new} new windows + {n_replay} replayed ({rows - start} new rows)")
+    model.fit(dataset, epochs=FINETUNE_EPOCHS)
 
-    model.save("pm25_lstm_model.h5")
-    dump(scaler, "scaler.save")
-    print("✅ Model trained and saved as 'pm25_lstm_model.h5'")
+    save_trained(model, scaler, source, rows, time_step, horizon, targets)
+    print(f"✅ Model updated in place: '{MODEL_FILE}'")
+    return True
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the PM2.5 LSTM")
+    parser.add_argument("source", nargs="?", help=f"log CSV or store directory (default: {STORE_DIR} or {DATA_FILE})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="fine-tune the saved model on rows logged since the last run")
+    parser.add_argument("--horizon", type=int, default=HORIZON,
+                        help="number of future steps the model predicts at once")
+    parser.add_argument("--pm10", action="store_true", help="forecast PM10 alongside PM2.5")
+    parser.add_argument("--publish", action="store_true",
+                        help="add the result to the model registry so running dashboards pick it up")
+    args = parser.parse_args()
+    targets = ("pm25", "pm10") if args.pm10 else TARGETS
+    try:
+        if args.incremental:
+            trained = train_incremental(args.source, args.horizon, targets)
+        else:
+            trained = train_model(args.source, args.horizon, targets)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    if args.publish and not trained:
+        print("⚠️ Nothing new was trained; not publishing.")
+    elif args.publish:
+        from model_registry import publish
+        print(f"✅ Published model version {publish(MODEL_FILE, SCALER_FILE)}")
@@ -0,0 +1,242 @@
+"""
+TensorFlow-free inference for the trained PM2.5 LSTM.
+
+The Keras .h5 file is read with h5py and its weights exported to a
+compact .npz; NumpyLSTMModel then runs the same stacked LSTM + Dense
+forward pass in NumPy. It mimics the bits of the Keras model API the
+project uses (`input_shape`, `predict(x, verbose=0)`), so it drops into
+the dashboard, prediction script and inference worker unchanged.
+
+    python numpy_lstm.py export pm25_lstm_model.h5      # -> pm25_lstm_model.npz
+    python numpy_lstm.py verify pm25_lstm_model.h5      # compare against Keras
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+MODEL_FILE = "pm25_lstm_model.h5"
+PREDICT_CHUNK = 512  # windows per forward pass in predict_batch (keeps the gates cache-sized)
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "hard_sigmoid": lambda x: np.clip(0.2 * x + 0.5, 0.0, 1.0),
+}
+
+
+class UnsupportedModelError(ValueError):
+    pass
+
+
+def npz_path(model_path):
+    return os.path.splitext(model_path)[0] + ".npz"
+
+
+# ---------------- EXPORT ----------------
+def read_h5_layers(path):
+    """Layer specs and weights from a Keras .h5 Sequential model, without TensorFlow."""
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        config = json.loads(f.attrs["model_config"])
+        if config["class_name"] != "Sequential":
+            raise UnsupportedModelError(f"Only Sequential models are supported, got {config['class_name']}")
+        weights_root = f["model_weights"]
+        layers = []
+        input_shape = None
+        for layer in config["config"]["layers"]:
+            cls = layer["class_name"]
+            cfg = layer["config"]
+            # Keras 2 puts batch_input_shape on the first layer, Keras 3 batch_shape on the InputLayer
+            shape = cfg.get("batch_input_shape") or cfg.get("batch_shape")
+            if input_shape is None and shape:
+                input_shape = tuple(shape)
+            if cls == "InputLayer":
+                continue
+            group = weights_root[cfg["name"]]
+            weights = [np.asarray(group[name], dtype=np.float32)
+                       for name in (n.decode() if isinstance(n, bytes) else n
+                                    for n in group.attrs["weight_names"])]
+            if cls == "LSTM":
+                if not cfg.get("use_bias", True) or cfg.get("go_backwards") or cfg.get("stateful"):
+                    raise UnsupportedModelError(f"Unsupported LSTM options in layer {cfg['name']}")
+                kernel, recurrent, bias = weights
+                layers.append({
+                    "kind": "lstm", "kernel": kernel, "recurrent_kernel": recurrent, "bias": bias,
+                    "return_sequences": bool(cfg["return_sequences"]),
+                    "activation": cfg.get("activation", "tanh"),
+                    "recurrent_activation": cfg.get("recurrent_activation", "sigmoid"),
+                })
+            elif cls == "Dense":
+                kernel, bias = weights
+                layers.append({"kind": "dense", "kernel": kernel, "bias": bias,
+                               "activation": cfg.get("activation", "linear")})
+            else:
+                raise UnsupportedModelError(f"Unsupported layer type {cls}")
+    return layers, input_shape
+
+
+def export_npz(h5_file, out_file=None):
+    layers, input_shape = read_h5_layers(h5_file)
+    out_file = out_file or npz_path(h5_file)
+    arrays = {"input_shape": np.array([-1 if d is None else d for d in input_shape])}
+    for i, layer in enumerate(layers):
+        for key, value in layer.items():
+            arrays[f"{i}/{key}"] = np.asarray(value)
+    np.savez(out_file, **arrays)
+    return out_file
+
+
+# ---------------- INFERENCE ----------------
+class NumpyLSTMModel:
+    def __init__(self, layers, input_shape):
+        for layer in layers:
+            for key in ("activation", "recurrent_activation"):
+                if key in layer and layer[key] not in ACTIVATIONS:
+                    raise UnsupportedModelError(f"Unsupported activation {layer[key]}")
+        self.layers = layers
+        self.input_shape = tuple(input_shape)
+        self.output_shape = (None, layers[-1]["kernel"].shape[1])
+
+    @classmethod
+    def from_h5(cls, path):
+        return cls(*read_h5_layers(path))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            input_shape = tuple(None if d < 0 else int(d) for d in data["input_shape"])
+            grouped = {}
+            for key in data.files:
+                if "/" in key:
+                    idx, name = key.split("/", 1)
+                    grouped.setdefault(int(idx), {})[name] = data[key]
+        layers = []
+        for idx in sorted(grouped):
+            layer = grouped[idx]
+            for key in ("kind", "activation", "recurrent_activation"):
+                if key in layer:
+                    layer[key] = str(layer[key])
+            if "return_sequences" in layer:
+                layer["return_sequences"] = bool(layer["return_sequences"])
+            layers.append(layer)
+        return cls(layers, input_shape)
+
+    @staticmethod
+    def _lstm(x, layer):
+        batch, steps, _ = x.shape
+        kernel, recurrent, bias = layer["kernel"], layer["recurrent_kernel"], layer["bias"]
+        units = recurrent.shape[0]
+        act = ACTIVATIONS[layer["activation"]]
+        rec_act = ACTIVATIONS[layer["recurrent_activation"]]
+        # Input projections for every timestep in one matmul; only h @ U stays in the loop
+        xw = (x.reshape(batch * steps, -1) @ kernel + bias).reshape(batch, steps, 4 * units)
+        h = np.zeros((batch, units), dtype=x.dtype)
+        c = np.zeros((batch, units), dtype=x.dtype)
+        outputs = np.empty((batch, steps, units), dtype=x.dtype) if layer["return_sequences"] else None
+        for t in range(steps):
+            z = xw[:, t, :] + h @ recurrent
+            # Gate order is i, f, c, o; one recurrent activation call covers i, f and o
+            gates = rec_act(z)
+            g = act(z[:, 2 * units:3 * units])
+            c = gates[:, units:2 * units] * c + gates[:, :units] * g
+            h = gates[:, 3 * units:] * act(c)
+            if outputs is not None:
+                outputs[:, t, :] = h
+        return outputs if outputs is not None else h
+
+    def predict(self, x, verbose=0, batch_size=None):
+        """Forward pass for x of shape (batch, steps, features); returns (batch, outputs)."""
+        out = np.asarray(x, dtype=np.float32)
+        for layer in self.layers:
+            if layer["kind"] == "lstm":
+                out = self._lstm(out, layer)
+            else:
+                out = ACTIVATIONS[layer["activation"]](out @ layer["kernel"] + layer["bias"])
+        return out
+
+    def predict_batch(self, x, chunk=PREDICT_CHUNK):
+        """predict() over many windows in fixed-size chunks to bound memory."""
+        x = np.asarray(x, dtype=np.float32)
+        if len(x) <= chunk:
+            return self.predict(x)
+        return np.concatenate([self.predict(x[i:i + chunk]) for i in range(0, len(x), chunk)])
+
+
+def load_model(path=MODEL_FILE):
+    """Load the fastest available engine for `path`.
+
+    Uses the exported .npz if it's up to date, else reads the .h5 with
+    h5py, and only falls back to TensorFlow for models this module can't run.
+    """
+    npz = npz_path(path)
+    if os.path.exists(npz) and (not os.path.exists(path) or os.path.getmtime(npz) >= os.path.getmtime(path)):
+        return NumpyLSTMModel.load(npz)
+    try:
+        return NumpyLSTMModel.from_h5(path)
+    except (ImportError, UnsupportedModelError, KeyError) as e:
+        print(f"⚠️ NumPy engine unavailable for {path} ({e}); loading with TensorFlow.")
+        from tensorflow.keras.models import load_model as keras_load_model
+        return keras_load_model(path)
+
+
+# ---------------- VERIFY ----------------
+def load_keras_reference(path, np_model):
+    """The .h5 model as Keras sees it: the architecture, with weights loaded by Keras itself.
+
+    Only layer shapes come from `np_model`; the weights are read from the
+    file by load_weights, so a parsing or gate-order bug in this module
+    can't cancel out. (load_model would be simpler, but Keras 3 rejects
+    some options older Keras versions wrote into the LSTM config.)
+    """
+    from tensorflow.keras import Input, Sequential
+    from tensorflow.keras.layers import LSTM, Dense
+
+    keras_layers = [Input(shape=np_model.input_shape[1:])]
+    for layer in np_model.layers:
+        if layer["kind"] == "lstm":
+            keras_layers.append(LSTM(layer["recurrent_kernel"].shape[0],
+                                     return_sequences=layer["return_sequences"],
+                                     activation=layer["activation"],
+                                     recurrent_activation=layer["recurrent_activation"]))
+        else:
+            keras_layers.append(Dense(layer["kernel"].shape[1], activation=layer["activation"]))
+    model = Sequential(keras_layers)
+    model.load_weights(path)
+    return model
+
+
+def verify(path, samples=256, tolerance=1e-4):
+    np_model = NumpyLSTMModel.from_h5(path)
+    keras_model = load_keras_reference(path, np_model)
+    rng = np.random.default_rng(0)
+    x = rng.random((samples,) + np_model.input_shape[1:], dtype=np.float32)
+    expected = keras_model.predict(x, verbose=0)
+    got = np_model.predict_batch(x, chunk=64)
+    err = float(np.max(np.abs(expected - got)))
+    single = float(np.max(np.abs(keras_model.predict(x[:1], verbose=0) - np_model.predict(x[:1]))))
+    ok = err <= tolerance and single <= tolerance
+    print(f"{'✅' if ok else '❌'} max |keras - numpy| = {err:.2e} (batch), {single:.2e} (single window)")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NumPy inference engine for the PM2.5 LSTM")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="write the .h5 weights to a .npz")
+    exp.add_argument("model", nargs="?", default=MODEL_FILE)
+    exp.add_argument("-o", "--output")
+    ver = sub.add_parser("verify", help="check NumPy output against Keras")
+    ver.add_argument("model", nargs="?", default=MODEL_FILE)
+    ver.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"✅ Exported weights to {export_npz(args.model, args.output)}")
+    else:
+        raise SystemExit(0 if verify(args.model, tolerance=args.tolerance) else 1)
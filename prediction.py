@@ -1,7 +1,7 @@
-import numpy as np
-from tensorflow.keras.models import load_model
+from numpy_lstm import load_model  # NumPy forward pass; TensorFlow not needed
 from joblib import load
 from sds011_reader import SDS011
+from feature_window import ScaledWindow
 import time
 
 MODEL_FILE = "pm25_lstm_model.h5"
@@ -12,26 +12,28 @@ def predict_pm25():
     scaler = load(SCALER_FILE)
     sensor = SDS011(port="COM3")  # Change COM port if needed
 
-    data_window = []
+    # Scaled on the way in; the model reads a view of the window directly
+    data_window = ScaledWindow.from_scaler(model.input_shape[1], scaler)
 
     print("🔮 Real-time PM2.5 Prediction Started...")
 
     while True:
-        pm25, _ = sensor.read()
-        data_window.append(pm25)
-
-        if len(data_window) > 10:
-            data_window.pop(0)
-
-        if len(data_window) == 10:
-            input_data = np.array(data_window).reshape(-1, 1)
-            scaled_input = scaler.transform(input_data)
-            scaled_input = np.reshape(scaled_input, (1, 10, 1))
-
-            predicted_scaled = model.predict(scaled_input)
-            predicted_pm25 = scaler.inverse_transform(predicted_scaled)
-
-            print(f"Measured PM2.5: {pm25:.2f} | Predicted Next PM2.5: {predicted_pm25[0][0]:.2f}")
+        pm25, pm10 = sensor.read()
+        if pm25 is None:
+            # No frame before the read timed out (sensor stalled or unplugged)
+            time.sleep(1)
+            continue
+        data_window.push_reading(pm25, pm10)
+
+        if data_window.full:
+            # One forward pass gives every forecast step (step-major, one value per feature)
+            predicted_scaled = model.predict(data_window.view())
+            forecast = data_window.inverse(predicted_scaled[0].reshape(-1, data_window.features))
+            predicted_pm25 = forecast[0, 0]
+
+            print(f"Measured PM2.5: {pm25:.2f} | Predicted Next PM2.5: {predicted_pm25:.2f}")
+            if len(forecast) > 1:
+                print("   Forecast PM2.5: " + " → ".join(f"{v:.1f}" for v in forecast[:, 0]))
 
         time.sleep(3)
 
@@ -0,0 +1,281 @@
+"""
+Incremental 1-minute / 15-minute / hourly / daily rollups of the readings.
+
+Every reading updates the open bucket of each tier in O(1): a count,
+min, max and running sum for PM2.5 and PM10. When a reading lands in a
+later bucket the finished one is appended as a fixed-size record to that
+tier's file, so long-range views and daily reports read a few thousand
+records instead of every raw 2-second row. The rollups live next to the
+raw data (live_air_quality.csv → live_air_quality.rollups/), and once
+they exist, raw rows older than the retention period can be pruned.
+
+    python rollups.py build live_air_quality.store      # (re)compute every tier from raw history
+    python rollups.py show 1h --last 24
+    python rollups.py prune --days 30                   # stop the dashboard first
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from ts_store import TimeSeriesStore, load_log, to_epoch, format_epoch, now_epoch
+
+# ---------------- CONFIG ----------------
+TIERS = {"1m": 60, "15m": 900, "1h": 3600, "1d": 86400}  # bucket widths in seconds
+FIELDS = ("pm25", "pm10")
+STATE_FILE = "state.json"
+RETENTION_DAYS = 30  # default for the prune command
+# --------------------------------------
+
+ROLLUP_DTYPE = np.dtype([("start", "<f8"), ("sensor_id", "<u2"), ("count", "<u4")]
+                        + [(f"{field}_{stat}", "<f4") for field in FIELDS for stat in ("min", "max", "mean")])
+
+
+def rollup_path(raw_path):
+    """live_air_quality.csv or live_air_quality.store → live_air_quality.rollups"""
+    stem, ext = os.path.splitext(raw_path.rstrip("/\\"))
+    return (stem if ext in (".csv", ".store") else raw_path.rstrip("/\\")) + ".rollups"
+
+
+def tier_file(path, tier):
+    return os.path.join(path, f"{tier}.bin")
+
+
+def read_tier(path, tier, start=None, end=None, sensor_id=None):
+    """Finished buckets of one tier with start <= bucket start <= end, from disk only.
+
+    Safe from processes that don't own the Rollups writer (e.g. web workers).
+    """
+    file = tier_file(path, tier)
+    n = os.path.getsize(file) // ROLLUP_DTYPE.itemsize if os.path.exists(file) else 0
+    records = np.memmap(file, dtype=ROLLUP_DTYPE, mode="r", shape=(n,)) if n else np.empty(0, ROLLUP_DTYPE)
+    return select(records, start, end, sensor_id)
+
+
+def select(records, start=None, end=None, sensor_id=None):
+    keep = np.ones(len(records), dtype=bool)
+    if start is not None:
+        keep &= records["start"] >= to_epoch(start)
+    if end is not None:
+        keep &= records["start"] <= to_epoch(end)
+    if sensor_id is not None:
+        keep &= records["sensor_id"] == sensor_id
+    return np.sort(records[keep], order="start", kind="stable")
+
+
+class Rollups:
+    """Maintains every tier as readings arrive.
+
+    Finished buckets are buffered and appended to the tier files when
+    flush() runs (automatically whenever a bucket closes, i.e. at most
+    about once a minute). state.json records how many records each file
+    holds plus the still-open buckets, so a restart resumes mid-bucket;
+    records appended after the last state write are discarded on load,
+    since the state still has them as open buckets.
+    """
+
+    def __init__(self, path, tiers=TIERS):
+        self.path = path
+        self.tiers = dict(tiers)
+        os.makedirs(path, exist_ok=True)
+        # Open bucket per tier and sensor: [start, count, pm25 min, max, sum, pm10 min, max, sum]
+        self._open = {tier: {} for tier in self.tiers}
+        self._closed = {tier: [] for tier in self.tiers}
+        self._rows = {tier: 0 for tier in self.tiers}
+        self._load_state()
+
+    # ---------------- state ----------------
+    def _state_path(self):
+        return os.path.join(self.path, STATE_FILE)
+
+    def _disk_rows(self, tier):
+        file = tier_file(self.path, tier)
+        return os.path.getsize(file) // ROLLUP_DTYPE.itemsize if os.path.exists(file) else 0
+
+    def _load_state(self):
+        state = {}
+        if os.path.exists(self._state_path()):
+            with open(self._state_path()) as f:
+                state = json.load(f)
+        for tier in self.tiers:
+            rows = state.get("rows", {}).get(tier, self._disk_rows(tier))
+            if self._disk_rows(tier) > rows:
+                # Appended but never committed to the state: those buckets are still open below
+                os.truncate(tier_file(self.path, tier), rows * ROLLUP_DTYPE.itemsize)
+            self._rows[tier] = rows
+            self._open[tier] = {int(sensor): bucket for sensor, bucket in state.get("open", {}).get(tier, {}).items()}
+
+    def _save_state(self):
+        tmp = self._state_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rows": self._rows, "open": self._open}, f)
+        os.replace(tmp, self._state_path())
+
+    # ---------------- updates ----------------
+    def add(self, timestamp, pm25, pm10, sensor_id=0):
+        """Fold one reading into every tier; `timestamp` in ts_store seconds."""
+        if pm25 is None or pm10 is None or pm25 != pm25 or pm10 != pm10:
+            return
+        closed = False
+        for tier, width in self.tiers.items():
+            start = timestamp - timestamp % width
+            bucket = self._open[tier].get(sensor_id)
+            if bucket is None or start > bucket[0]:
+                if bucket is not None:
+                    self._closed[tier].append(self._record(bucket, sensor_id))
+                    closed = True
+                self._open[tier][sensor_id] = [start, 1, pm25, pm25, pm25, pm10, pm10, pm10]
+                continue
+            # Same bucket (a reading from a clock stepping back also lands here)
+            bucket[1] += 1
+            if pm25 < bucket[2]:
+                bucket[2] = pm25
+            if pm25 > bucket[3]:
+                bucket[3] = pm25
+            bucket[4] += pm25
+            if pm10 < bucket[5]:
+                bucket[5] = pm10
+            if pm10 > bucket[6]:
+                bucket[6] = pm10
+            bucket[7] += pm10
+        if closed:
+            self.flush()
+
+    @staticmethod
+    def _record(bucket, sensor_id):
+        start, count, lo25, hi25, sum25, lo10, hi10, sum10 = bucket
+        return (start, sensor_id, count, lo25, hi25, sum25 / count, lo10, hi10, sum10 / count)
+
+    def flush(self):
+        for tier, records in self._closed.items():
+            if records:
+                with open(tier_file(self.path, tier), "ab") as f:
+                    f.write(np.array(records, dtype=ROLLUP_DTYPE).tobytes())
+                self._rows[tier] += len(records)
+                records.clear()
+        self._save_state()
+
+    close = flush
+
+    # ---------------- reading ----------------
+    def read(self, tier, start=None, end=None, sensor_id=None, include_open=True):
+        """Records of one tier, oldest first, including buffered and (optionally) open buckets."""
+        records = read_tier(self.path, tier, start, end, sensor_id)
+        extra = list(self._closed[tier])
+        if include_open:
+            extra += [self._record(bucket, sensor) for sensor, bucket in self._open[tier].items()]
+        if not extra:
+            return records
+        return select(np.concatenate([records, np.array(extra, dtype=ROLLUP_DTYPE)]), start, end, sensor_id)
+
+
+# ---------------- BATCH BUILD ----------------
+def build(source, path=None, tiers=TIERS):
+    """Recompute every tier from a raw CSV or store in one vectorized pass; returns a Rollups."""
+    path = path or rollup_path(source)
+    ts, values, codes, _ = load_log(source, features=len(FIELDS))
+    keep = np.isfinite(ts) & np.isfinite(values).all(axis=1)
+    ts, values, codes = ts[keep], values[keep], np.asarray(codes)[keep]
+    order = np.lexsort((ts, codes))
+    ts, values, codes = ts[order], values[order], codes[order]
+
+    os.makedirs(path, exist_ok=True)
+    state = {"rows": {}, "open": {}}
+    for tier, width in tiers.items():
+        starts = ts - ts % width
+        first = np.ones(len(ts), dtype=bool)
+        first[1:] = (starts[1:] != starts[:-1]) | (codes[1:] != codes[:-1])
+        edges = np.flatnonzero(first)
+        records = np.empty(len(edges), dtype=ROLLUP_DTYPE)
+        if len(edges):
+            records["start"] = starts[edges]
+            records["sensor_id"] = codes[edges]
+            counts = np.diff(np.append(edges, len(ts)))
+            records["count"] = counts
+            for i, field in enumerate(FIELDS):
+                column = values[:, i]
+                records[f"{field}_min"] = np.minimum.reduceat(column, edges)
+                records[f"{field}_max"] = np.maximum.reduceat(column, edges)
+                records[f"{field}_mean"] = np.add.reduceat(column, edges) / counts
+        # Each sensor's newest bucket may still be filling: keep it open
+        last = np.ones(len(edges), dtype=bool)
+        last[:-1] = records["sensor_id"][1:] != records["sensor_id"][:-1]
+        open_buckets = {}
+        for r in records[last]:
+            count = int(r["count"])
+            open_buckets[int(r["sensor_id"])] = [
+                float(r["start"]), count,
+                float(r["pm25_min"]), float(r["pm25_max"]), float(r["pm25_mean"]) * count,
+                float(r["pm10_min"]), float(r["pm10_max"]), float(r["pm10_mean"]) * count,
+            ]
+        finished = select(records[~last])
+        tmp = tier_file(path, tier) + ".tmp"
+        finished.tofile(tmp)
+        os.replace(tmp, tier_file(path, tier))
+        state["rows"][tier] = len(finished)
+        state["open"][tier] = open_buckets
+    tmp = os.path.join(path, STATE_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(path, STATE_FILE))
+    return Rollups(path, tiers)
+
+
+# ---------------- RETENTION ----------------
+def prune_raw(days, csv_path=None, store_path=None):
+    """Drop raw rows older than `days` from a CSV and/or store (not while they're being written)."""
+    from csv_sink import prune_csv
+
+    cutoff = now_epoch() - days * 86400
+    removed = {}
+    if store_path and os.path.isdir(store_path):
+        removed[store_path] = TimeSeriesStore(store_path).prune_before(cutoff)
+    if csv_path and os.path.exists(csv_path):
+        removed[csv_path] = prune_csv(csv_path, format_epoch(cutoff))
+    return removed
+
+
+def to_json(records):
+    """Column lists for an API response."""
+    out = {"start": [format_epoch(t) for t in records["start"]],
+           "sensor_id": records["sensor_id"].tolist(), "count": records["count"].tolist()}
+    for name in ROLLUP_DTYPE.names[3:]:
+        out[name] = [round(float(v), 1) for v in records[name]]
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-resolution rollups of the air quality readings")
+    parser.add_argument("--rollups", help="rollup directory (default: next to the raw data)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bld = sub.add_parser("build", help="recompute every tier from raw history")
+    bld.add_argument("source", nargs="?", default="live_air_quality.store", help="log CSV or store directory")
+    shw = sub.add_parser("show", help="print the newest buckets of a tier")
+    shw.add_argument("tier", choices=list(TIERS))
+    shw.add_argument("--last", type=int, default=24)
+    prn = sub.add_parser("prune", help="delete raw rows older than --days (rollups are kept)")
+    prn.add_argument("--days", type=float, default=RETENTION_DAYS)
+    prn.add_argument("--csv", default="live_air_quality.csv")
+    prn.add_argument("--store", default="live_air_quality.store")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        path = args.rollups or rollup_path(args.source)
+        rollups = build(args.source, path)
+        print(f"✅ Rolled up {args.source} into {path}: "
+              + ", ".join(f"{tier} {len(rollups.read(tier))}" for tier in TIERS))
+    elif args.command == "show":
+        path = args.rollups or rollup_path("live_air_quality.csv")
+        records = Rollups(path).read(args.tier)[-args.last:]
+        print(f"{'start':<21}{'n':>7}{'pm25 min':>10}{'mean':>8}{'max':>8}{'pm10 min':>10}{'mean':>8}{'max':>8}")
+        for r in records:
+            print(f"{format_epoch(r['start']):<21}{r['count']:>7}{r['pm25_min']:>10.1f}{r['pm25_mean']:>8.1f}"
+                  f"{r['pm25_max']:>8.1f}{r['pm10_min']:>10.1f}{r['pm10_mean']:>8.1f}{r['pm10_max']:>8.1f}")
+    else:
+        path = args.rollups or rollup_path(args.csv)
+        if not os.path.exists(os.path.join(path, STATE_FILE)):
+            raise SystemExit(f"❌ No rollups at {path}; run 'python rollups.py build' first so nothing is lost.")
+        for target, rows in prune_raw(args.days, args.csv, args.store).items():
+            print(f"✅ Removed {rows} rows older than {args.days:g} days from {target}")
@@ -1,31 +1,280 @@
 import serial
 import struct
 import time
+from collections import deque, namedtuple
 from datetime import datetime
 
+from metrics import SERIAL_READ_SECONDS, FRAME_DECODE_SECONDS, BAD_FRAMES
+
+# ---------------- SDS011 PROTOCOL ----------------
+FRAME_LEN = 10
+FRAME_HEAD = 0xAA
+FRAME_TAIL = 0xAB
+CMD_DATA = 0xC0      # measurement frame streamed by the sensor
+CMD_REPLY = 0xC5     # reply to a host command
+CMD_HOST = 0xB4      # command frame sent by the host
+COMMAND_LEN = 19
+BROADCAST_ID = 0xFFFF  # command device ID that every sensor answers
+
+# Host command codes (byte 2 of a command, echoed in byte 2 of its reply)
+REPORTING_MODE = 2
+QUERY_DATA = 4
+SET_DEVICE_ID = 5
+SLEEP_WORK = 6
+FIRMWARE_VERSION = 7
+WORKING_PERIOD = 8
+GET, SET = 0, 1
+MODE_ACTIVE, MODE_QUERY = 0, 1
+MAX_WORKING_PERIOD = 30  # minutes
+COMMAND_TIMEOUT = 2.0    # seconds to wait for a reply
+READ_TIMEOUT = 5.0       # seconds SDS011.read() waits for a frame (one streams every second)
+REPLY_BACKLOG = 16       # replies kept by the decoder until someone takes them
+
+Measurement = namedtuple("Measurement", ["pm25", "pm10", "device_id"])
+Reply = namedtuple("Reply", ["command", "data", "device_id"])  # data: the 3 bytes after the command
+
+
+def checksum(payload):
+    """SDS011 checksum: low byte of the sum of the data bytes."""
+    return sum(payload) & 0xFF
+
+
+def encode_measurement(pm25, pm10, device_id=0):
+    """The 10-byte data frame the sensor sends for a reading (µg/m³, 0.1 resolution)."""
+    body = struct.pack("<HHH", int(round(pm25 * 10)), int(round(pm10 * 10)), device_id)
+    return bytes((FRAME_HEAD, CMD_DATA)) + body + bytes((checksum(body), FRAME_TAIL))
+
+
+def encode_reply(command, data=(), device_id=0):
+    """The 10-byte reply frame a sensor sends for a host command."""
+    body = bytes((command,)) + bytes(data).ljust(3, b"\0") + struct.pack("<H", device_id)
+    return bytes((FRAME_HEAD, CMD_REPLY)) + body + bytes((checksum(body), FRAME_TAIL))
+
+
+# ---------------- HOST COMMANDS ----------------
+def encode_command(command, data=(), device_id=BROADCAST_ID):
+    """A 19-byte host command: code, 12 data bytes, target device ID, checksum."""
+    body = bytes((command,)) + bytes(data).ljust(12, b"\0") + struct.pack("<H", device_id)
+    return bytes((FRAME_HEAD, CMD_HOST)) + body + bytes((checksum(body), FRAME_TAIL))
+
+
+def reporting_mode_command(query=None, device_id=BROADCAST_ID):
+    """Get the reporting mode, or set query mode (True) / active streaming (False)."""
+    if query is None:
+        return encode_command(REPORTING_MODE, (GET,), device_id)
+    return encode_command(REPORTING_MODE, (SET, MODE_QUERY if query else MODE_ACTIVE), device_id)
+
+
+def query_command(device_id=BROADCAST_ID):
+    """Ask for one measurement (answered with a data frame, in either mode)."""
+    return encode_command(QUERY_DATA, (), device_id)
+
+
+def sleep_command(sleep=None, device_id=BROADCAST_ID):
+    """Get the sleep state, or put the sensor to sleep (True) / wake it (False)."""
+    if sleep is None:
+        return encode_command(SLEEP_WORK, (GET,), device_id)
+    return encode_command(SLEEP_WORK, (SET, 0 if sleep else 1), device_id)
+
+
+def working_period_command(minutes=None, device_id=BROADCAST_ID):
+    """Get the working period, or set it: 0 = continuous, n = 30 s of work every n minutes."""
+    if minutes is None:
+        return encode_command(WORKING_PERIOD, (GET,), device_id)
+    if not 0 <= minutes <= MAX_WORKING_PERIOD:
+        raise ValueError(f"Working period must be 0-{MAX_WORKING_PERIOD} minutes, got {minutes}")
+    return encode_command(WORKING_PERIOD, (SET, minutes), device_id)
+
+
+def firmware_command(device_id=BROADCAST_ID):
+    return encode_command(FIRMWARE_VERSION, (), device_id)
+
+
+def set_device_id_command(new_id, device_id=BROADCAST_ID):
+    data = bytes(10) + struct.pack("<H", new_id)
+    return encode_command(SET_DEVICE_ID, data, device_id)
+
+
+def parse_reply(reply):
+    """Meaning of a Reply as a dict, e.g. {"query_mode": True} or {"firmware": "2018-11-16"}."""
+    cmd, (d2, d3, d4) = reply.command, reply.data
+    out = {"device_id": reply.device_id}
+    if cmd == REPORTING_MODE:
+        out["query_mode"] = d3 == MODE_QUERY
+    elif cmd == SLEEP_WORK:
+        out["sleeping"] = d3 == 0
+    elif cmd == WORKING_PERIOD:
+        out["working_period"] = d3
+    elif cmd == FIRMWARE_VERSION:
+        out["firmware"] = f"20{d2:02d}-{d3:02d}-{d4:02d}"
+    return out
+
+
+def send_command(ser, decoder, command, timeout=COMMAND_TIMEOUT):
+    """Write a command and wait for its answer on a blocking or non-blocking port.
+
+    Returns the Reply, or the Measurement for a data query; None on
+    timeout (a sleeping sensor only answers a wake command). Measurements
+    streamed in the meantime are dropped.
+    """
+    expect = command[2]
+    decoder.replies.clear()
+    ser.write(command)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = ser.read(ser.in_waiting or 1)
+        if not data:
+            time.sleep(0.01)
+            continue
+        frames = decoder.feed(data)
+        if expect == QUERY_DATA:
+            if frames:
+                return frames[-1]
+            continue
+        while decoder.replies:
+            reply = decoder.replies.popleft()
+            if reply.command == expect:
+                return reply
+    return None
+
+
+class SDS011FrameDecoder:
+    """Streaming decoder for SDS011 frames.
+
+    Bytes are appended to one reusable buffer and scanned for complete
+    10-byte frames. Every frame is checked for its command byte, checksum
+    and 0xAB tail; anything that fails is skipped and the scan resyncs on
+    the next 0xAA header.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.replies = deque(maxlen=REPLY_BACKLOG)  # command replies, oldest first
+        self.good = 0       # frames that passed checksum and tail checks
+        self.bad = 0        # frames with a valid header but bad checksum/tail
+        self.resynced = 0   # times garbage was skipped to find a header
+
+    def feed(self, data):
+        """Add raw bytes and return every measurement decoded from them."""
+        buf = self._buf
+        buf.extend(data)
+        end = len(buf)
+        pos = 0
+        out = []
+        while True:
+            start = buf.find(FRAME_HEAD, pos)
+            if start < 0:
+                if pos < end:
+                    self.resynced += 1
+                pos = end
+                break
+            if start > pos:
+                self.resynced += 1
+            if end - start < FRAME_LEN:
+                pos = start
+                break
+            cmd = buf[start + 1]
+            if cmd != CMD_DATA and cmd != CMD_REPLY:
+                # Stray 0xAA inside garbage, not a frame header
+                pos = start + 1
+                continue
+            if buf[start + 9] != FRAME_TAIL or \
+                    (sum(buf[start + 2:start + 8]) & 0xFF) != buf[start + 8]:
+                self.bad += 1
+                BAD_FRAMES.inc()
+                pos = start + 1
+                continue
+            self.good += 1
+            if cmd == CMD_DATA:
+                pm25_raw, pm10_raw, device_id = struct.unpack_from("<HHH", buf, start + 2)
+                out.append(Measurement(pm25_raw / 10.0, pm10_raw / 10.0, device_id))
+            else:
+                self.replies.append(Reply(buf[start + 2], bytes(buf[start + 3:start + 6]),
+                                          buf[start + 6] | buf[start + 7] << 8))
+            pos = start + FRAME_LEN
+        del buf[:pos]
+        return out
+
+    def reset(self):
+        """Drop any partial frame, e.g. after the port was reopened."""
+        del self._buf[:]
+
+    def stats(self):
+        return {"good": self.good, "bad": self.bad, "resynced": self.resynced}
+
+
 class SDS011:
     def __init__(self, port="COM3", baudrate=9600, timeout=2):
+        self.decoder = SDS011FrameDecoder()
         try:
             self.ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+            # A duty-cycled sensor may have been left asleep or in query mode
+            self.ser.write(sleep_command(False))
+            self.ser.write(reporting_mode_command(query=False))
             print(f"✅ SDS011 connected on {port}")
         except Exception as e:
             print(f"❌ Error connecting to SDS011: {e}")
             self.ser = None
 
-    def read(self):
+    def read_all(self):
+        """Read everything waiting on the port in one call and return all decoded frames."""
+        if self.ser is None:
+            return []
+        started = time.perf_counter()
+        data = self.ser.read(self.ser.in_waiting or FRAME_LEN)
+        read = time.perf_counter()
+        frames = self.decoder.feed(data)
+        SERIAL_READ_SECONDS.observe(read - started)
+        FRAME_DECODE_SECONDS.observe(time.perf_counter() - read)
+        return frames
+
+    def read(self, timeout=READ_TIMEOUT):
+        """Wait up to `timeout` seconds for a frame; returns the newest (pm25, pm10) or (None, None)."""
         if self.ser is None:
             return None, None
 
-        while True:
-            byte = self.ser.read(1)
-            if byte == b"\xaa":  # Start frame
-                data = self.ser.read(9)
-                if len(data) < 9:
-                    continue
-                if data[0] == 0xc0:  # Data frame
-                    pm25 = (data[1] + data[2] * 256) / 10.0
-                    pm10 = (data[3] + data[4] * 256) / 10.0
-                    return pm25, pm10
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            frames = self.read_all()
+            if frames:
+                return frames[-1].pm25, frames[-1].pm10
+        return None, None
+
+    def command(self, command, timeout=COMMAND_TIMEOUT):
+        """Send an encoded host command and return its reply (see send_command)."""
+        if self.ser is None:
+            return None
+        return send_command(self.ser, self.decoder, command, timeout)
+
+    def sleep(self):
+        """Turn off the laser and fan until wake() (the sensor then ignores everything else)."""
+        return self.command(sleep_command(True)) is not None
+
+    def wake(self):
+        return self.command(sleep_command(False)) is not None
+
+    def set_query_mode(self, query=True):
+        """Query mode: the sensor only reports when asked by query(); False restores streaming."""
+        return self.command(reporting_mode_command(query)) is not None
+
+    def set_working_period(self, minutes):
+        return self.command(working_period_command(minutes)) is not None
+
+    def query(self):
+        """Ask for one reading; returns (pm25, pm10) or (None, None) without an answer."""
+        frame = self.command(query_command())
+        if frame is None:
+            return None, None
+        return frame.pm25, frame.pm10
+
+    def status(self):
+        """Reporting mode, sleep state, working period and firmware as one dict."""
+        out = {}
+        for command in (reporting_mode_command(), sleep_command(), working_period_command(), firmware_command()):
+            reply = self.command(command)
+            if reply is not None:
+                out.update(parse_reply(reply))
+        return out
 
     def close(self):
         if self.ser:
@@ -37,11 +286,15 @@ if __name__ == "__main__":
     try:
         while True:
             pm25, pm10 = sensor.read()
+            if pm25 is None:
+                print(f"⚠️ No frame within {READ_TIMEOUT:g}s; check the sensor connection")
+                continue
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             print("\n-------------------------------")
             print(f"⏳ Time: {timestamp}")
             print(f"🌫 PM2.5: {pm25} µg/m³ (Fine Particles)")
             print(f"🌪 PM10: {pm10} µg/m³ (Coarse Particles)")
+            print(f"🧮 Frames: {sensor.decoder.stats()}")
             print("-------------------------------")
             time.sleep(10)  # reading every 10 seconds
     except KeyboardInterrupt:
@@ -0,0 +1,396 @@
+"""
+Virtual SDS011 sensors on pseudo-terminals, for load testing without hardware.
+
+Each device opens a pty pair and writes valid 10-byte measurement frames
+to it; anything that takes a serial port name (SDS011, acquisition.py,
+data_logger's SensorSession) can open the slave side instead of COM3. Readings come from
+a logged CSV (replayed with its own timing) or a synthetic profile, sped
+up by --speed. Faults can be injected: garbage bytes, truncated frames
+and disconnects (the pty is torn down and a new one appears after a
+pause, like a USB adapter being replugged).
+
+Host commands are answered like the real sensor: reporting mode, data
+queries, sleep/work, working period, firmware version and device ID. A
+sleeping device sends nothing and only answers a wake command; in query
+mode it only sends a frame when asked.
+
+One scheduler thread drives every device, so hundreds can run at once.
+Each device's current pty is also published as a stable symlink,
+<link-dir>/<name>, which is what clients should open.
+
+    python sds011_sim.py                                     # one device, replaying live_air_quality.csv
+    python sds011_sim.py --count 8 --speed 1000 --profile diurnal --garbage 0.01 --disconnect-every 120
+"""
+
+import argparse
+import heapq
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+import sds011_reader as proto
+from sds011_reader import encode_measurement, encode_reply, checksum, FRAME_LEN, COMMAND_LEN
+
+# ---------------- CONFIG ----------------
+DATA_FILE = "live_air_quality.csv"
+LINK_DIR = "/tmp/deepair-sim"
+FRAME_INTERVAL = 1.0       # seconds between frames in continuous mode, as the real sensor
+MAX_REPLAY_GAP = 60        # longer gaps in a replayed log are shortened to this
+DISCONNECT_SECONDS = 2.0   # wall-clock time a device stays unplugged
+MAX_VALUE = 999.9          # sensor range, µg/m³
+PROFILES = ("steady", "diurnal", "spikes", "ramp")
+COMMAND_POLL = 0.05        # wall-clock seconds between checks for host commands
+FIRMWARE = (18, 11, 16)    # reported as 2018-11-16
+# --------------------------------------
+
+
+# ---------------- READING SOURCES ----------------
+def replay_csv(csv_path, loop=True):
+    """Yield (delay, pm25, pm10) from a log, delays taken from its timestamps."""
+    import pandas as pd
+    from ts_store import read_log_csv, PM25_COLUMNS, TIME_FORMAT
+
+    frame = read_log_csv(csv_path)
+    pm25_col = next((c for c in PM25_COLUMNS if c in frame.columns), None)
+    if pm25_col is None:
+        raise ValueError(f"{csv_path} has no PM2.5 column (expected one of {PM25_COLUMNS})")
+    pm25 = pd.to_numeric(frame[pm25_col], errors="coerce").to_numpy(dtype=np.float64)
+    pm10 = pd.to_numeric(frame["pm10"], errors="coerce").to_numpy(dtype=np.float64)
+    keep = np.isfinite(pm25) & np.isfinite(pm10)
+    ts = pd.to_datetime(frame["timestamp"], format=TIME_FORMAT, errors="coerce")[keep]
+    seconds = ts.to_numpy().astype("datetime64[s]").astype(np.float64)
+    delays = np.diff(seconds, prepend=seconds[:1] - FRAME_INTERVAL) if len(seconds) else seconds
+    delays = np.clip(np.nan_to_num(delays, nan=FRAME_INTERVAL), 0, MAX_REPLAY_GAP)
+    rows = list(zip(delays.tolist(), pm25[keep].tolist(), pm10[keep].tolist()))
+    if not rows:
+        raise ValueError(f"{csv_path} has no readings to replay")
+    while True:
+        yield from rows
+        if not loop:
+            return
+
+
+def synthetic(profile="diurnal", interval=FRAME_INTERVAL, seed=None):
+    """Yield (delay, pm25, pm10) forever from a named profile; time runs in simulated seconds."""
+    rng = random.Random(seed)
+    t = rng.uniform(0, 86400)
+    base = rng.uniform(8, 30)
+    while True:
+        if profile == "steady":
+            pm25 = base + rng.gauss(0, 1)
+        elif profile == "diurnal":
+            # Morning and evening peaks on top of a daily cycle
+            hour = (t / 3600) % 24
+            pm25 = base * (1 + 0.5 * math.sin(2 * math.pi * (hour - 9) / 24)
+                           + 0.4 * math.exp(-((hour - 8) ** 2) / 2) + 0.6 * math.exp(-((hour - 20) ** 2) / 3))
+            pm25 += rng.gauss(0, 1.5)
+        elif profile == "spikes":
+            pm25 = base + rng.gauss(0, 1) + (rng.uniform(50, 300) if rng.random() < 0.01 else 0)
+        elif profile == "ramp":
+            # Up through every AQI band and back down over two hours
+            phase = (t % 7200) / 3600
+            pm25 = 5 + 295 * (phase if phase < 1 else 2 - phase)
+        else:
+            raise ValueError(f"Unknown profile {profile!r} (choose from {PROFILES})")
+        pm25 = max(pm25, 0.0)
+        pm10 = pm25 * rng.uniform(1.3, 1.9)
+        yield interval, pm25, pm10
+        t += interval
+
+
+# ---------------- DEVICE ----------------
+class VirtualSDS011:
+    """One simulated sensor on a pty pair.
+
+    `readings` yields (delay, pm25, pm10) in simulated seconds; `speed`
+    divides every delay. Fault rates are per frame; `disconnect_every` is
+    the mean number of simulated seconds between disconnects.
+    """
+
+    def __init__(self, readings, name="sensor0", link_dir=LINK_DIR, speed=1.0, device_id=1,
+                 garbage=0.0, truncate=0.0, disconnect_every=None, downtime=DISCONNECT_SECONDS, seed=None):
+        self.readings = readings
+        self.name = name
+        self.link = os.path.join(link_dir, name) if link_dir else None
+        self.speed = speed
+        self.device_id = device_id
+        self.garbage = garbage
+        self.truncate = truncate
+        self.disconnect_every = disconnect_every
+        self.downtime = downtime
+        self.rng = random.Random(seed)
+        self.master = self.slave = None
+        self.port = None
+        self.counts = {"frames": 0, "garbage": 0, "truncated": 0, "disconnects": 0,
+                       "dropped": 0, "bytes_in": 0, "commands": 0}
+        self.query_mode = False
+        self.sleeping = False
+        self.working_period = 0  # minutes; 0 = continuous
+        self._inbuf = bytearray()
+        self._next_periodic = None
+        self._next_reading = None
+        self._reconnect_at = None
+        self._next_disconnect = None
+
+    def open(self):
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # Like a UART with nobody listening: when the pty buffer is full, frames are lost
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        if self.link:
+            os.makedirs(os.path.dirname(self.link), exist_ok=True)
+            tmp = self.link + ".tmp"
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            os.symlink(self.port, tmp)
+            os.replace(tmp, self.link)
+        self._schedule_disconnect()
+        return self
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master = self.slave = None
+
+    def _schedule_disconnect(self):
+        if self.disconnect_every:
+            self._next_disconnect = self.rng.expovariate(1 / self.disconnect_every) / self.speed
+
+    def _read_commands(self, pm25, pm10):
+        """Read host bytes (so writes never block) and return the replies to any commands."""
+        try:
+            while True:
+                data = os.read(self.master, 4096)
+                if not data:
+                    break
+                self.counts["bytes_in"] += len(data)
+                self._inbuf += data
+        except (BlockingIOError, OSError):
+            pass
+        buf = self._inbuf
+        out = bytearray()
+        while True:
+            start = buf.find(bytes((proto.FRAME_HEAD, proto.CMD_HOST)))
+            if start < 0:
+                del buf[:max(len(buf) - 1, 0)]
+                break
+            if len(buf) - start < COMMAND_LEN:
+                del buf[:start]
+                break
+            frame = bytes(buf[start:start + COMMAND_LEN])
+            if frame[-1] != proto.FRAME_TAIL or checksum(frame[2:17]) != frame[17]:
+                del buf[:start + 1]
+                continue
+            del buf[:start + COMMAND_LEN]
+            target = frame[15] | frame[16] << 8
+            if target in (proto.BROADCAST_ID, self.device_id):
+                out += self._answer(frame[2], frame[3:15], pm25, pm10)
+        return bytes(out)
+
+    def _answer(self, command, data, pm25, pm10):
+        """Apply one host command and return the sensor's reply bytes."""
+        is_set = data[0] == proto.SET
+        if self.sleeping and not (command == proto.SLEEP_WORK and is_set and data[1] == 1):
+            return b""  # a sleeping sensor only listens for a wake command
+        self.counts["commands"] += 1
+        if command == proto.QUERY_DATA:
+            return encode_measurement(min(pm25, MAX_VALUE), min(pm10, MAX_VALUE), self.device_id)
+        if command == proto.REPORTING_MODE:
+            if is_set:
+                self.query_mode = data[1] == proto.MODE_QUERY
+            return encode_reply(command, (data[0], int(self.query_mode)), self.device_id)
+        if command == proto.SLEEP_WORK:
+            if is_set:
+                self.sleeping = data[1] == 0
+            return encode_reply(command, (data[0], int(not self.sleeping)), self.device_id)
+        if command == proto.WORKING_PERIOD:
+            if is_set and data[1] <= proto.MAX_WORKING_PERIOD:
+                self.working_period = data[1]
+                self._next_periodic = None
+            return encode_reply(command, (data[0], self.working_period), self.device_id)
+        if command == proto.FIRMWARE_VERSION:
+            return encode_reply(command, FIRMWARE, self.device_id)
+        if command == proto.SET_DEVICE_ID:
+            self.device_id = data[10] | data[11] << 8
+            return encode_reply(command, (), self.device_id)
+        return b""
+
+    def _streaming(self, due):
+        """Whether a frame due at `due` is sent unasked (active mode, awake, within the working period)."""
+        if self.sleeping or self.query_mode:
+            return False
+        if not self.working_period:
+            return True
+        # One frame per working period instead of the real 30 s of work
+        if self._next_periodic is None or due >= self._next_periodic:
+            self._next_periodic = due + self.working_period * 60 / self.speed
+            return True
+        return False
+
+    def _frame_bytes(self, pm25, pm10):
+        frame = encode_measurement(min(pm25, MAX_VALUE), min(pm10, MAX_VALUE), self.device_id)
+        out = b""
+        if self.garbage and self.rng.random() < self.garbage:
+            # Random noise, sometimes with a stray header byte in it
+            noise = bytes(self.rng.getrandbits(8) for _ in range(self.rng.randint(1, 2 * FRAME_LEN)))
+            out += noise
+            self.counts["garbage"] += 1
+        if self.truncate and self.rng.random() < self.truncate:
+            frame = frame[:self.rng.randint(1, FRAME_LEN - 1)]
+            self.counts["truncated"] += 1
+        else:
+            self.counts["frames"] += 1
+        return out + frame
+
+    def step(self, now):
+        """Write everything due by `now`; returns the monotonic time of the next event."""
+        if self._reconnect_at is not None:
+            if now < self._reconnect_at:
+                return self._reconnect_at
+            self._reconnect_at = None
+            self.open()
+            self._next_reading = None
+            # A power cycle wakes the sensor; reporting mode and working period are kept in flash
+            self.sleeping = False
+            del self._inbuf[:]
+        if self.master is None:
+            self.open()
+
+        out = bytearray()
+        if self._next_reading is None:
+            self._next_reading = (now,) + next(self.readings)[1:]
+        due, pm25, pm10 = self._next_reading
+        while due <= now:
+            if self._streaming(due):
+                out += self._frame_bytes(pm25, pm10)
+            delay, pm25, pm10 = next(self.readings)
+            if self._next_disconnect is not None:
+                self._next_disconnect -= delay / self.speed
+            due += delay / self.speed
+        self._next_reading = (due, pm25, pm10)
+        out += self._read_commands(pm25, pm10)
+
+        if out:
+            try:
+                os.write(self.master, out)
+            except BlockingIOError:
+                self.counts["dropped"] += len(out)
+            except OSError:
+                pass
+
+        if self._next_disconnect is not None and self._next_disconnect <= 0:
+            self.close()
+            self.counts["disconnects"] += 1
+            self._reconnect_at = now + self.downtime
+            return self._reconnect_at
+        return min(due, now + COMMAND_POLL)
+
+
+class Simulator:
+    """Drives many VirtualSDS011 devices from one thread with a time-ordered heap."""
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self, duration=None):
+        now = time.monotonic()
+        end = now + duration if duration else None
+        heap = [(now, i) for i in range(len(self.devices))]
+        heapq.heapify(heap)
+        for device in self.devices:
+            device.open()
+        try:
+            while heap and not self._stop.is_set():
+                due, i = heap[0]
+                now = time.monotonic()
+                if end is not None and now >= end:
+                    break
+                if due > now:
+                    # Sleep at most 0.2 s so stop() is noticed promptly
+                    self._stop.wait(min(due - now, 0.2))
+                    continue
+                heapq.heapreplace(heap, (self.devices[i].step(now), i))
+        finally:
+            for device in self.devices:
+                device.close()
+
+    def start(self, duration=None):
+        self._thread = threading.Thread(target=self.run, args=(duration,), daemon=True)
+        self._thread.start()
+        # Ports exist once every device has opened
+        while any(d.port is None for d in self.devices) and self._thread.is_alive():
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        total = {}
+        for device in self.devices:
+            for key, value in device.counts.items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+
+def make_devices(count=1, source=None, profile=None, speed=1.0, link_dir=LINK_DIR, seed=0, **faults):
+    """`count` devices named sensor0..N-1, each replaying `source` or running `profile`."""
+    devices = []
+    for i in range(count):
+        readings = synthetic(profile, seed=seed + i) if profile else replay_csv(source or DATA_FILE)
+        devices.append(VirtualSDS011(readings, f"sensor{i}", link_dir, speed, device_id=0x1000 + i,
+                                     seed=seed + i, **faults))
+    return devices
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate SDS011 sensors on pseudo-terminals")
+    parser.add_argument("--count", type=int, default=1, help="number of devices")
+    parser.add_argument("--source", default=DATA_FILE, help="CSV log to replay")
+    parser.add_argument("--profile", choices=PROFILES, help="synthetic readings instead of a replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="time acceleration, e.g. 1000")
+    parser.add_argument("--garbage", type=float, default=0.0, help="chance per frame of preceding garbage bytes")
+    parser.add_argument("--truncate", type=float, default=0.0, help="chance per frame of cutting it short")
+    parser.add_argument("--disconnect-every", type=float, metavar="SECONDS",
+                        help="mean simulated seconds between disconnects")
+    parser.add_argument("--downtime", type=float, default=DISCONNECT_SECONDS, help="seconds a device stays unplugged")
+    parser.add_argument("--link-dir", default=LINK_DIR)
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not hasattr(os, "openpty"):
+        raise SystemExit("❌ Pseudo-terminals need Linux or macOS (on Windows use a com0com port pair).")
+    sim = Simulator(make_devices(args.count, args.source, args.profile, args.speed, args.link_dir, args.seed,
+                                 garbage=args.garbage, truncate=args.truncate,
+                                 disconnect_every=args.disconnect_every, downtime=args.downtime))
+    sim.start(args.duration)
+    ports = [f"{d.name}={d.link or d.port}" for d in sim.devices]
+    print(f"✅ {len(ports)} virtual SDS011 device(s) at {args.speed:g}× speed:")
+    for port in ports:
+        print("   " + port)
+    print(f"   e.g. python acquisition.py {' '.join(ports[:4])}")
+    try:
+        while sim._thread.is_alive():
+            time.sleep(5)
+            print(f"🔁 {sim.stats()}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    sim.stop()
+    print(f"✅ Stopped: {sim.stats()}")
@@ -0,0 +1,114 @@
+"""
+Fixed-size shared-memory ring buffer of readings.
+
+One acquisition process appends; any number of reader processes (e.g.
+gunicorn web workers) map the same segment and read it without locks.
+Consistency comes from a seqlock: the writer bumps `seq` to an odd
+value before touching a record and back to even afterwards, and a
+reader retries whenever `seq` was odd or changed while it copied.
+"""
+
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_CAPACITY = 4096
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("pm25", "<f4"),
+    ("pm10", "<f4"),
+    ("predicted_pm25", "<f4"),
+    ("sensor_id", "<u2"),
+    ("_pad", "<u2"),
+])
+HEADER_SIZE = 64  # seq, count, capacity as uint64, padded to a cache line
+SEQ, COUNT, CAPACITY = 0, 1, 2
+
+
+def _open_segment(name, create=False, size=0):
+    """Open a segment that outlives this process.
+
+    The ring is deliberately left in place when the writer exits so a
+    restarted writer reuses it and readers already attached keep working;
+    call ShmRing.unlink() to remove it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 has no track flag: unregister by hand so the
+        # resource tracker doesn't unlink the segment at interpreter exit
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class ShmRing:
+    def __init__(self, name, capacity=DEFAULT_CAPACITY, create=False):
+        self.name = name
+        self.owner = False
+        if create:
+            size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+            try:
+                self._shm = _open_segment(name, create=True, size=size)
+                self.owner = True
+            except FileExistsError:
+                # Reuse the ring left by a previous writer so attached readers keep working
+                self._shm = _open_segment(name)
+        else:
+            self._shm = _open_segment(name)
+
+        self._header = np.ndarray((3,), dtype="<u8", buffer=self._shm.buf)
+        if self.owner:
+            self._header[:] = (0, 0, capacity)
+        self.capacity = int(self._header[CAPACITY])
+        if create and self.capacity != capacity:
+            raise ValueError(f"Existing ring '{name}' has capacity {self.capacity}, expected {capacity}")
+        self._records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE,
+                                   buffer=self._shm.buf, offset=HEADER_SIZE)
+
+    @property
+    def count(self):
+        """Total readings ever appended (not capped by capacity)."""
+        return int(self._header[COUNT])
+
+    def append(self, timestamp, pm25, pm10, predicted_pm25=None, sensor_id=0):
+        """Write one reading; only a single process may call this."""
+        header = self._header
+        count = int(header[COUNT])
+        header[SEQ] += 1
+        self._records[count % self.capacity] = (
+            timestamp, pm25, pm10, np.nan if predicted_pm25 is None else predicted_pm25, sensor_id, 0)
+        header[COUNT] = count + 1
+        header[SEQ] += 1
+
+    def tail(self, n):
+        """Return (count, records) for the newest n readings, oldest first."""
+        header = self._header
+        while True:
+            seq = int(header[SEQ])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            count = int(header[COUNT])
+            k = min(n, count, self.capacity)
+            rows = self._records[np.arange(count - k, count) % self.capacity]
+            if int(header[SEQ]) == seq:
+                return count, rows
+
+    def close(self):
+        self._header = None
+        self._records = None
+        self._shm.close()
+
+    def unlink(self):
+        if sys.version_info < (3, 13):
+            # SharedMemory.unlink() unregisters from the tracker; re-register so that balances
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
@@ -0,0 +1,53 @@
+"""
+NumPy LSTM engine against Keras: python -m pytest test_numpy_lstm.py
+
+Keras always gets its weights from the .h5 file itself, never from the
+arrays numpy_lstm parsed, so a weight-layout or gate-order bug shows up
+as a mismatch.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("h5py")
+
+from numpy_lstm import NumpyLSTMModel, export_npz, load_keras_reference, MODEL_FILE
+
+TOLERANCE = 1e-4
+
+
+def windows(model, n=64, seed=0):
+    return np.random.default_rng(seed).random((n,) + tuple(model.input_shape[1:]), dtype=np.float32)
+
+
+@pytest.mark.skipif(not os.path.exists(MODEL_FILE), reason=f"{MODEL_FILE} not found")
+def test_shipped_model_matches_keras():
+    np_model = NumpyLSTMModel.from_h5(MODEL_FILE)
+    keras_model = load_keras_reference(MODEL_FILE, np_model)
+    x = windows(np_model)
+    assert np.max(np.abs(keras_model.predict(x, verbose=0) - np_model.predict(x))) <= TOLERANCE
+
+
+def test_multi_feature_horizon_model_matches_keras(tmp_path):
+    # Same layout model_training builds for --horizon 3 --pm10, trained weights replaced by random ones
+    from tensorflow.keras import Input, Sequential
+    from tensorflow.keras.layers import LSTM, Dense
+
+    tf.keras.utils.set_random_seed(0)
+    keras_model = Sequential([Input(shape=(10, 2)), LSTM(16, return_sequences=True), LSTM(16),
+                              Dense(8), Dense(3 * 2)])
+    path = str(tmp_path / "model.h5")
+    keras_model.save(path)
+
+    np_model = NumpyLSTMModel.from_h5(path)
+    x = windows(np_model, n=700)
+    expected = keras_model.predict(x, verbose=0)
+    assert np_model.input_shape[1:] == (10, 2)
+    assert np.max(np.abs(expected - np_model.predict(x))) <= TOLERANCE
+    # Chunked batches and the exported .npz give the same answers
+    assert np.max(np.abs(expected - np_model.predict_batch(x, chunk=64))) <= TOLERANCE
+    exported = NumpyLSTMModel.load(export_npz(path))
+    assert np.max(np.abs(expected - exported.predict(x))) <= TOLERANCE
@@ -9,6 +9,8 @@ import serial.tools.list_ports
 import time
 import sys
 
+from sds011_reader import SDS011FrameDecoder, FRAME_LEN
+
 def test_com_ports():
     """Test all available COM ports for SDS011 sensor"""
     print("Scanning for SDS011 sensor...")
@@ -40,25 +42,25 @@ def test_com_ports():
                 ser.flushInput()
                 ser.flushOutput()
                 
-                # Try to read data
+                # Try to read data (two frames' worth so a misaligned start still decodes)
                 print(f"  Attempting to read sensor data...")
-                data = ser.read(10)
+                data = ser.read(2 * FRAME_LEN)
                 
-                if len(data) == 10:
+                if len(data) >= FRAME_LEN:
                     print(f"  Received {len(data)} bytes: {data.hex()}")
                     
                     # Check SDS011 protocol
-                    if data[0] == 0xAA and data[1] == 0xC0:
-                        pm2_5 = (data[2] + data[3]*256) / 10.0
-                        pm10 = (data[4] + data[5]*256) / 10.0
+                    decoder = SDS011FrameDecoder()
+                    frames = decoder.feed(data)
+                    if frames:
                         print(f"  SUCCESS: SDS011 sensor detected!")
-                        print(f"     PM2.5: {pm2_5:.1f} ug/m3")
-                        print(f"     PM10:  {pm10:.1f} ug/m3")
+                        print(f"     PM2.5: {frames[-1].pm25:.1f} ug/m3")
+                        print(f"     PM10:  {frames[-1].pm10:.1f} ug/m3")
                         return port.device
                     else:
-                        print(f"  ERROR: Not SDS011 protocol (expected 0xAA 0xC0)")
+                        print(f"  ERROR: Not SDS011 protocol (no valid 0xAA 0xC0 frame, {decoder.stats()})")
                 else:
-                    print(f"  WARNING: Received {len(data)} bytes (expected 10)")
+                    print(f"  WARNING: Received {len(data)} bytes (expected {FRAME_LEN})")
                     
         except serial.SerialException as e:
             print(f"  ERROR: Serial error: {e}")
@@ -76,16 +78,16 @@ def test_sensor_reading(port):
     
     try:
         with serial.Serial(port, 9600, timeout=3) as ser:
+            decoder = SDS011FrameDecoder()
             count = 0
             while True:
-                data = ser.read(10)
-                if len(data) == 10 and data[0] == 0xAA and data[1] == 0xC0:
-                    pm2_5 = (data[2] + data[3]*256) / 10.0
-                    pm10 = (data[4] + data[5]*256) / 10.0
+                data = ser.read(ser.in_waiting or FRAME_LEN)
+                frames = decoder.feed(data)
+                for frame in frames:
                     count += 1
-                    print(f"Reading {count:3d}: PM2.5={pm2_5:5.1f} ug/m3, PM10={pm10:5.1f} ug/m3")
-                else:
-                    print(f"Invalid data: {data.hex() if data else 'No data'}")
+                    print(f"Reading {count:3d}: PM2.5={frame.pm25:5.1f} ug/m3, PM10={frame.pm10:5.1f} ug/m3")
+                if not frames:
+                    print(f"Invalid data: {data.hex() if data else 'No data'} {decoder.stats()}")
                 time.sleep(1)
                 
     except KeyboardInterrupt:
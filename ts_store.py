@@ -0,0 +1,337 @@
+"""
+Append-only columnar time-series store for sensor readings.
+
+Each column lives in its own raw little-endian file inside a store
+directory, so appends are plain byte writes and readers get zero-copy
+NumPy arrays through np.memmap instead of re-parsing CSV text.
+
+Timestamps are wall-clock seconds: the CSV's naive "%Y-%m-%d %H:%M:%S"
+time read as if it were UTC, so they round-trip to the CSV strings
+exactly and need no timezone handling.
+
+    python ts_store.py import live_air_quality.csv live_air_quality.store
+    python ts_store.py export live_air_quality.store out.csv
+"""
+
+import argparse
+import calendar
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+COLUMNS = {
+    "timestamp": np.dtype("<f8"),
+    "pm25": np.dtype("<f4"),
+    "pm10": np.dtype("<f4"),
+    "predicted_pm25": np.dtype("<f4"),
+    "sensor_id": np.dtype("<u2"),
+}
+META_FILE = "meta.json"
+DEFAULT_SENSOR = "default"  # stored as sensor code 0
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Column names used by the different CSV writers in this project
+PM25_COLUMNS = ("pm25", "pm2_5")
+LOG_FIELDS = ("pm25", "pm10")  # value order load_log returns (the models' scaler feature order)
+
+
+def to_epoch(timestamp):
+    """Convert a CSV timestamp string or datetime to store seconds."""
+    if isinstance(timestamp, (int, float, np.floating)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.strptime(timestamp, TIME_FORMAT)
+    return float(calendar.timegm(timestamp.timetuple()))
+
+
+def now_epoch():
+    return float(calendar.timegm(time.localtime()))
+
+
+def format_epoch(seconds):
+    return time.strftime(TIME_FORMAT, time.gmtime(seconds))
+
+
+class TimeSeriesStore:
+    """Per-column binary files plus a small JSON metadata file.
+
+    Rows are buffered in memory and written once `flush_rows` are pending
+    (or on flush/close). Readers size every column from the shortest
+    file, so a reader racing a partial append never sees a torn row.
+    """
+
+    def __init__(self, path, flush_rows=1):
+        self.path = path
+        self.flush_rows = flush_rows
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"columns": {name: dt.str for name, dt in COLUMNS.items()}, "sensors": {DEFAULT_SENSOR: 0}}
+            self._save_meta()
+        self._pending = {name: [] for name in COLUMNS}
+        self._files = None
+
+    # ---------------- metadata ----------------
+    def _save_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self._meta_path)
+
+    def sensor_code(self, sensor_id):
+        """Map a sensor name to the integer stored in the sensor_id column."""
+        if isinstance(sensor_id, (int, np.integer)):
+            return int(sensor_id)
+        sensors = self.meta["sensors"]
+        if sensor_id not in sensors:
+            sensors[sensor_id] = max(sensors.values(), default=-1) + 1
+            self._save_meta()
+        return sensors[sensor_id]
+
+    def sensor_names(self):
+        return {code: name for name, code in self.meta["sensors"].items()}
+
+    def _column_path(self, name):
+        return os.path.join(self.path, name + ".bin")
+
+    # ---------------- writing ----------------
+    def append(self, timestamp, pm25, pm10, predicted_pm25=None, sensor_id=DEFAULT_SENSOR):
+        pending = self._pending
+        pending["timestamp"].append(to_epoch(timestamp))
+        pending["pm25"].append(pm25)
+        pending["pm10"].append(pm10)
+        pending["predicted_pm25"].append(np.nan if predicted_pm25 is None else predicted_pm25)
+        pending["sensor_id"].append(self.sensor_code(sensor_id))
+        if len(pending["timestamp"]) >= self.flush_rows:
+            self.flush()
+
+    def append_many(self, columns):
+        """Append whole arrays at once; `columns` maps column name to array-like."""
+        self.flush()
+        n = len(columns["timestamp"])
+        files = self._open_files()
+        for name, dtype in COLUMNS.items():
+            if name in columns:
+                values = np.asarray(columns[name], dtype=dtype)
+            elif name == "predicted_pm25":
+                values = np.full(n, np.nan, dtype=dtype)
+            else:
+                values = np.zeros(n, dtype=dtype)
+            if len(values) != n:
+                raise ValueError(f"Column {name} has {len(values)} rows, expected {n}")
+            files[name].write(values.tobytes())
+        for f in files.values():
+            f.flush()
+
+    def update(self, name, index, values):
+        """Overwrite column `name` at the given rows in place (e.g. backfilled predictions)."""
+        self.flush()
+        column = np.memmap(self._column_path(name), dtype=COLUMNS[name], mode="r+", shape=(len(self),))
+        column[index] = values
+        column.flush()
+        del column
+
+    def prune_before(self, cutoff):
+        """Drop the rows older than `cutoff` (timestamp string or seconds); returns how many.
+
+        Each column is rewritten to a temporary file and swapped in, so
+        readers holding memmaps of the old files keep valid data.
+        """
+        self.close()  # append handles reopen lazily on the new files
+        n = len(self)
+        if n == 0:
+            return 0
+        ts = np.memmap(self._column_path("timestamp"), dtype=COLUMNS["timestamp"], mode="r", shape=(n,))
+        cut = int(np.searchsorted(ts, to_epoch(cutoff), side="left"))
+        del ts
+        if cut == 0:
+            return 0
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(name)
+            column = np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+            column[cut:].tofile(path + ".tmp")
+            del column
+            os.replace(path + ".tmp", path)
+        return cut
+
+    def _open_files(self):
+        if self._files is None:
+            self._files = {name: open(self._column_path(name), "ab") for name in COLUMNS}
+        return self._files
+
+    def flush(self):
+        if not self._pending["timestamp"]:
+            return
+        files = self._open_files()
+        for name, dtype in COLUMNS.items():
+            files[name].write(np.asarray(self._pending[name], dtype=dtype).tobytes())
+            self._pending[name].clear()
+        for f in files.values():
+            f.flush()
+
+    def close(self):
+        self.flush()
+        if self._files is not None:
+            for f in self._files.values():
+                f.close()
+            self._files = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- reading ----------------
+    def __len__(self):
+        sizes = []
+        for name, dtype in COLUMNS.items():
+            p = self._column_path(name)
+            sizes.append(os.path.getsize(p) // dtype.itemsize if os.path.exists(p) else 0)
+        return min(sizes)
+
+    def read(self, columns=None):
+        """Return read-only memory-mapped arrays for the flushed rows."""
+        n = len(self)
+        out = {}
+        for name in columns or COLUMNS:
+            dtype = COLUMNS[name]
+            if n == 0:
+                out[name] = np.empty(0, dtype=dtype)
+            else:
+                out[name] = np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(n,))
+        return out
+
+    def tail(self, count, columns=None):
+        return {name: arr[-count:] if count else arr[:0] for name, arr in self.read(columns).items()}
+
+    def range(self, start=None, end=None, columns=None):
+        """Zero-copy views of the rows with start <= timestamp <= end.
+
+        Binary-searches the timestamp column, so rows must have been
+        appended in time order (import older CSVs before newer ones).
+        """
+        data = self.read()
+        ts = data["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(ts, to_epoch(start), side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, to_epoch(end), side="right"))
+        return {name: data[name][lo:hi] for name in columns or COLUMNS}
+
+
+# ---------------- CSV import / export ----------------
+def read_log_csv(csv_path, chunksize=None, skip_rows=0, **kwargs):
+    """pd.read_csv for the project's logs, tolerating rows wider than the header.
+
+    Older logger layouts appended extra fields to some rows; anything past
+    the header is dropped. `skip_rows` skips that many data rows after the
+    header. Returns a DataFrame, or an iterator of DataFrames when
+    `chunksize` is given.
+    """
+    import csv
+    import pandas as pd
+
+    with open(csv_path, newline="") as f:
+        header = next(csv.reader(f))
+    skiprows = range(skip_rows + 1) if skip_rows else 1
+    return pd.read_csv(csv_path, header=None, skiprows=skiprows, names=header,
+                       usecols=range(len(header)), chunksize=chunksize, **kwargs)
+
+
+def load_log(source, features=1):
+    """Return (timestamps, values (n, features), sensor codes, frame) for a CSV or store.
+
+    `frame` is the CSV as a DataFrame (None for a store) so it can be written back.
+    """
+    names = LOG_FIELDS[:features]
+    if os.path.isdir(source):
+        data = TimeSeriesStore(source).read(["timestamp", "sensor_id"] + list(names))
+        values = np.stack([np.asarray(data[name], dtype=np.float64) for name in names], axis=1)
+        return (np.asarray(data["timestamp"], dtype=np.float64), values,
+                np.asarray(data["sensor_id"]), None)
+
+    import pandas as pd
+
+    frame = read_log_csv(source)
+    pm25_col = next((c for c in PM25_COLUMNS if c in frame.columns), None)
+    if pm25_col is None:
+        raise ValueError(f"{source} has no PM2.5 column (expected one of {PM25_COLUMNS})")
+    ts = pd.to_datetime(frame["timestamp"], format=TIME_FORMAT, errors="coerce")
+    seconds = ts.to_numpy().astype("datetime64[s]").astype(np.float64)
+    seconds[ts.isna().to_numpy()] = np.nan
+    values = np.stack([pd.to_numeric(frame[pm25_col if name == "pm25" else name], errors="coerce")
+                       .to_numpy(dtype=np.float64) for name in names], axis=1)
+    codes = (pd.factorize(frame["sensor_id"])[0] if "sensor_id" in frame.columns
+             else np.zeros(len(frame), dtype=np.int64))
+    return seconds, values, codes, frame
+
+
+def import_csv(csv_path, store_path, sensor_id=DEFAULT_SENSOR, chunksize=200_000):
+    """Append a logger or dashboard CSV to a store; returns the number of rows imported."""
+    import pandas as pd
+
+    store = TimeSeriesStore(store_path)
+    code = store.sensor_code(sensor_id)
+    total = 0
+    for chunk in read_log_csv(csv_path, chunksize=chunksize):
+        pm25_col = next(c for c in PM25_COLUMNS if c in chunk.columns)
+        ts = pd.to_datetime(chunk["timestamp"], format=TIME_FORMAT, errors="coerce")
+        keep = ts.notna().to_numpy() & chunk[pm25_col].notna().to_numpy()
+        # datetime64[ns] read as naive wall-clock seconds
+        seconds = ts[keep].to_numpy().astype("datetime64[ns]").astype(np.int64) / 1e9
+        columns = {
+            "timestamp": seconds,
+            "pm25": chunk[pm25_col].to_numpy()[keep],
+            "pm10": chunk["pm10"].to_numpy()[keep],
+            "sensor_id": np.full(int(keep.sum()), code),
+        }
+        if "predicted_pm25" in chunk.columns:
+            columns["predicted_pm25"] = pd.to_numeric(chunk["predicted_pm25"], errors="coerce").to_numpy()[keep]
+        store.append_many(columns)
+        total += int(keep.sum())
+    store.close()
+    return total
+
+
+def export_csv(store_path, csv_path):
+    """Write a store back out in the dashboard CSV layout (plus sensor_id)."""
+    import csv
+
+    store = TimeSeriesStore(store_path)
+    data = store.read()
+    names = store.sensor_names()
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "pm25", "pm10", "predicted_pm25", "sensor_id"])
+        for ts, pm25, pm10, pred, sid in zip(data["timestamp"], data["pm25"], data["pm10"],
+                                             data["predicted_pm25"], data["sensor_id"]):
+            writer.writerow([
+                format_epoch(ts), round(float(pm25), 1), round(float(pm10), 1),
+                "" if np.isnan(pred) else float(pred), names.get(int(sid), int(sid)),
+            ])
+    return len(data["timestamp"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar binary store for air quality readings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="append a CSV log to a store")
+    imp.add_argument("csv")
+    imp.add_argument("store")
+    imp.add_argument("--sensor-id", default=DEFAULT_SENSOR, help="sensor name recorded for these rows")
+    exp = sub.add_parser("export", help="write a store back to CSV")
+    exp.add_argument("store")
+    exp.add_argument("csv")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        rows = import_csv(args.csv, args.store, sensor_id=args.sensor_id)
+        print(f"✅ Imported {rows} rows from {args.csv} into {args.store}")
+    else:
+        rows = export_csv(args.store, args.csv)
+        print(f"✅ Exported {rows} rows from {args.store} to {args.csv}")